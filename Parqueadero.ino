@@ -56,6 +56,9 @@ const int FILTRO_SENSIBILIDAD_MS = 100; // 100ms para ignorar ruido en el sensor
 #define TOPIC_UBICACION_BASE         "parqueadero/ubicacion"         
 #define TOPIC_CONTROL_TALANQUERA     "parqueadero/control/talanquera"
 #define TOPIC_DISPLAY_ESTADO_GENERAL "parqueadero/display/estado_general" 
+#define TOPIC_DISPLAY_SOLICITAR_KEYFRAME "parqueadero/display/solicitar_keyframe"
+#define TOPIC_DISPLAY_PLANO          "parqueadero/display/plano" // Retenido: orden de cubículos del formato binario
+#define MQTT_TAMANO_BUFFER 4096 // El plano y los keyframes JSON superan los 256 bytes por defecto de PubSubClient
 
 // --- VARIABLES DE ESTADO GLOBALES ---
 volatile int estado_talanquera_logico = 0; 
@@ -89,6 +92,9 @@ struct EstadoDB {
 };
 EstadoDB estados_db[NUM_CUBICULOS];
 int libres_totales_db = NUM_CUBICULOS; 
+long ultimo_seq_display = -1; // Último 'seq' aplicado; -1 = aún no llega un estado completo
+bool plano_recibido = false;  // Formato binario: índices -> nombres (TOPIC_DISPLAY_PLANO)
+uint32_t plano_huella = 0;
 Servo talanquera;
 Adafruit_SSD1306 display(PANTALLA_ANCHO, PANTALLA_ALTO, &Wire, OLED_RESET);
 
@@ -103,6 +109,9 @@ void controlarEntrada();
 void controlarSalida();
 void actualizarEstadoCubiculos(); 
 void cerrar_talanquera_entrada(); 
+void procesarPlano(byte* payload, unsigned int length);
+void procesarBinario(char* topic, byte* payload, unsigned int length);
+void abrirTalanquera(const char* cubiculo_asignado);
 
 // ====================================================================
 // --- CONFIGURACIÓN Y LOOP ---
@@ -145,6 +154,7 @@ void setup() {
   setup_wifi();
   client.setServer(mqtt_server, MQTT_PORT);  
   client.setCallback(callback); 
+  client.setBufferSize(MQTT_TAMANO_BUFFER);
 
   mostrarEstadoGeneral();  
 }
@@ -228,6 +238,9 @@ void reconnect() {
       Serial.println("conectado.");
       client.subscribe(TOPIC_CONTROL_TALANQUERA); 
       client.subscribe(TOPIC_DISPLAY_ESTADO_GENERAL);
+      client.subscribe(TOPIC_DISPLAY_PLANO);
+      ultimo_seq_display = -1; // Tras reconectar se espera (o se pide) un estado completo
+      client.publish(TOPIC_DISPLAY_SOLICITAR_KEYFRAME, "{}");
       mostrarEstadoEnOLED("MQTT Conectado", "Listo para operar");
     } else {
       Serial.print("falló, rc=");
@@ -241,7 +254,139 @@ void reconnect() {
   }
 }
 
+// --- Formato binario (formato_binario.py en el backend) ---
+// El primer byte distingue el formato: '{' = JSON, 0xB0/0xB1/0xB2 = binario. Enteros en little-endian.
+uint16_t leer_u16(const byte* p) { return (uint16_t)p[0] | ((uint16_t)p[1] << 8); }
+uint32_t leer_u32(const byte* p) { return (uint32_t)leer_u16(p) | ((uint32_t)leer_u16(p + 2) << 16); }
+
+const char* estadoPorCodigo(int codigo) {
+  switch (codigo) {
+    case 0: return "Libre";
+    case 1: return "Pendiente";
+    case 2: return "Ocupado";
+    default: return "Otro";
+  }
+}
+
+void abrirTalanquera(const char* cubiculo_asignado) {
+  talanquera.attach(PIN_SERVOMOTOR); 
+  talanquera.write(ANGULO_ABIERTA); 
+  estado_talanquera_logico = 1; 
+  Serial.print("ORDEN EJECUTADA: Abriendo talanquera. Cubículo: ");
+  Serial.println(cubiculo_asignado);
+  
+  // Activar temporizador de cierre automático de 5s
+  talanquera_abierta_por_tiempo = true;
+  timestamp_apertura = millis();
+  
+  mostrarMensajeTemporal("ASIGNADO:", cubiculo_asignado, DISPLAY_MESSAGE_DURATION_MS); 
+}
+
+// Un delta solo se aplica si sigue exactamente al último mensaje; si no, se pide un keyframe
+bool deltaEnSecuencia(long seq) {
+  if (ultimo_seq_display < 0 || seq != ultimo_seq_display + 1) {
+    Serial.println("AVISO: Hueco en la secuencia del display. Solicitando estado completo.");
+    client.publish(TOPIC_DISPLAY_SOLICITAR_KEYFRAME, "{}");
+    return false;
+  }
+  return true;
+}
+
+void aplicarLibresDisplay(int libres) {
+  if (libres_totales_db == 0 && libres > 0) {
+      cupo_lleno_activo = false; 
+  }
+  libres_totales_db = libres; 
+}
+
+void estadoDisplayAplicado(long seq) {
+  ultimo_seq_display = seq;
+  if (!sistema_iniciado) {
+      sistema_iniciado = true;
+      Serial.println("SISTEMA INICIADO: Primer estado de DB recibido. Sensores activados.");
+  }
+}
+
+// Plano del display (retenido): nombres en el orden de los índices binarios y su huella CRC32
+void procesarPlano(byte* payload, unsigned int length) {
+  DynamicJsonDocument doc(length * 2 + 256);
+  if (deserializeJson(doc, payload, length)) {
+    Serial.println(F("Fallo de JSON en el plano del display."));
+    return;
+  }
+  JsonArray nombres = doc["cubiculos"].as<JsonArray>();
+  for (int i = 0; i < NUM_CUBICULOS && i < (int)nombres.size(); i++) {
+    estados_db[i].nombre = nombres[i].as<String>();
+  }
+  uint32_t huella = doc["huella"].as<uint32_t>();
+  if (plano_recibido && huella == plano_huella) return;
+  plano_huella = huella;
+  plano_recibido = true;
+  ultimo_seq_display = -1; // Índices nuevos: esperar un keyframe con este plano
+  client.publish(TOPIC_DISPLAY_SOLICITAR_KEYFRAME, "{}");
+}
+
+void procesarBinario(char* topic, byte* payload, unsigned int length) {
+  if (String(topic) == TOPIC_CONTROL_TALANQUERA) {
+    // u8 0xB2, u8 orden (1 = ABRIR), u8 largo, nombre del cubículo
+    if (length < 3 || payload[0] != 0xB2 || length < 3u + payload[2]) return;
+    char cubiculo_asignado[16];
+    int largo = min((int)payload[2], (int)sizeof(cubiculo_asignado) - 1);
+    memcpy(cubiculo_asignado, payload + 3, largo);
+    cubiculo_asignado[largo] = '\0';
+    if (payload[1] == 1) {
+      abrirTalanquera(cubiculo_asignado);
+    }
+    return;
+  }
+
+  if (String(topic) != TOPIC_DISPLAY_ESTADO_GENERAL || length < 13) return;
+  // u8 cabecera, u32 seq, u16 libres, u32 huella, u16 cantidad
+  bool es_delta = payload[0] == 0xB1;
+  long seq = (long)leer_u32(payload + 1);
+  int libres = leer_u16(payload + 5);
+  uint32_t huella = leer_u32(payload + 7);
+  unsigned int cantidad = leer_u16(payload + 11);
+  const byte* datos = payload + 13;
+
+  if (!plano_recibido || huella != plano_huella) {
+    Serial.println("AVISO: Plano del display desconocido o distinto. Esperando el plano retenido.");
+    client.publish(TOPIC_DISPLAY_SOLICITAR_KEYFRAME, "{}");
+    return;
+  }
+  if (es_delta && !deltaEnSecuencia(seq)) return;
+  aplicarLibresDisplay(libres);
+
+  if (es_delta) {
+    // k x u16 = índice en el plano | (estado << 14)
+    if (length < 13 + cantidad * 2) return;
+    for (unsigned int k = 0; k < cantidad; k++) {
+      uint16_t valor = leer_u16(datos + k * 2);
+      int indice = valor & 0x3FFF;
+      if (indice < NUM_CUBICULOS) {
+        estados_db[indice].estado = estadoPorCodigo(valor >> 14);
+      }
+    }
+  } else {
+    // 2 bits por cubículo, el primero en los bits bajos
+    if (length < 13 + (cantidad + 3) / 4) return;
+    for (unsigned int i = 0; i < cantidad && i < NUM_CUBICULOS; i++) {
+      estados_db[i].estado = estadoPorCodigo((datos[i / 4] >> ((i % 4) * 2)) & 0x03);
+    }
+  }
+  estadoDisplayAplicado(seq);
+}
+
 void callback(char* topic, byte* payload, unsigned int length) {
+  if (length > 0 && payload[0] >= 0xB0 && payload[0] <= 0xB2) {
+    procesarBinario(topic, payload, length);
+    return;
+  }
+  if (String(topic) == TOPIC_DISPLAY_PLANO) {
+    procesarPlano(payload, length);
+    return;
+  }
+
   StaticJsonDocument<256> doc;  
   DeserializationError error = deserializeJson(doc, payload, length);
 
@@ -257,42 +402,42 @@ void callback(char* topic, byte* payload, unsigned int length) {
     const char* cubiculo_asignado = doc["cub"];
 
     if (orden != NULL && strcmp(orden, "ABRIR") == 0) { 
-      talanquera.attach(PIN_SERVOMOTOR); 
-      talanquera.write(ANGULO_ABIERTA); 
-      estado_talanquera_logico = 1; 
-      Serial.print("ORDEN EJECUTADA: Abriendo talanquera. Cubículo: ");
-      Serial.println(cubiculo_asignado);
-      
-      // Activar temporizador de cierre automático de 5s
-      talanquera_abierta_por_tiempo = true;
-      timestamp_apertura = millis();
-      
-      mostrarMensajeTemporal("ASIGNADO:", cubiculo_asignado, DISPLAY_MESSAGE_DURATION_MS); 
+      abrirTalanquera(cubiculo_asignado);
     }
   }
 
   // 2. Lógica para ACTUALIZAR EL DISPLAY (Desde la DB)
+  //    "full": estado completo (keyframe). "delta": solo los cubículos que cambiaron.
   if (String(topic) == TOPIC_DISPLAY_ESTADO_GENERAL) {
-    
-    if (libres_totales_db == 0 && doc["libres"].as<int>() > 0) {
-        cupo_lleno_activo = false; 
-    }
-    
-    libres_totales_db = doc["libres"].as<int>(); 
-
-    JsonArray data = doc["data"].as<JsonArray>();
+    const char* tipo = doc["tipo"] | "full";
+    long seq = doc["seq"] | -1L;
+    bool es_delta = strcmp(tipo, "delta") == 0;
+
+    if (es_delta && !deltaEnSecuencia(seq)) return;
+    aplicarLibresDisplay(doc["libres"].as<int>());
+
+    if (es_delta) {
+      JsonArray cambios = doc["cambios"].as<JsonArray>();
+      for (JsonObject cambio : cambios) {
+        String nombre = cambio["cub"].as<String>();
+        for (int i = 0; i < NUM_CUBICULOS; i++) {
+          if (estados_db[i].nombre == nombre) {
+            estados_db[i].estado = cambio["est"].as<String>();
+            break;
+          }
+        }
+      }
+    } else {
+      JsonArray data = doc["data"].as<JsonArray>();
 
-    for (int i = 0; i < NUM_CUBICULOS; i++) {
-      if (data.size() > i) { 
-        estados_db[i].nombre = data[i]["cub"].as<String>();
-        estados_db[i].estado = data[i]["est"].as<String>();
+      for (int i = 0; i < NUM_CUBICULOS; i++) {
+        if (data.size() > i) { 
+          estados_db[i].nombre = data[i]["cub"].as<String>();
+          estados_db[i].estado = data[i]["est"].as<String>();
+        }
       }
     }
-    
-    if (!sistema_iniciado) {
-        sistema_iniciado = true;
-        Serial.println("SISTEMA INICIADO: Primer estado de DB recibido. Sensores activados.");
-    }
+    estadoDisplayAplicado(seq);
   }
 }
 
@@ -1,11 +1,11 @@
 # ===========================================
 # CODIGO MAESTRO: PARQUEADERO INTELIGENTE - BACKEND FINAL (CODIGO UNICO Y COBRO MANUAL)
 # ===========================================
-from flask import Flask, render_template, jsonify, request
-from flask_mysqldb import MySQL
+from flask import Flask, render_template, jsonify, request, Response, stream_with_context, g
+from pool_db import PoolConexiones, MySQLPool
 from datetime import datetime, timedelta
 from config import *
-from math import ceil 
+from decimal import Decimal
 import time
 from MySQLdb import cursors
 import logging
@@ -13,6 +13,35 @@ import sys
 from flask_apscheduler import APScheduler 
 import paho.mqtt.client as mqtt
 import json
+import functools
+import csv
+import click
+import io
+from cache_tarifas import CacheTarifas
+from asignador_cubiculos import AsignadorCubiculos, zona_de
+from secuencia_tickets import SecuenciaTickets
+from metricas import MuestrasLatencia, ContadorTasa, MetricasTarea, Histograma, Medidor, RegistroMetricas, BUCKETS_PROFUNDIDAD, combinar_exposiciones
+from cola_mqtt import DespachadorMQTT
+from buffer_ocupacion import BufferOcupacion
+from display_delta import PublicadorDisplay
+from eventos_sse import BusEventos, formatear_sse
+from migrador import aplicar_migraciones, RequisitoMigracion
+from verificacion_indices import verificar_indices, CONSULTAS_CRITICAS
+from expiracion_reservas import ExpiradorReservas
+from eventos_internos import CanalEventosInternos
+from eleccion_lider import EleccionLider
+from tarifas_lote import calcular_cobros_vectorizado, comparar_con_escalar
+from calculo_cobros import calcular_cobro_avanzado, calcular_minutos_estadia
+from indice_busqueda import IndiceNgramas
+from archivo_cobros import ArchivadorCobros
+from version_estado import VersionEstado
+from formato_binario import codificar_display, codificar_orden, codificar_plano, huella_plano
+import queue
+import os
+import socket
+import threading
+import urllib.request
+from werkzeug.serving import make_server
 
 # Configuración básica de logging
 logging.basicConfig(
@@ -26,13 +55,46 @@ logger = logging.getLogger('FlaskApp')
 
 app = Flask(__name__)
 
-# Configuración de la DB
-app.config['MYSQL_HOST'] = MYSQL_HOST
-app.config['MYSQL_USER'] = MYSQL_USER
-app.config['MYSQL_PASSWORD'] = MYSQL_PASSWORD
-app.config['MYSQL_DB'] = MYSQL_DB
-app.config['MYSQL_PORT'] = MYSQL_PORT
-mysql = MySQL(app)
+# Histogramas expuestos en /metrics (formato Prometheus). Etiquetas acotadas: endpoint, tópico, verbo/tabla SQL, tarea
+registro_metricas = RegistroMetricas()
+histograma_entrada = registro_metricas.registrar(Histograma(
+    'parqueadero_entrada_a_apertura_segundos',
+    'Desde la recepción MQTT de una entrada hasta la publicación de ABRIR, por carril.', ('carril',)))
+histograma_http = registro_metricas.registrar(Histograma(
+    'parqueadero_http_peticion_segundos',
+    'Duración de las peticiones HTTP por regla de ruta.', ('endpoint', 'metodo', 'codigo')))
+histograma_db = registro_metricas.registrar(Histograma(
+    'parqueadero_db_consulta_segundos',
+    'Duración de cada consulta (y commit) en MySQL por verbo y tabla principal.', ('verbo', 'tabla')))
+histograma_mqtt = registro_metricas.registrar(Histograma(
+    'parqueadero_mqtt_procesamiento_segundos',
+    'Procesamiento de un mensaje MQTT en el trabajador de DB, por tópico.', ('topico',)))
+histograma_cola_mqtt = registro_metricas.registrar(Histograma(
+    'parqueadero_mqtt_profundidad_cola',
+    'Mensajes esperando en las colas de trabajadores al encolar uno nuevo.', buckets=BUCKETS_PROFUNDIDAD))
+histograma_tareas = registro_metricas.registrar(Histograma(
+    'parqueadero_tarea_duracion_segundos',
+    'Duración de cada ejecución de las tareas programadas.', ('tarea',)))
+
+# Configuración de la DB: un pool compartido por las rutas Flask, los mensajes MQTT y el scheduler.
+# 'mysql.connection' toma una conexión del pool y la devuelve al terminar el contexto de aplicación.
+PARAMETROS_DB = {
+    'host': MYSQL_HOST,
+    'user': MYSQL_USER,
+    'passwd': MYSQL_PASSWORD,
+    'db': MYSQL_DB,
+    'port': MYSQL_PORT,
+    'charset': 'utf8'
+}
+pool_db = PoolConexiones(
+    parametros=PARAMETROS_DB,
+    tamano_minimo=DB_POOL_MINIMO,
+    tamano_maximo=DB_POOL_MAXIMO,
+    vida_maxima=DB_POOL_VIDA_MAXIMA_SEGUNDOS,
+    timeout_espera=DB_POOL_TIMEOUT_ESPERA_SEGUNDOS,
+    ping_inactiva=DB_POOL_PING_INACTIVA_SEGUNDOS
+)
+mysql = MySQLPool(app, pool_db, observar_consulta=histograma_db.observar)
 
 # Inicializar Scheduler (Configuración)
 scheduler = APScheduler()
@@ -41,84 +103,318 @@ scheduler.init_app(app)
 # Inicialización del cliente MQTT
 client_mqtt = mqtt.Client(client_id="FlaskBackend", clean_session=True) 
 
+# Conjuntos de cubículos libres por zona (se siembra desde la DB al iniciar)
+asignador = AsignadorCubiculos()
+
+# Latencia desde la recepción del evento de entrada hasta la publicación de ABRIR
+latencia_entrada = MuestrasLatencia()
+
+# Último estado enviado al display OLED (publica solo deltas y un keyframe periódico)
+publicador_display = PublicadorDisplay(DISPLAY_INTERVALO_KEYFRAME_SEGUNDOS)
+
+# Cambios por cubículo para los monitores conectados por SSE (/api/estado_parqueadero/stream)
+bus_eventos = BusEventos(SSE_CAPACIDAD_COLA_CLIENTE, SSE_MAXIMO_CLIENTES_POR_PROCESO)
+
+# Búsqueda sin LIKE '%...%': cubículo -> (nombre, placa/código actual) y placas de registro_cobro.
+# Se siembran desde la DB en el primer uso de cada proceso y se mantienen con las transiciones.
+indice_cubiculos = IndiceNgramas()
+indice_placas = IndiceNgramas()
+
+# Versiones para los ETag: estado (transiciones, placas y tarifas) y tarifas (solo tarifas)
+version_estado = VersionEstado()
+version_tarifas = VersionEstado()
+
 # ------------------------- FUNCIONES DE CONEXIÓN Y MQTT CALLBACKS -------------------------
 
+# Carril de entrada por tópico, y trabajador dedicado por carril
+CARRILES_POR_TOPICO = {carril['topico_entrada']: carril for carril in CARRILES_ENTRADA}
+INDICE_CARRIL = {carril['nombre']: i for i, carril in enumerate(CARRILES_ENTRADA)}
+
+def topicos_suscritos():
+    """Tópicos de dispositivos que atiende la ingesta: un tópico de entrada por carril, sensores, salida y display."""
+    return [c['topico_entrada'] for c in CARRILES_ENTRADA] + [f"{MQTT_TOPIC_UBICACION}/#", TOPIC_SALIDA_CARRO, TOPIC_DISPLAY_SOLICITAR_KEYFRAME]
+
 def on_connect(client, userdata, flags, rc):
     """Función de callback que se ejecuta al conectar al broker MQTT."""
     logger.info("MQTT: Conectado al broker con resultado: " + str(rc))
-    client.subscribe(MQTT_TOPIC_ENTRADA_CARRO) 
-    client.subscribe(f"{MQTT_TOPIC_UBICACION}/#") 
-    client.subscribe(TOPIC_SALIDA_CARRO) 
-    logger.info(f"MQTT: Suscrito a {MQTT_TOPIC_ENTRADA_CARRO}, {MQTT_TOPIC_UBICACION}/# y {TOPIC_SALIDA_CARRO}.")
+    for topico in topicos_suscritos():
+        client.subscribe(topico)
+    logger.info(f"MQTT: Suscrito a {', '.join(topicos_suscritos())}.")
 
 def on_message(client, userdata, msg):
-    """Función de callback que procesa los mensajes MQTT del ESP32."""
-    with app.app_context(): 
+    """
+    Función de callback que recibe los mensajes MQTT del ESP32. Corre en el hilo de red de paho,
+    así que solo decodifica el JSON y encola; el trabajo contra la DB lo hacen los trabajadores.
+    """
+    t_recepcion = time.perf_counter()
+    try:
+        payload = json.loads(msg.payload.decode('utf-8'))
+        logger.info(f"MQTT: Mensaje recibido en {msg.topic}. Payload: {payload}")
+
+        # 1. LÓGICA DE ASIGNACIÓN (Entrada del vehículo por carril). Una clave por carril: orden de llegada
+        #    dentro del carril, y cada carril en su propio trabajador para no bloquear a los demás
+        if msg.topic in CARRILES_POR_TOPICO:
+            if payload.get("estado") == "Esperando":
+                carril = CARRILES_POR_TOPICO[msg.topic]
+                despachador_entradas.encolar(carril['nombre'], (msg.topic, payload, t_recepcion))
+                histograma_cola_mqtt.observar(despachador_entradas.profundidad())
+            
+        # 2. LÓGICA DE CUBÍCULOS (Reporte de Ocupación/Liberación). Clave por cubículo, solo cuenta el último reporte
+        elif msg.topic.startswith(MQTT_TOPIC_UBICACION):
+            cubiculo_nombre = msg.topic.split('/')[-1]
+            despachador_mqtt.encolar(f"cubiculo:{cubiculo_nombre}", (msg.topic, payload, t_recepcion), coalescible=True)
+            histograma_cola_mqtt.observar(despachador_mqtt.profundidad())
+
+        # 3. LÓGICA DE SALIDA 
+        elif msg.topic == TOPIC_SALIDA_CARRO:
+            logger.info("EVENTO: Vehículo detectado en la salida. Trazabilidad guardada.")
+
+        # 4. El display detectó un hueco en la secuencia de deltas: el próximo ciclo envía el estado completo
+        elif msg.topic == TOPIC_DISPLAY_SOLICITAR_KEYFRAME:
+            publicador_display.forzar_keyframe()
+
+    except json.JSONDecodeError:
+        logger.error(f"MQTT: Error al decodificar JSON del tópico {msg.topic}.")
+    except Exception as e:
+        logger.error(f"MQTT: Error general al procesar mensaje en {msg.topic}: {e}")
+
+def procesar_mensaje_mqtt(tarea):
+    """Ejecuta en un trabajador de DB la lógica de un mensaje ya decodificado por on_message."""
+    topic, payload, t_recepcion = tarea
+    inicio = time.perf_counter()
+    # Entradas por nombre de carril; reportes de sensores bajo el comodín (nunca una serie por cubículo)
+    topico_metrica = topic
+    with app.app_context():
         try:
-            payload = json.loads(msg.payload.decode('utf-8'))
-            logger.info(f"MQTT: Mensaje recibido en {msg.topic}. Payload: {payload}")
+            if topic in CARRILES_POR_TOPICO:
+                topico_metrica = CARRILES_POR_TOPICO[topic]['nombre']
+                asignar_cubiculo_y_ordenar_apertura(client_mqtt, CARRILES_POR_TOPICO[topic], t_recepcion)
+            elif topic.startswith(MQTT_TOPIC_UBICACION):
+                topico_metrica = f"{MQTT_TOPIC_UBICACION}/+"
+                manejar_reporte_cubiculo(topic, payload)
+        except Exception as e:
+            logger.error(f"MQTT: Error general al procesar mensaje en {topic}: {e}")
+    histograma_mqtt.observar(time.perf_counter() - inicio, topico_metrica)
+
+# Trabajadores de DB para los mensajes MQTT (colas acotadas, orden garantizado por cubículo)
+despachador_mqtt = DespachadorMQTT(
+    procesar_mensaje_mqtt,
+    num_trabajadores=MQTT_TRABAJADORES_DB,
+    capacidad=MQTT_CAPACIDAD_COLA,
+    timeout_encolado=MQTT_TIMEOUT_ENCOLADO_SEGUNDOS
+)
 
-            # 1. LÓGICA DE ASIGNACIÓN (Entrada del vehículo - Pin 2 Carros)
-            if msg.topic == MQTT_TOPIC_ENTRADA_CARRO:
-                if payload.get("estado") == "Esperando":
-                    asignar_cubiculo_y_ordenar_apertura(client) 
-                
-            # 2. LÓGICA DE CUBÍCULOS (Reporte de Ocupación/Liberación)
-            elif msg.topic.startswith(MQTT_TOPIC_UBICACION):
-                manejar_reporte_cubiculo(msg.topic, payload)
+# Entradas: un trabajador por carril (asignación serializada dentro del carril, carriles en paralelo)
+despachador_entradas = DespachadorMQTT(
+    procesar_mensaje_mqtt,
+    num_trabajadores=len(CARRILES_ENTRADA),
+    capacidad=MQTT_CAPACIDAD_COLA,
+    timeout_encolado=MQTT_TIMEOUT_ENCOLADO_SEGUNDOS,
+    enrutar=lambda carril: INDICE_CARRIL[carril],
+    nombre="entrada"
+)
 
-            # 3. LÓGICA DE SALIDA 
-            elif msg.topic == TOPIC_SALIDA_CARRO:
-                logger.info("EVENTO: Vehículo detectado en la salida. Trazabilidad guardada.")
+def formatear_fecha(valor):
+    return valor.strftime('%Y-%m-%d %H:%M:%S') if valor else None
 
-        except json.JSONDecodeError:
-            logger.error(f"MQTT: Error al decodificar JSON del tópico {msg.topic}.")
-        except Exception as e:
-            logger.error(f"MQTT: Error general al procesar mensaje en {msg.topic}: {e}")
+def publicar_sse_cubiculo(cubiculo_nombre, **campos):
+    """Envía a los monitores SSE de ESTE proceso los campos que cambiaron de un cubículo."""
+    campos['nombre'] = cubiculo_nombre
+    bus_eventos.publicar('cubiculo', campos)
 
-def asignar_cubiculo_y_ordenar_apertura(client_mqtt):
+def indexar_cubiculo(cubiculo_nombre, campos, placa_anterior=None):
     """
-    Busca el primer cubículo 'Libre' para CARROS ('A%'), registra el ingreso como 'Pendiente',
-    genera un código único basado en el registro_id, y envía la orden de apertura.
+    Actualiza los índices de búsqueda si cambió la placa/código del cubículo. Al liberarse (cobro o
+    cancelación) el cubículo deja de encontrarse por la placa; en el índice del historial la placa
+    sigue mientras tenga registros. La placa reemplazada en una edición se quita: si otro registro
+    la usa, la siguiente siembra la vuelve a agregar.
     """
+    if 'placa' not in campos:
+        return
+    placa = campos['placa']
+    indice_cubiculos.poner(cubiculo_nombre, cubiculo_nombre, placa)
+    if placa_anterior and placa_anterior != placa:
+        indice_placas.quitar(placa_anterior)
+    if placa:
+        indice_placas.poner(placa, placa)
+
+def aplicar_cambio_cubiculo(cubiculo_nombre, placa_anterior=None, **campos):
+    """Aplica en este proceso un cambio de datos sin transición (índices de búsqueda, ETag y monitores SSE)."""
+    indexar_cubiculo(cubiculo_nombre, campos, placa_anterior)
+    version_estado.incrementar()
+    publicar_sse_cubiculo(cubiculo_nombre, **campos)
+
+def publicar_cambio_cubiculo(cubiculo_nombre, placa_anterior=None, **campos):
+    """Cambio de datos sin transición (ej. placa editada): a los monitores SSE de todos los procesos (mismas claves que /api/estado_parqueadero)."""
+    aplicar_cambio_cubiculo(cubiculo_nombre, placa_anterior, **dict(campos))
+    canal_interno.publicar('cubiculo', nombre=cubiculo_nombre, campos=campos, placa_anterior=placa_anterior)
+
+def aplicar_transicion(cubiculo_nombre, estado, **campos):
+    """Aplica una transición ya confirmada en la DB a los componentes en memoria de este proceso."""
+    if estado == 'Libre':
+        campos.update({
+            'registro_id': None, 'placa': None, 'tipo_vehiculo': None,
+            'hora_ingreso': None, 'tiempo_minutos': 0, 'cobro_actual': 0.0
+        })
+    indexar_cubiculo(cubiculo_nombre, campos)
+    version_estado.incrementar()
+    # Asignador, buffer, expirador y display solo tienen sentido en el proceso de ingesta
+    if ingesta_activa.is_set():
+        if estado == 'Libre':
+            asignador.liberar(cubiculo_nombre)
+        if estado != 'Ocupado':
+            buffer_ocupacion.olvidar(cubiculo_nombre)
+        # Una reserva nueva arma su vencimiento; ocupación confirmada, cobro o cancelación lo desarman
+        if estado == 'Pendiente' and campos.get('registro_id'):
+            expirador_reservas.armar(cubiculo_nombre, campos['registro_id'], TIEMPO_EXPIRACION_RESERVA_SEGUNDOS)
+        else:
+            expirador_reservas.desarmar(cubiculo_nombre)
+        publicador_display.marcar_cambio()
+    publicar_sse_cubiculo(cubiculo_nombre, estado=estado, **campos)
+
+def registrar_transicion(cubiculo_nombre, estado, **campos):
+    """
+    Punto único que avisa a los componentes en memoria de un cambio de estado ya confirmado
+    en la DB (asignación, ocupación, cobro, cancelación o limpieza). 'campos' son los demás
+    datos del cubículo que cambiaron (registro_id, placa, ...), para el monitor en vivo.
+    Se aplica en este proceso y se reenvía a los demás por el canal de eventos internos.
+    """
+    aplicar_transicion(cubiculo_nombre, estado, **dict(campos))
+    canal_interno.publicar('transicion', nombre=cubiculo_nombre, estado=estado, campos=campos)
+
+def aplicar_evento_interno(evento):
+    """Callback del canal interno: repite en este proceso un cambio hecho en otro."""
+    tipo = evento.get('tipo')
+    if tipo == 'transicion':
+        aplicar_transicion(evento['nombre'], evento['estado'], **evento.get('campos', {}))
+    elif tipo == 'cubiculo':
+        aplicar_cambio_cubiculo(evento['nombre'], evento.get('placa_anterior'), **evento.get('campos', {}))
+    elif tipo == 'tarifas':
+        aplicar_cambio_tarifas(evento.get('tarifas', {}))
+
+def aplicar_cambio_tarifas(tarifas):
+    """Tarifas ya guardadas en la DB: invalida el cache, avanza las versiones y avisa a los monitores SSE."""
+    cache_tarifas.invalidar()
+    version_tarifas.incrementar()
+    version_estado.incrementar()
+    bus_eventos.publicar('tarifas', tarifas)
+
+# Cambios que deben verse en los demás procesos (workers web y proceso de ingesta)
+canal_interno = CanalEventosInternos(TOPIC_EVENTOS_INTERNOS, aplicar_evento_interno)
+
+# Activo solo en el proceso que atiende MQTT y el scheduler (ver iniciar_ingesta)
+ingesta_activa = threading.Event()
+
+def sincronizar_asignador():
+    """Reconcilia el asignador en memoria con la tabla 'cubiculos'. Requiere contexto de aplicación."""
+    version_lectura = asignador.version()
+    cur = mysql.connection.cursor()
+    try:
+        cur.execute("SELECT id, nombre, estado FROM cubiculos")
+        agregados, retirados = asignador.sincronizar(cur.fetchall(), version_lectura)
+    finally:
+        cur.close()
+    if agregados or retirados:
+        logger.warning(f"Asignador: Reconciliado con la DB ({agregados} liberados, {retirados} retirados).")
+    return agregados, retirados
+
+def reservar_cubiculo(zona):
+    """Toma el siguiente cubículo libre de la zona; si no hay, reconcilia una vez con la DB antes de rendirse."""
+    reservado = asignador.reservar(zona)
+    if reservado is None:
+        sincronizar_asignador()
+        reservado = asignador.reservar(zona)
+    return reservado
+
+def reservar_bloque_tickets(tamano):
+    """Avanza la secuencia 'registro_cobro' en 'tamano' y devuelve el primer ID del bloque (transacción propia)."""
     db = mysql.connection
     cur = db.cursor()
-    
-    sql_select = "SELECT id, nombre, tipo_vehiculo FROM cubiculos WHERE estado = 'Libre' AND nombre LIKE 'A%' ORDER BY nombre ASC LIMIT 1"
-    
     try:
-        cur.execute(sql_select)
-        resultado = cur.fetchone()
+        cur.execute("UPDATE secuencias SET siguiente = LAST_INSERT_ID(siguiente + %s) WHERE nombre = 'registro_cobro'", (tamano,))
+        if cur.rowcount == 0:
+            raise RuntimeError("La secuencia 'registro_cobro' no existe (aplicar migraciones/001_secuencia_tickets.sql).")
+        cur.execute("SELECT LAST_INSERT_ID()")
+        fin_bloque = cur.fetchone()[0]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cur.close()
+    logger.info(f"Tickets: Reservado bloque de IDs {fin_bloque - tamano}..{fin_bloque - 1}.")
+    return fin_bloque - tamano
 
-        if resultado:
-            cubiculo_id, cubiculo_nombre, tipo_vehiculo_default = resultado
-            
-            # 1. Registrar el cobro con PLACA TEMPORAL para obtener el ID de registro
-            sql_insert_registro = "INSERT INTO registro_cobro (hora_ingreso, cubiculo_id, placa) VALUES (%s, %s, %s)"
-            # Usamos 'TEMP' para reservar el registro y obtener el ID
-            cur.execute(sql_insert_registro, (datetime.now(), cubiculo_id, 'TEMP')) 
-            registro_cobro_id = cur.lastrowid
-
-            # >>> GENERACIÓN DEL CÓDIGO ÚNICO (Letra A + ID del registro con relleno) <<<
-            codigo_unico = f"A-{registro_cobro_id:03d}" 
-            
-            # 2. Actualizar el registro de cobro y el cubículo con el CÓDIGO ÚNICO
-            sql_update_registro = "UPDATE registro_cobro SET placa = %s WHERE id = %s"
-            cur.execute(sql_update_registro, (codigo_unico, registro_cobro_id))
+# IDs de registro_cobro conocidos antes del INSERT: el código del ticket sale sin ida y vuelta extra a la DB
+secuencia_tickets = SecuenciaTickets(reservar_bloque_tickets, TAMANO_BLOQUE_TICKETS)
 
-            sql_update_cubiculo = "UPDATE cubiculos SET estado = 'Pendiente', timestamp_ultima_actualizacion = %s, registro_cobro_id = %s, placa = %s, tipo_vehiculo = %s WHERE id = %s"
-            cur.execute(sql_update_cubiculo, (datetime.now(), registro_cobro_id, codigo_unico, tipo_vehiculo_default, cubiculo_id))
+def asignar_cubiculo_y_ordenar_apertura(client_mqtt, carril, t_recepcion=None):
+    """
+    Toma el primer cubículo 'Libre' de la zona del carril (ej. 'A' para carros) del asignador en
+    memoria y emite el ticket en una sola transacción: el código único sale del ID pre-reservado
+    (secuencia_tickets), así el registro se inserta ya con su código y el cubículo se marca
+    'Pendiente' en el mismo commit. Después envía la orden de apertura a la talanquera del carril.
+    """
+    zona = carril['zona']
+    db = mysql.connection
+    cur = db.cursor()
+    
+    try:
+        # Si la DB contradice al asignador (cubículo ya no libre), se descarta y se intenta el siguiente
+        while True:
+            resultado = reservar_cubiculo(zona)
+            if not resultado:
+                logger.warning(f"ASIGNACIÓN FALLIDA ({carril['nombre']}): Cupo Lleno (No hay cubículos '{zona}' disponibles).")
+                return
 
-            db.commit()
-            
-            # 3. Publicar la orden
-            payload_orden = json.dumps({"orden": "ABRIR", "cub": cubiculo_nombre})
-            client_mqtt.publish(TOPIC_CONTROL_TALANQUERA, payload_orden, qos=1) 
-            
-            logger.info(f"ASIGNACIÓN EXITOSA: Cubículo {cubiculo_nombre} asignado (Código: {codigo_unico}). Orden de apertura enviada.")
-            
+            cubiculo_id, cubiculo_nombre = resultado
+            tipo_vehiculo_default = carril['tipo_vehiculo']
+
+            try:
+                registro_cobro_id = secuencia_tickets.siguiente()
+                # >>> GENERACIÓN DEL CÓDIGO ÚNICO (Letra de la zona + ID del registro con relleno) <<<
+                codigo_unico = f"{zona}-{registro_cobro_id:03d}" 
+                ahora = datetime.now()
+
+                # 1. Registrar el cobro ya con su CÓDIGO ÚNICO
+                sql_insert_registro = "INSERT INTO registro_cobro (id, hora_ingreso, cubiculo_id, placa) VALUES (%s, %s, %s, %s)"
+                cur.execute(sql_insert_registro, (registro_cobro_id, ahora, cubiculo_id, codigo_unico)) 
+
+                # 2. Reservar el cubículo. La condición estado = 'Libre' impide pisar un cubículo tomado por otra vía
+                sql_update_cubiculo = "UPDATE cubiculos SET estado = 'Pendiente', timestamp_ultima_actualizacion = %s, registro_cobro_id = %s, placa = %s, tipo_vehiculo = %s WHERE id = %s AND estado = 'Libre'"
+                cur.execute(sql_update_cubiculo, (ahora, registro_cobro_id, codigo_unico, tipo_vehiculo_default, cubiculo_id))
+
+                if cur.rowcount == 0:
+                    db.rollback()
+                    asignador.descartar(cubiculo_nombre)
+                    logger.warning(f"Asignador: {cubiculo_nombre} no estaba 'Libre' en la DB. Se intenta con el siguiente.")
+                    continue
+
+                db.commit()
+            except Exception:
+                asignador.devolver(cubiculo_nombre)
+                raise
+
+            asignador.confirmar(cubiculo_nombre)
+            registrar_transicion(
+                cubiculo_nombre, 'Pendiente',
+                registro_id=registro_cobro_id, placa=codigo_unico,
+                tipo_vehiculo=tipo_vehiculo_default, hora_ingreso=formatear_fecha(ahora)
+            )
+            break
+        
+        # 3. Publicar la orden
+        if carril['formato_control'] == 'binario':
+            payload_orden = codificar_orden("ABRIR", cubiculo_nombre)
         else:
-            logger.warning("ASIGNACIÓN FALLIDA: Cupo Lleno (No hay cubículos 'A' disponibles).")
+            payload_orden = json.dumps({"orden": "ABRIR", "cub": cubiculo_nombre})
+        client_mqtt.publish(carril['topico_control'], payload_orden, qos=1) 
+        if t_recepcion is not None:
+            transcurrido = time.perf_counter() - t_recepcion
+            latencia_entrada.registrar(transcurrido * 1000.0)
+            histograma_entrada.observar(transcurrido, carril['nombre'])
+        
+        logger.info(f"ASIGNACIÓN EXITOSA ({carril['nombre']}): Cubículo {cubiculo_nombre} asignado (Código: {codigo_unico}). Orden de apertura enviada.")
 
     except Exception as e:
         db.rollback()
@@ -130,68 +426,74 @@ def manejar_reporte_cubiculo(topic, payload):
     """
     Maneja el reporte de Ocupado. La liberación y cobro AUTOMÁTICO
     por sensor ha sido ELIMINADA para cobro manual estricto.
+    El reporte no se escribe aquí: pasa al buffer de ocupación, que descarta repeticiones
+    y confirma los cambios por lotes (escribir_lote_ocupacion).
     """
     cubiculo_nombre = topic.split('/')[-1] 
     estado_sensor = payload.get("estado")
-    
-    db = mysql.connection
-    cur = db.cursor()
 
-    try:
-        if estado_sensor == 'Ocupado':
-            # Solo confirmamos la ocupación (Pendiente -> Ocupado)
-            sql_update = "UPDATE cubiculos SET estado = 'Ocupado', timestamp_ultima_actualizacion = %s WHERE nombre = %s AND estado IN ('Pendiente', 'Ocupado')"
-            cur.execute(sql_update, (datetime.now(), cubiculo_nombre))
+    if estado_sensor == 'Ocupado':
+        # Solo confirmamos la ocupación (Pendiente -> Ocupado)
+        buffer_ocupacion.registrar(cubiculo_nombre, estado_sensor)
+        
+    elif estado_sensor == 'Libre':
+        # IGNORAR EVENTO LIBRE PARA FORZAR COBRO MANUAL
+        logger.warning(f"DB: Evento 'Libre' del sensor {cubiculo_nombre} IGNORADO (Cobro Manual Estricto).")
+
+def escribir_lote_ocupacion(nombres):
+    """
+    Confirma como 'Ocupado' (desde 'Pendiente') todos los cubículos del lote en una sola transacción.
+    Devuelve (nombres que quedaron 'Ocupado', filas realmente cambiadas).
+    """
+    with app.app_context():
+        db = mysql.connection
+        cur = db.cursor()
+        marcadores = ", ".join(["%s"] * len(nombres))
+        try:
+            cur.execute(f"SELECT id, nombre, estado FROM cubiculos WHERE nombre IN ({marcadores}) FOR UPDATE", tuple(nombres))
+            filas = cur.fetchall()
+
+            a_confirmar = [(cubiculo_id, nombre) for cubiculo_id, nombre, estado in filas if estado == 'Pendiente']
+            if a_confirmar:
+                marcadores_ids = ", ".join(["%s"] * len(a_confirmar))
+                sql_update = f"UPDATE cubiculos SET estado = 'Ocupado', timestamp_ultima_actualizacion = %s WHERE id IN ({marcadores_ids}) AND estado = 'Pendiente'"
+                cur.execute(sql_update, (datetime.now(),) + tuple(cubiculo_id for cubiculo_id, _ in a_confirmar))
             db.commit()
-            logger.info(f"DB: Cubículo {cubiculo_nombre} confirmado como Ocupado.")
-            
-        elif estado_sensor == 'Libre':
-            # IGNORAR EVENTO LIBRE PARA FORZAR COBRO MANUAL
-            logger.warning(f"DB: Evento 'Libre' del sensor {cubiculo_nombre} IGNORADO (Cobro Manual Estricto).")
+        except Exception:
             db.rollback()
+            raise
+        finally:
+            cur.close()
 
-    except Exception as e:
-        db.rollback()
-        logger.error(f"DB: Error al manejar reporte de cubículo {cubiculo_nombre}: {e}")
-    finally:
-        cur.close()
+    for _, nombre in a_confirmar:
+        registrar_transicion(nombre, 'Ocupado')
+        logger.info(f"DB: Cubículo {nombre} confirmado como Ocupado.")
+    ocupados = {nombre for _, nombre, estado in filas if estado in ('Pendiente', 'Ocupado')}
+    return ocupados, len(a_confirmar)
+
+# Commits hechos por el buffer de ocupación (para comparar contra los reportes recibidos)
+commits_ocupacion = ContadorTasa()
+
+# Reportes 'Ocupado' coalescidos por cubículo y escritos por lotes
+buffer_ocupacion = BufferOcupacion(
+    escribir_lote_ocupacion,
+    intervalo_ms=OCUPACION_INTERVALO_VACIADO_MS,
+    max_eventos=OCUPACION_MAX_EVENTOS_LOTE,
+    contador_commits=commits_ocupacion
+)
 
 
 # ------------------------- LÓGICA DE COBRO DIFERENCIADO -------------------------
 
 def get_tarifas(tipo_vehiculo, cur):
-    """Obtiene las tarifas para un tipo de vehículo ('CARRO' o 'MOTO') desde la DB."""
-    cur = mysql.connection.cursor()
-    sql = "SELECT tarifa_primera_hora, tarifa_hora_subsiguiente FROM tarifas WHERE tipo = %s"
-    cur.execute(sql, (tipo_vehiculo,))
-    result = cur.fetchone() 
-    cur.close()
+    """Obtiene las tarifas para un tipo de vehículo ('CARRO' o 'MOTO') desde el cache de tarifas."""
+    result = cache_tarifas.obtener(tipo_vehiculo)
     return result if result else (0, 0) 
 
-def calcular_cobro_avanzado(minutos_totales, tarifas):
-    """Calcula el monto según tarifas variables e incluye TIEMPO DE GRACIA."""
-    TARIFA_PRIMERA_HORA, TARIFA_HORA_SUBSECUENTE = tarifas
-    minutos_totales = int(minutos_totales)
-    monto_total = 0
-
-    if minutos_totales <= TIEMPO_GRACIA_MINUTOS:
-        return 0
-
-    if minutos_totales <= 60:
-        monto_total = TARIFA_PRIMERA_HORA
-    else:
-        monto_total = TARIFA_PRIMERA_HORA
-        minutos_restantes = minutos_totales - 60 
-        horas_subsiguientes = ceil(minutos_restantes / 60.0)
-        monto_total += (horas_subsiguientes * TARIFA_HORA_SUBSECUENTE)
-        
-    return int(monto_total)
-
 def calcular_cobro_activo(hora_ingreso, cubiculo_id, cur):
     """Calcula el cobro activo. Usa la hora de ingreso real para el cálculo."""
     ahora = datetime.now()
-    tiempo_estacionado = ahora - hora_ingreso
-    minutos = int(tiempo_estacionado.total_seconds() / 60)
+    minutos = calcular_minutos_estadia(hora_ingreso, ahora)
     
     temp_cur = mysql.connection.cursor()
     tipo_vehiculo = TIPO_CARRO
@@ -227,90 +529,263 @@ def calcular_cobro_activo(hora_ingreso, cubiculo_id, cur):
     
     return minutos, costo
 
+def cargar_tarifas_por_tipo(cur):
+    """Lee la tabla 'tarifas' completa en una sola consulta (cursor DictCursor): {tipo: (primera_hora, subsiguiente)}."""
+    cur.execute("SELECT tipo, tarifa_primera_hora, tarifa_hora_subsiguiente FROM tarifas")
+    return {
+        fila['tipo']: (fila['tarifa_primera_hora'], fila['tarifa_hora_subsiguiente'])
+        for fila in cur.fetchall()
+    }
+
+def leer_tarifas_db():
+    """Cargador del cache de tarifas. Requiere contexto de aplicación (request, MQTT o scheduler)."""
+    cur = connect_db_dict()
+    try:
+        return cargar_tarifas_por_tipo(cur)
+    finally:
+        cur.close()
+
+# Cache de proceso: se invalida en el POST de /api/tarifas y caduca por TTL
+cache_tarifas = CacheTarifas(leer_tarifas_db, TARIFAS_CACHE_TTL_SEGUNDOS)
+
+def calcular_cobro_en_lote(hora_ingreso, tipo_vehiculo, tarifas_por_tipo, ahora):
+    """
+    Variante de calcular_cobro_activo sin acceso a la DB: recibe el tipo ya leído en el JOIN
+    y las tarifas precargadas, para calcular muchos cubículos en una sola pasada.
+    """
+    minutos = calcular_minutos_estadia(hora_ingreso, ahora)
+    tarifas = tarifas_por_tipo.get(tipo_vehiculo or TIPO_CARRO, (0, 0))
+    try:
+        costo = calcular_cobro_avanzado(minutos, tarifas)
+    except Exception as e:
+        logger.error(f"Error al calcular cobro en lote: {e}")
+        costo = 0.0
+    return minutos, costo
+
 # ------------------------- TAREAS PROGRAMADAS -------------------------
 
-@scheduler.task('interval', id='limpieza_pendientes_job', seconds=INTERVALO_LIMPIEZA_SEGUNDOS, misfire_grace_time=900)
-def limpiar_pendientes_caducados():
-    """Cancela las asignaciones ('Pendiente') que han excedido el TIEMPO_GRACIA_MINUTOS."""
-    with app.app_context():
-        db = mysql.connection
-        cur = db.cursor()
-        now = datetime.now()
-        
-        tiempo_limite = now - timedelta(minutes=TIEMPO_GRACIA_MINUTOS)
-        
-        sql_select = """
-            SELECT 
-                c.id AS cubiculo_id, 
-                c.nombre AS cubiculo_nombre, 
-                c.registro_cobro_id AS registro_id, 
-                rc.hora_ingreso
+def medir_tarea(nombre):
+    """Registra la duración de cada ejecución de la tarea en el histograma de /metrics."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                histograma_tareas.observar(time.perf_counter() - inicio, nombre)
+        return envoltura
+    return decorador
+
+def cancelar_pendientes_caducados(tiempo_limite=None, registro_ids=None):
+    """
+    Cancela en UNA transacción corta las asignaciones 'Pendiente' con ingreso anterior a
+    'tiempo_limite' o, si se indican, las de 'registro_ids' que sigan pendientes: un
+    SELECT ... FOR UPDATE, un UPDATE y un DELETE multi-fila (no dos sentencias por reserva).
+    Devuelve los nombres de los cubículos liberados. Requiere contexto de aplicación.
+    """
+    if registro_ids is not None:
+        if not registro_ids:
+            return []
+        condicion = f"rc.id IN ({', '.join(['%s'] * len(registro_ids))})"
+        params = tuple(registro_ids)
+    else:
+        condicion = "rc.hora_ingreso < %s"
+        params = (tiempo_limite,)
+
+    db = mysql.connection
+    cur = db.cursor()
+    try:
+        cur.execute(f"""
+            SELECT c.id, c.nombre, c.registro_cobro_id
             FROM cubiculos c
             JOIN registro_cobro rc ON c.registro_cobro_id = rc.id
-            WHERE c.estado = 'Pendiente' AND rc.hora_ingreso < %s
-        """
-        
-        try:
-            cur.execute(sql_select, (tiempo_limite,))
-            registros_a_cancelar = cur.fetchall()
-            
-            if not registros_a_cancelar:
-                logger.info("Scheduler: No hay asignaciones pendientes caducadas para limpiar.")
-                return
+            WHERE c.estado = 'Pendiente' AND {condicion}
+            FOR UPDATE
+        """, params)
+        caducados = cur.fetchall()
+        if not caducados:
+            db.commit()
+            return []
 
-            conteo_cancelados = 0
-            
-            for cubiculo_id, cubiculo_nombre, registro_id, hora_ingreso in registros_a_cancelar:
-                
-                sql_delete_registro = "DELETE FROM registro_cobro WHERE id = %s"
-                cur.execute(sql_delete_registro, (registro_id,))
+        ids_cubiculos = [fila[0] for fila in caducados]
+        ids_registros = [fila[2] for fila in caducados]
+        marcadores = ', '.join(['%s'] * len(caducados))
 
-                sql_update_cubiculo = "UPDATE cubiculos SET estado = 'Libre', timestamp_ultima_actualizacion = %s, registro_cobro_id = NULL, placa = NULL, tipo_vehiculo = NULL WHERE id = %s"
-                cur.execute(sql_update_cubiculo, (now, cubiculo_id))
-                
-                conteo_cancelados += 1
-                logger.warning(f"Scheduler: Cancelación AUTOMÁTICA de asignación en {cubiculo_nombre} (Reg ID: {registro_id}). Tiempo excedido.")
+        cur.execute(
+            f"UPDATE cubiculos SET estado = 'Libre', timestamp_ultima_actualizacion = %s, registro_cobro_id = NULL, placa = NULL, tipo_vehiculo = NULL WHERE id IN ({marcadores}) AND estado = 'Pendiente'",
+            tuple([datetime.now()] + ids_cubiculos)
+        )
+        cur.execute(f"DELETE FROM registro_cobro WHERE id IN ({marcadores}) AND hora_salida IS NULL", tuple(ids_registros))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cur.close()
 
-            db.commit()
-            logger.info(f"Scheduler: Proceso de limpieza finalizado. {conteo_cancelados} asignaciones canceladas.")
+    nombres = [fila[1] for fila in caducados]
+    for nombre in nombres:
+        registrar_transicion(nombre, 'Libre')
+    return nombres
+
+def vencer_reservas(vencidos):
+    """Callback del expirador: cancela las reservas cuyo plazo se cumplió sin confirmación del sensor."""
+    with app.app_context():
+        nombres = cancelar_pendientes_caducados(registro_ids=[registro_id for _, registro_id in vencidos])
+    if nombres:
+        logger.warning(f"Expirador: Cancelación AUTOMÁTICA de {len(nombres)} asignaciones por tiempo excedido: {', '.join(nombres)}")
+
+expirador_reservas = ExpiradorReservas(vencer_reservas)
+
+def armar_pendientes_sin_plazo():
+    """
+    Arma el vencimiento de las reservas 'Pendiente' que el expirador no conoce (creadas antes de
+    un reinicio o por otra instancia), con el plazo que les queda. Requiere contexto de aplicación.
+    """
+    cur = mysql.connection.cursor()
+    try:
+        cur.execute("""
+            SELECT c.nombre, c.registro_cobro_id, rc.hora_ingreso
+            FROM cubiculos c
+            JOIN registro_cobro rc ON c.registro_cobro_id = rc.id
+            WHERE c.estado = 'Pendiente'
+        """)
+        filas = cur.fetchall()
+    finally:
+        cur.close()
 
+    ahora = datetime.now()
+    armadas = 0
+    for nombre, registro_id, hora_ingreso in filas:
+        if not expirador_reservas.armado(nombre):
+            restante = TIEMPO_EXPIRACION_RESERVA_SEGUNDOS - (ahora - hora_ingreso).total_seconds()
+            expirador_reservas.armar(nombre, registro_id, restante)
+            armadas += 1
+    return armadas
+
+metricas_limpieza = MetricasTarea()
+
+@scheduler.task('interval', id='limpieza_pendientes_job', seconds=INTERVALO_LIMPIEZA_SEGUNDOS, misfire_grace_time=900)
+@medir_tarea('limpiar_pendientes_caducados')
+def limpiar_pendientes_caducados():
+    """
+    Reconciliación de baja frecuencia: el vencimiento normal lo hace el expirador en memoria.
+    Cancela lo que ya pasó su plazo y arma las reservas pendientes que el expirador no conoce.
+    """
+    inicio = time.perf_counter()
+    with app.app_context():
+        try:
+            nombres = cancelar_pendientes_caducados(datetime.now() - timedelta(seconds=TIEMPO_EXPIRACION_RESERVA_SEGUNDOS))
+            armadas = armar_pendientes_sin_plazo()
         except Exception as e:
-            db.rollback()
+            metricas_limpieza.registrar((time.perf_counter() - inicio) * 1000.0, error=True)
             logger.error(f"Scheduler: Error durante el proceso de limpieza automática: {e}")
-        finally:
-            cur.close()
-            
+            return
+
+    metricas_limpieza.registrar((time.perf_counter() - inicio) * 1000.0, len(nombres))
+    if armadas:
+        logger.info(f"Scheduler: {armadas} reservas pendientes sin plazo armadas en el expirador.")
+    if not nombres:
+        logger.info("Scheduler: No hay asignaciones pendientes caducadas para limpiar.")
+        return
+    logger.warning(f"Scheduler: Cancelación AUTOMÁTICA de {len(nombres)} asignaciones por tiempo excedido: {', '.join(nombres)}")
+
+@scheduler.task('interval', id='reconciliar_asignador_job', seconds=INTERVALO_RECONCILIACION_ASIGNADOR_SEGUNDOS, misfire_grace_time=60)
+@medir_tarea('reconciliar_asignador')
+def reconciliar_asignador():
+    """Corrige periódicamente el asignador en memoria frente a cambios hechos fuera de esta instancia."""
+    with app.app_context():
+        try:
+            sincronizar_asignador()
+        except Exception as e:
+            logger.error(f"Scheduler: Error al reconciliar el asignador de cubículos: {e}")
+
+# Cobros cerrados antiguos -> registro_cobro_archivo, por lotes cortos (archivo_cobros.py)
+archivador_cobros = ArchivadorCobros(ARCHIVO_TAMANO_LOTE)
+
+@scheduler.task('interval', id='archivar_cobros_job', seconds=INTERVALO_ARCHIVO_SEGUNDOS, misfire_grace_time=900)
+@medir_tarea('archivar_cobros')
+def archivar_cobros():
+    """
+    Mueve al archivo los cobros cerrados hace más de ARCHIVO_ANTIGUEDAD_DIAS. Cada lote usa su
+    propia conexión del pool y su propia transacción, con una pausa entre lotes; la pasada se
+    corta al llegar a ARCHIVO_MAXIMO_LOTES_POR_PASADA o si esta instancia deja la ingesta.
+    """
+    corte = datetime.now() - timedelta(days=ARCHIVO_ANTIGUEDAD_DIAS)
+    movidos = 0
+    for _ in range(ARCHIVO_MAXIMO_LOTES_POR_PASADA):
+        if not ingesta_activa.is_set():
+            break
+        with app.app_context():
+            try:
+                lote = archivador_cobros.archivar_lote(mysql.connection, corte)
+            except Exception as e:
+                logger.error(f"Scheduler: Error al archivar cobros cerrados: {e}")
+                break
+        movidos += lote
+        if lote < ARCHIVO_TAMANO_LOTE:
+            break
+        time.sleep(ARCHIVO_PAUSA_ENTRE_LOTES_SEGUNDOS)
+    if movidos:
+        logger.info(f"Scheduler: {movidos} cobros cerrados antes de {corte:%Y-%m-%d} movidos al archivo.")
+
+# Huella del último plano publicado (formato binario); el broker lo retiene para los displays que se conecten
+huella_plano_publicado = None
+
+def publicar_plano_display(orden):
+    """Publica el plano retenido antes del primer keyframe binario que lo usa."""
+    global huella_plano_publicado
+    huella = huella_plano(orden)
+    if huella == huella_plano_publicado:
+        return
+    info = client_mqtt.publish(TOPIC_DISPLAY_PLANO, codificar_plano(orden), qos=1, retain=True)
+    if info.rc != mqtt.MQTT_ERR_SUCCESS:
+        raise RuntimeError(f"No se pudo publicar el plano del display (rc={info.rc}).")
+    huella_plano_publicado = huella
+    logger.info(f"Display: Plano de {len(orden)} cubículos publicado (huella {huella:08X}).")
+
 @scheduler.task('interval', id='actualizar_display_job', seconds=5, misfire_grace_time=60)
+@medir_tarea('actualizar_estado_display')
 def actualizar_estado_display():
-    """Calcula el estado general (libres y ocupación por cubículo) y lo envía al display OLED."""
+    """
+    Envía al display OLED solo lo que cambió desde la última publicación (delta con 'seq'),
+    más un keyframe completo cada DISPLAY_INTERVALO_KEYFRAME_SEGUNDOS. Si ninguna transición
+    marcó cambios y no toca keyframe, no se consulta la DB.
+    """
+    if not publicador_display.necesita_consulta():
+        return
+
     with app.app_context():
         cur = connect_db_dict()
         try:
-            sql_query = "SELECT nombre, estado, tipo_vehiculo FROM cubiculos WHERE nombre LIKE 'A%' OR nombre LIKE 'B%' ORDER BY nombre ASC"
-            cur.execute(sql_query)
+            sql_query = "SELECT nombre, estado, zona FROM cubiculos WHERE zona IN (%s, %s) ORDER BY nombre ASC"
+            cur.execute(sql_query, (ZONA_CARROS, ZONA_MOTOS))
             cubiculos_data = cur.fetchall()
             
             libres_carro = 0
-            display_data = []
+            estados = []
             
             for c in cubiculos_data:
-                if c['nombre'].startswith('A') and c['estado'] == 'Libre':
+                if c['zona'] == ZONA_CARROS and c['estado'] == 'Libre':
                     libres_carro += 1
-                
-                display_data.append({
-                    'cub': c['nombre'],
-                    'est': c['estado']
-                })
-
-            payload = json.dumps({
-                "libres": libres_carro, 
-                "data": display_data
-            })
+                estados.append((c['nombre'], c['estado']))
+
+            payload = publicador_display.construir(estados, libres_carro)
+            if payload is None:
+                return
 
-            client_mqtt.publish(TOPIC_DISPLAY_ESTADO_GENERAL, payload, qos=1)
-            logger.debug(f"Display: Estado publicado con {libres_carro} cubículos libres (Carros).")
+            if FORMATO_PAYLOAD_DISPLAY == 'binario':
+                publicar_plano_display(publicador_display.orden())
+                datos = codificar_display(payload, publicador_display.orden())
+            else:
+                datos = json.dumps(payload)
+            client_mqtt.publish(TOPIC_DISPLAY_ESTADO_GENERAL, datos, qos=1)
+            logger.debug(f"Display: Publicado '{payload['tipo']}' seq {payload['seq']} ({len(datos)} bytes) con {libres_carro} cubículos libres (Carros).")
             
         except Exception as e:
+            # Se vuelve a marcar para reintentar en el próximo ciclo
+            publicador_display.marcar_cambio()
             logger.error(f"Error al actualizar estado del display: {e}")
         finally:
             cur.close()
@@ -333,11 +808,95 @@ def index():
 def historial():
     return render_template('historial.html')
 
-@app.route('/api/estado_parqueadero')
-def get_estado():
+# ------------------------- BÚSQUEDA POR PLACA / CÓDIGO -------------------------
+
+_siembra_busqueda = threading.Lock()
+
+def sembrar_indices_busqueda():
+    """Lee de la DB los cubículos y las placas del historial y reemplaza ambos índices. Requiere contexto de aplicación."""
+    cur = mysql.connection.cursor()
+    try:
+        version_lectura = indice_cubiculos.version()
+        cur.execute("""
+            SELECT c.nombre, COALESCE(rc.placa, c.placa)
+            FROM cubiculos c LEFT JOIN registro_cobro rc ON c.registro_cobro_id = rc.id
+        """)
+        total_cubiculos = indice_cubiculos.sembrar([(nombre, (nombre, placa)) for nombre, placa in cur.fetchall()], version_lectura)
+
+        version_lectura = indice_placas.version()
+        cur.execute("""
+            SELECT placa FROM registro_cobro WHERE placa IS NOT NULL
+            UNION
+            SELECT placa FROM registro_cobro_archivo WHERE placa IS NOT NULL
+        """)
+        total_placas = indice_placas.sembrar([(placa, (placa,)) for (placa,) in cur.fetchall()], version_lectura)
+    finally:
+        cur.close()
+    logger.info(f"Búsqueda: {total_cubiculos} cubículos y {total_placas} placas del historial indexados.")
+
+def _resembrar_indices_busqueda():
+    try:
+        with app.app_context():
+            sembrar_indices_busqueda()
+    except Exception as e:
+        logger.error(f"Búsqueda: No se pudieron volver a sembrar los índices: {e}")
+    finally:
+        _siembra_busqueda.release()
+
+def asegurar_indices_busqueda():
+    """
+    Siembra los índices de búsqueda desde la DB la primera vez que se usan en este proceso. Después
+    los vuelve a sembrar en segundo plano cada BUSQUEDA_RESIEMBRA_SEGUNDOS (la consulta en curso usa
+    los índices actuales): así se corrigen eventos internos perdidos y se descartan placas viejas.
+    """
+    if not (indice_cubiculos.sembrado and indice_placas.sembrado):
+        with _siembra_busqueda:
+            if not (indice_cubiculos.sembrado and indice_placas.sembrado):
+                sembrar_indices_busqueda()
+        return
+    if indice_placas.vencido(BUSQUEDA_RESIEMBRA_SEGUNDOS) and _siembra_busqueda.acquire(blocking=False):
+        threading.Thread(target=_resembrar_indices_busqueda, name="resiembra-busqueda", daemon=True).start()
+
+def filtro_busqueda_historial(termino):
+    """
+    Filtro SQL de la búsqueda del historial por placa/código o cubículo. Las placas que contienen
+    el término salen del índice en memoria y MySQL las busca por ix_registro_placa; si el término
+    coincide con demasiadas placas (ej. una sola letra) se usa LIKE dentro del rango de fechas.
+    """
+    asegurar_indices_busqueda()
+    placas = indice_placas.buscar(termino, limite=BUSQUEDA_MAXIMO_PLACAS_HISTORIAL)
+    if placas is None:
+        patron = f"%{termino}%"
+        return " AND (r.placa LIKE %s OR c.nombre LIKE %s) ", [patron, patron]
+
+    # El índice de cubículos también contiene la placa actual: aquí solo cuenta el nombre
+    cubiculos = [nombre for nombre in indice_cubiculos.buscar(termino) if termino in nombre]
+    return filtro_placas_cubiculos(placas, cubiculos)
+
+def filtro_placas_cubiculos(placas, cubiculos):
+    """Filtro ' AND (r.placa IN (...) OR c.nombre IN (...)) ' con las coincidencias exactas del índice."""
+    condiciones, params = [], []
+    if placas:
+        condiciones.append(f"r.placa IN ({', '.join(['%s'] * len(placas))})")
+        params += placas
+    if cubiculos:
+        condiciones.append(f"c.nombre IN ({', '.join(['%s'] * len(cubiculos))})")
+        params += cubiculos
+    if not condiciones:
+        return " AND 1 = 0 ", []
+    return f" AND ({' OR '.join(condiciones)}) ", params
+
+def construir_estado_parqueadero(search_term=''):
+    """Lista de cubículos con su registro activo y cobro en curso (cuerpo de /api/estado_parqueadero)."""
+    # La búsqueda se resuelve en el índice en memoria: la consulta solo lee los cubículos encontrados
+    nombres = None
+    if search_term:
+        asegurar_indices_busqueda()
+        nombres = indice_cubiculos.buscar(search_term)
+        if not nombres:
+            return []
+
     cur = connect_db_dict()
-    
-    search_term = request.args.get('search', '').strip().upper() 
     params = []
 
     sql_query = """
@@ -349,22 +908,21 @@ def get_estado():
     LEFT JOIN registro_cobro rc ON c.registro_cobro_id = rc.id
     """
     
-    if search_term:
-        sql_query += " WHERE c.placa LIKE %s OR c.nombre LIKE %s "
-        search_pattern = f"%{search_term}%"
-        params.append(search_pattern)
-        params.append(search_pattern)
+    if nombres:
+        sql_query += f" WHERE c.nombre IN ({', '.join(['%s'] * len(nombres))}) "
+        params.extend(nombres)
 
     sql_query += " ORDER BY c.nombre ASC"
     
     try:
         cur.execute(sql_query, tuple(params))
         cubiculos_data = cur.fetchall()
-    except Exception as e:
-        logger.error(f"Error al ejecutar consulta de estado: {e}")
+        # Las tarifas se toman una sola vez por petición desde el cache (no una consulta por cubículo)
+        tarifas_por_tipo = cache_tarifas.todas()
+    finally:
         cur.close()
-        return jsonify({'error': 'Error de base de datos al obtener estado'}), 500
     
+    ahora = datetime.now()
     estado_parqueadero = []
     
     for cubiculo_data in cubiculos_data:
@@ -374,7 +932,6 @@ def get_estado():
         minutos = 0
         cobro_actual = 0.0
         hora_ingreso = cubiculo_data['hora_ingreso']
-        cubiculo_id = cubiculo_data['id']
         
         if cubiculo_data['registro_id']:
             minutos = cubiculo_data['tiempo_minutos_calc'] if cubiculo_data['tiempo_minutos_calc'] is not None else 0
@@ -382,13 +939,13 @@ def get_estado():
             if cubiculo_data['estado'] == 'Ocupado' or cubiculo_data['estado'] == 'Pendiente':
                 
                 if hora_ingreso:
-                    minutos_calc, cobro_actual = calcular_cobro_activo(hora_ingreso, cubiculo_id, cur=None) 
+                    minutos_calc, cobro_actual = calcular_cobro_en_lote(hora_ingreso, cubiculo_data['tipo_vehiculo'], tarifas_por_tipo, ahora) 
                     minutos = minutos_calc 
                 
         estado_parqueadero.append({
             'nombre': cubiculo_data['nombre'],
             'estado': cubiculo_data['estado'],
-            'hora_ingreso': hora_ingreso.strftime('%Y-%m-%d %H:%M:%S') if hora_ingreso else None,
+            'hora_ingreso': formatear_fecha(hora_ingreso),
             'registro_id': cubiculo_data['registro_id'],
             'placa': placa_final, 
             'tipo_vehiculo': cubiculo_data['tipo_vehiculo'],
@@ -396,9 +953,281 @@ def get_estado():
             'cobro_actual': round(cobro_actual, 2)
         })
     
-    cur.close()
-    return jsonify(estado_parqueadero)
+    return estado_parqueadero
+
+def responder_condicional(etag, construir, cabeceras=None):
+    """
+    GET condicional: si el navegador envía el mismo ETag (If-None-Match) responde 304 sin llamar a
+    'construir' (ni a MySQL); si no, arma la respuesta y le agrega el ETag. La versión se lee antes
+    de construir: un cambio concurrente solo puede hacer que la siguiente consulta no sea 304.
+    'cabeceras' se agregan a ambas respuestas (datos que cambian aunque el cuerpo siga válido).
+    """
+    if request.if_none_match.contains_weak(etag):
+        respuesta = Response(status=304)
+    else:
+        respuesta = app.make_response(construir())
+        if respuesta.status_code != 200:
+            return respuesta
+    respuesta.set_etag(etag, weak=True)
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    respuesta.headers.extend(cabeceras or {})
+    return respuesta
+
+def ventana_tiempo(segundos):
+    """Número de la ventana de reloj actual: forma parte del ETag de datos que cambian con el tiempo."""
+    return int(time.time() // segundos)
+
+@app.route('/api/estado_parqueadero')
+def get_estado():
+    """
+    Estado de los cubículos. El ETag depende solo de las transiciones y tarifas aplicadas (no del
+    reloj): con 304 'tiempo_minutos' y 'cobro_actual' del cuerpo guardado quedan atrasados y el
+    cliente los recalcula desde 'hora_ingreso', como en el stream SSE. Para eso cada respuesta
+    lleva la hora del servidor (X-Servidor-Ahora) y el tiempo de gracia (X-Tiempo-Gracia-Minutos).
+    """
+    search_term = request.args.get('search', '').strip().upper() 
+
+    def construir():
+        try:
+            return jsonify(construir_estado_parqueadero(search_term))
+        except Exception as e:
+            logger.error(f"Error al ejecutar consulta de estado: {e}")
+            return jsonify({'error': 'Error de base de datos al obtener estado'}), 500
 
+    return responder_condicional(version_estado.etag('e'), construir, {
+        'X-Servidor-Ahora': formatear_fecha(datetime.now()),
+        'X-Tiempo-Gracia-Minutos': str(TIEMPO_GRACIA_MINUTOS)
+    })
+
+@app.route('/api/estado_parqueadero/stream')
+def stream_estado():
+    """
+    Monitor en vivo por Server-Sent Events. Envía un 'snapshot' inicial (cubículos, tarifas,
+    tiempo de gracia y hora del servidor) y luego un evento 'cubiculo' por cada transición y
+    'tarifas' al cambiar tarifas. El cobro en curso lo recalcula el navegador. Con
+    SSE_MAXIMO_CLIENTES_POR_PROCESO streams abiertos responde 503 y el monitor usa el sondeo.
+    """
+    # Suscribirse ANTES de leer el snapshot: ningún cambio queda entre ambos
+    suscripcion = bus_eventos.suscribir()
+    if suscripcion is None:
+        # Tope de streams del proceso: cada uno retiene un hilo del servidor; el monitor sigue por sondeo
+        return jsonify({'error': 'Demasiados monitores en vivo; usando actualización periódica.'}), 503, {
+            'Retry-After': str(SSE_REINTENTO_TOPE_MS // 1000)
+        }
+    try:
+        snapshot = {
+            'cubiculos': construir_estado_parqueadero(),
+            'tarifas': {tipo: [int(valor) for valor in valores] for tipo, valores in cache_tarifas.todas().items()},
+            'tiempo_gracia_minutos': TIEMPO_GRACIA_MINUTOS,
+            'servidor_ahora': formatear_fecha(datetime.now())
+        }
+    except Exception as e:
+        bus_eventos.desuscribir(suscripcion)
+        logger.error(f"Error al construir snapshot del stream de estado: {e}")
+        return jsonify({'error': 'Error de base de datos al obtener estado'}), 500
+
+    def generar():
+        try:
+            yield f"retry: {SSE_REINTENTO_MS}\n\n"
+            yield formatear_sse('snapshot', snapshot)
+            while not suscripcion.desbordada:
+                try:
+                    evento, datos = suscripcion.cola.get(timeout=SSE_INTERVALO_PING_SEGUNDOS)
+                except queue.Empty:
+                    # Comentario SSE: mantiene viva la conexión a través de proxies
+                    yield ": ping\n\n"
+                    continue
+                yield formatear_sse(evento, datos)
+        finally:
+            bus_eventos.desuscribir(suscripcion)
+
+    return Response(generar(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+# ------------------------- MIGRACIONES E ÍNDICES -------------------------
+
+@app.cli.command('migrar')
+def migrar():
+    """Aplica las migraciones pendientes de migraciones/ (uso: flask --app app migrar)."""
+    try:
+        nuevas = aplicar_migraciones(mysql.connection)
+    except RequisitoMigracion as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Migraciones aplicadas: {', '.join(nuevas)}" if nuevas else "El esquema ya está al día.")
+
+def consultas_historial_verificacion():
+    """
+    Consultas del historial armadas con los mismos constructores que /api/reporte y la exportación,
+    para que EXPLAIN vea ambas ramas del UNION ALL (registro_cobro y registro_cobro_archivo).
+    """
+    ahora = datetime.now()
+    filtro, params = rango_reporte({'inicio': (ahora - timedelta(days=400)).strftime('%Y-%m-%d'),
+                                    'fin': ahora.strftime('%Y-%m-%d')})
+    filtro_busqueda, params_busqueda = filtro_placas_cubiculos(['ABC123', 'A-001'], ['A1'])
+    cursor_ejemplo = (ahora - timedelta(days=200), 1)
+    tablas = ['r', 'c']
+    return [
+        ("reporte: primera página del historial",
+         *consulta_pagina_historial(filtro, params, REPORTE_LIMITE_POR_DEFECTO), tablas),
+        ("reporte: página siguiente (cursor)",
+         *consulta_pagina_historial(filtro, params, REPORTE_LIMITE_POR_DEFECTO, cursor_ejemplo), tablas),
+        ("reporte: búsqueda por placas y cubículos del índice en memoria",
+         *consulta_pagina_historial(filtro + filtro_busqueda, params + params_busqueda, REPORTE_LIMITE_POR_DEFECTO), tablas),
+        ("reporte: totales por tipo (sin resumen)", *consulta_totales_reporte(filtro, params), tablas),
+        ("reporte: totales desde resumen_diario", *consulta_totales_resumen(filtro, params), ['resumen_diario']),
+        ("exportación: lote siguiente", *consulta_lote_exportacion(filtro, params, cursor_ejemplo), tablas),
+    ]
+
+@app.cli.command('verificar-indices')
+def verificar_indices_cmd():
+    """EXPLAIN de las consultas frecuentes; termina con error si alguna no tiene índice aplicable."""
+    cur = connect_db_dict()
+    try:
+        resultados = verificar_indices(cur, CONSULTAS_CRITICAS + consultas_historial_verificacion())
+    finally:
+        cur.close()
+
+    for descripcion, tabla, estado, detalle in resultados:
+        click.echo(f"[{estado:5}] {descripcion} ({tabla}): {detalle}")
+    fallos = sum(1 for r in resultados if r[2] == 'FALLO')
+    if fallos:
+        raise click.ClickException(f"{fallos} accesos sin índice aplicable.")
+
+# ------------------------- RESUMEN DIARIO DE COBROS -------------------------
+
+def tipo_por_zona(nombre):
+    """Tipo de vehículo implícito en la zona del cubículo ('' si la zona no se reconoce)."""
+    zona = zona_de(nombre)
+    if zona == ZONA_CARROS:
+        return TIPO_CARRO
+    if zona == ZONA_MOTOS:
+        return TIPO_MOTO
+    return ''
+
+def acumular_resumen_diario(cur, hora_salida, tipo, minutos, monto):
+    """Suma un cobro cerrado al resumen de su día. Debe ejecutarse dentro de la transacción del cobro."""
+    cur.execute("""
+        INSERT INTO resumen_diario (dia, tipo_vehiculo, cantidad, minutos_totales, monto_total)
+        VALUES (%s, %s, 1, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            cantidad = cantidad + 1,
+            minutos_totales = minutos_totales + VALUES(minutos_totales),
+            monto_total = monto_total + VALUES(monto_total)
+    """, (hora_salida.date(), tipo or '', minutos or 0, monto or 0))
+
+@app.cli.command('reconstruir-resumen')
+@click.option('--desde', default=None, help='Primer día a reconstruir (YYYY-MM-DD). Por defecto, todo el historial.')
+@click.option('--hasta', default=None, help='Último día a reconstruir (YYYY-MM-DD), incluido.')
+def reconstruir_resumen(desde, hasta):
+    """Reconstruye resumen_diario a partir del historial, caliente y archivado (uso: flask --app app reconstruir-resumen)."""
+    filtro, params = rango_reporte({'inicio': desde, 'fin': hasta})
+    filtro_dia = filtro.replace('r.hora_salida', 'dia')
+
+    db = mysql.connection
+    cur = db.cursor()
+    try:
+        cur.execute(f"DELETE FROM resumen_diario WHERE 1 = 1 {filtro_dia}", tuple(params))
+        borradas = cur.rowcount
+        # Para tickets cerrados el cubículo ya no conserva el tipo del vehículo: se deduce de la zona
+        union, params_union = union_historial(
+            "DATE(r.hora_salida) AS dia, CASE c.zona WHEN %s THEN %s WHEN %s THEN %s ELSE '' END AS tipo, "
+            "r.tiempo_total_minutos, r.monto_cobrado",
+            filtro, [ZONA_CARROS, TIPO_CARRO, ZONA_MOTOS, TIPO_MOTO] + list(params))
+        cur.execute(f"""
+            INSERT INTO resumen_diario (dia, tipo_vehiculo, cantidad, minutos_totales, monto_total)
+            SELECT
+                dia,
+                tipo,
+                COUNT(*),
+                COALESCE(SUM(tiempo_total_minutos), 0),
+                COALESCE(SUM(monto_cobrado), 0)
+            FROM ({union}) h
+            GROUP BY dia, tipo
+        """, tuple(params_union))
+        insertadas = cur.rowcount
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error al reconstruir resumen_diario: {e}")
+        raise
+    finally:
+        cur.close()
+
+    click.echo(f"resumen_diario reconstruido: {borradas} filas borradas, {insertadas} filas (día, tipo) insertadas.")
+
+# ------------------------- SIMULACIÓN DE TARIFAS SOBRE EL HISTORIAL -------------------------
+
+@app.cli.command('simular-tarifas')
+@click.option('--desde', default=None, help='Primer día de salida a incluir (YYYY-MM-DD).')
+@click.option('--hasta', default=None, help='Último día de salida a incluir (YYYY-MM-DD), incluido.')
+@click.option('--tipo', type=click.Choice([TIPO_CARRO, TIPO_MOTO]), default=None, help='Tipo cuya tarifa se simula.')
+@click.option('--primera-hora', type=float, default=None, help='Tarifa simulada de la primera hora.')
+@click.option('--hora-subsiguiente', type=float, default=None, help='Tarifa simulada de cada hora subsiguiente.')
+@click.option('--verificar', is_flag=True, help='Compara cada cobro vectorizado con calcular_cobro_avanzado.')
+def simular_tarifas(desde, hasta, tipo, primera_hora, hora_subsiguiente, verificar):
+    """
+    Recalcula los cobros cerrados del rango con las tarifas vigentes y, si se indica --tipo,
+    con una tarifa simulada para ese tipo (ej.: ¿cuánto habría cobrado el trimestre con la nueva tarifa CARRO?).
+    """
+    filtro, params = rango_reporte({'inicio': desde, 'fin': hasta})
+    tarifas_vigentes = leer_tarifas_db()
+    tarifas_simuladas = dict(tarifas_vigentes)
+    if tipo:
+        # Decimal, como llegan de la DB, para que el cálculo escalar y el vectorizado sean exactos
+        actual_primera, actual_sub = tarifas_vigentes.get(tipo, (0, 0))
+        tarifas_simuladas[tipo] = (
+            Decimal(str(primera_hora)) if primera_hora is not None else actual_primera,
+            Decimal(str(hora_subsiguiente)) if hora_subsiguiente is not None else actual_sub,
+        )
+
+    union, params_union = union_historial(
+        "COALESCE(r.tiempo_total_minutos, 0), CASE c.zona WHEN %s THEN %s WHEN %s THEN %s END AS tipo, "
+        "COALESCE(r.monto_cobrado, 0)",
+        filtro, [ZONA_CARROS, TIPO_CARRO, ZONA_MOTOS, TIPO_MOTO] + list(params))
+    cur = mysql.connection.cursor(cursors.SSCursor)
+    cur.execute(union, tuple(params_union))
+
+    estadias = 0
+    cobrado = 0.0
+    recalculado = 0
+    simulado = 0
+    diferencias = []
+    try:
+        while True:
+            filas = cur.fetchmany(SIMULACION_TAMANO_LOTE)
+            if not filas:
+                break
+            minutos = [fila[0] for fila in filas]
+            tipos = [fila[1] for fila in filas]
+            estadias += len(filas)
+            cobrado += float(sum(fila[2] for fila in filas))
+            recalculado += int(calcular_cobros_vectorizado(minutos, tipos, tarifas_vigentes).sum())
+            simulado += int(calcular_cobros_vectorizado(minutos, tipos, tarifas_simuladas).sum())
+            if verificar:
+                diferencias += comparar_con_escalar(calcular_cobro_avanzado, minutos, tipos, tarifas_simuladas)
+    finally:
+        cur.close()
+
+    if verificar:
+        # Además del historial, barre una rejilla de estadías alrededor de los cortes de hora
+        rejilla = list(range(0, 24 * 60 + 2)) * 2
+        tipos_rejilla = [TIPO_CARRO] * (len(rejilla) // 2) + [TIPO_MOTO] * (len(rejilla) // 2)
+        diferencias += comparar_con_escalar(calcular_cobro_avanzado, rejilla, tipos_rejilla, tarifas_simuladas)
+
+    click.echo(f"Estadías: {estadias}")
+    click.echo(f"Cobrado (historial): {int(cobrado)} COP")
+    click.echo(f"Recalculado con tarifas vigentes: {recalculado} COP")
+    if tipo:
+        click.echo(f"Simulado con {tipo} = {tarifas_simuladas[tipo]}: {simulado} COP ({simulado - recalculado:+d} COP)")
+    if verificar:
+        if diferencias:
+            for m, t, escalar, vectorizado in diferencias[:20]:
+                click.echo(f"  DIFERENCIA minutos={m} tipo={t}: escalar={escalar} vectorizado={vectorizado}")
+            raise click.ClickException(f"{len(diferencias)} cobros no coinciden con calcular_cobro_avanzado.")
+        click.echo("Verificación: el cálculo vectorizado coincide con calcular_cobro_avanzado.")
 
 @app.route('/api/finalizar_cobro', methods=['POST'])
 def finalizar_cobro():
@@ -414,7 +1243,12 @@ def finalizar_cobro():
         ahora = datetime.now()
 
         # 1. Buscar el registro activo en la tabla registro_cobro
-        sql_select = "SELECT hora_ingreso, cubiculo_id, placa FROM registro_cobro WHERE id = %s AND hora_salida IS NULL"
+        sql_select = """
+            SELECT rc.hora_ingreso, rc.cubiculo_id, rc.placa, c.nombre, c.tipo_vehiculo
+            FROM registro_cobro rc
+            LEFT JOIN cubiculos c ON c.id = rc.cubiculo_id
+            WHERE rc.id = %s AND rc.hora_salida IS NULL
+        """
         cur.execute(sql_select, (registro_id,))
         resultado = cur.fetchone()
         
@@ -422,18 +1256,23 @@ def finalizar_cobro():
             logger.warning(f"Intento de finalizar cobro para registro no activo: {registro_id}")
             return jsonify({'success': False, 'message': 'Registro activo no encontrado'}), 404
             
-        hora_ingreso, cubiculo_id, placa = resultado
+        hora_ingreso, cubiculo_id, placa, cubiculo_nombre, tipo_vehiculo = resultado
         
         minutos, monto = calcular_cobro_activo(hora_ingreso, cubiculo_id, cur) 
         
         sql_update_cobro = "UPDATE registro_cobro SET hora_salida = %s, tiempo_total_minutos = %s, monto_cobrado = %s WHERE id = %s"
         cur.execute(sql_update_cobro, (ahora, minutos, monto, registro_id))
 
+        # El tipo se toma antes de limpiar el cubículo; en la misma transacción que el cobro
+        acumular_resumen_diario(cur, ahora, tipo_vehiculo or tipo_por_zona(cubiculo_nombre), minutos, monto)
+
         sql_update_cubiculo = "UPDATE cubiculos SET estado = 'Libre', timestamp_ultima_actualizacion = %s, registro_cobro_id = NULL, placa = NULL, tipo_vehiculo = NULL WHERE id = %s"
         cur.execute(sql_update_cubiculo, (ahora, cubiculo_id))
 
         db.commit()
         cur.close()
+        if cubiculo_nombre:
+            registrar_transicion(cubiculo_nombre, 'Libre')
         
         logger.info(f"Cobro manual finalizado para Código {placa} (Reg ID: {registro_id}). Monto: {monto}")
 
@@ -463,6 +1302,8 @@ def editar_placa():
     cur = db.cursor()
     try:
         placa_sanitizada = nueva_placa.upper().strip()
+        cur.execute("SELECT placa FROM registro_cobro WHERE id = %s", (registro_id,))
+        anterior = cur.fetchone()
         
         sql_cobro = "UPDATE registro_cobro SET placa = %s WHERE id = %s"
         cur.execute(sql_cobro, (placa_sanitizada, registro_id))
@@ -470,8 +1311,13 @@ def editar_placa():
         sql_cubiculo = "UPDATE cubiculos SET placa = %s WHERE registro_cobro_id = %s"
         cur.execute(sql_cubiculo, (placa_sanitizada, registro_id))
 
+        cur.execute("SELECT nombre FROM cubiculos WHERE registro_cobro_id = %s", (registro_id,))
+        cubiculo = cur.fetchone()
+
         db.commit()
         cur.close()
+        if cubiculo:
+            publicar_cambio_cubiculo(cubiculo[0], placa_anterior=anterior[0] if anterior else None, placa=placa_sanitizada)
         
         logger.info(f"Placa actualizada manualmente para Reg ID {registro_id} a {placa_sanitizada}.")
         return jsonify({'success': True, 'message': f'Código actualizado a {placa_sanitizada}.'})
@@ -512,6 +1358,7 @@ def cancelar_reserva():
 
         db.commit()
         cur.close()
+        registrar_transicion(cubiculo_nombre, 'Libre')
         
         logger.warning(f"Asignación cancelada manualmente para Cubículo {cubiculo_nombre}, Código {placa} (Reg ID: {registro_id}).")
         return jsonify({'success': True, 'message': f'Asignación del cubículo {cubiculo_nombre} cancelada y liberado.'})
@@ -524,15 +1371,20 @@ def cancelar_reserva():
 
 @app.route('/api/tarifas', methods=['GET', 'POST'])
 def tarifas_api():
-    cur = connect_db_dict()
-    
     if request.method == 'GET':
-        cur.execute("SELECT tipo, tarifa_primera_hora, tarifa_hora_subsiguiente FROM tarifas")
-        tarifas = cur.fetchall()
-        cur.close()
-        return jsonify(tarifas)
+        # La ventana del TTL del cache también cubre cambios hechos directamente en MySQL
+        def construir():
+            cur = connect_db_dict()
+            try:
+                cur.execute("SELECT tipo, tarifa_primera_hora, tarifa_hora_subsiguiente FROM tarifas")
+                return jsonify(cur.fetchall())
+            finally:
+                cur.close()
+
+        return responder_condicional(version_tarifas.etag('t', ventana_tiempo(TARIFAS_CACHE_TTL_SEGUNDOS)), construir)
         
     elif request.method == 'POST':
+        cur = connect_db_dict()
         data = request.json
         tipo = data.get('tipo')
         tarifa_ph = data.get('tarifa_primera_hora')
@@ -557,6 +1409,8 @@ def tarifas_api():
             cur.execute(sql, (tipo, tarifa_ph, tarifa_hs))
             mysql.connection.commit()
             cur.close()
+            aplicar_cambio_tarifas({tipo: [tarifa_ph, tarifa_hs]})
+            canal_interno.publicar('tarifas', tarifas={tipo: [tarifa_ph, tarifa_hs]})
             logger.info(f"Tarifas para {tipo} actualizadas a PH:{tarifa_ph}, HS:{tarifa_hs}")
             return jsonify({'success': True, 'message': f'Tarifas para {tipo} actualizadas exitosamente'})
         except ValueError:
@@ -569,34 +1423,132 @@ def tarifas_api():
 
 @app.route('/api/tarifas_por_cubiculo/<string:cubiculo_nombre>', methods=['GET'])
 def get_tarifas_por_cubiculo(cubiculo_nombre):
-    cur = mysql.connection.cursor()
-    
-    cur.execute("SELECT tipo_vehiculo FROM cubiculos WHERE nombre = %s", (cubiculo_nombre,))
-    result = cur.fetchone()
-    
-    tipo_vehiculo = result[0] if result and result[0] else (TIPO_CARRO if cubiculo_nombre.startswith('A') else TIPO_MOTO)
-    
-    sql = "SELECT tarifa_primera_hora, tarifa_hora_subsiguiente FROM tarifas WHERE tipo = %s"
-    cur.execute(sql, (tipo_vehiculo,))
-    result = cur.fetchone()
-    cur.close()
+    # Depende del tipo del cubículo (cambia con las transiciones) y de las tarifas: versión de estado
+    def construir():
+        cur = mysql.connection.cursor()
+        
+        cur.execute("SELECT tipo_vehiculo FROM cubiculos WHERE nombre = %s", (cubiculo_nombre,))
+        result = cur.fetchone()
+        
+        tipo_vehiculo = result[0] if result and result[0] else (TIPO_CARRO if cubiculo_nombre.startswith('A') else TIPO_MOTO)
+        cur.close()
+        
+        result = cache_tarifas.obtener(tipo_vehiculo)
 
-    if result:
-        return jsonify({
-            'tipo': tipo_vehiculo,
-            'primera_hora': int(result[0]),  
-            'subsiguiente': int(result[1])
-        })
-    
-    return jsonify({'error': 'Tarifa no encontrada'}), 404
+        if result:
+            return jsonify({
+                'tipo': tipo_vehiculo,
+                'primera_hora': int(result[0]),  
+                'subsiguiente': int(result[1])
+            })
+        
+        return jsonify({'error': 'Tarifa no encontrada'}), 404
+
+    return responder_condicional(version_estado.etag('c', ventana_tiempo(TARIFAS_CACHE_TTL_SEGUNDOS)), construir)
+
+
+# ------------------------- MÉTRICAS HTTP Y EXPOSICIÓN PROMETHEUS -------------------------
+
+@app.before_request
+def iniciar_medicion_peticion():
+    g.inicio_peticion = time.perf_counter()
+
+@app.after_request
+def registrar_medicion_peticion(respuesta):
+    inicio = g.pop('inicio_peticion', None)
+    if inicio is not None:
+        # La regla de ruta ('/api/tarifas_por_cubiculo/<nombre>'), no la URL: una serie por endpoint
+        regla = request.url_rule.rule if request.url_rule else 'sin_ruta'
+        histograma_http.observar(time.perf_counter() - inicio, regla, request.method, str(respuesta.status_code))
+    return respuesta
+
+registro_metricas.registrar(Medidor(
+    'parqueadero_mqtt_cola_profundidad', 'Mensajes MQTT esperando trabajador de DB.',
+    lambda: despachador_mqtt.profundidad() + despachador_entradas.profundidad()))
+registro_metricas.registrar(Medidor(
+    'parqueadero_ocupacion_pendientes', 'Cubículos reportados como ocupados aún sin escribir en la DB.',
+    lambda: buffer_ocupacion.estadisticas()['pendientes']))
+registro_metricas.registrar(Medidor(
+    'parqueadero_db_pool_conexiones', 'Conexiones del pool MySQL por estado.',
+    lambda: [(('en_uso',), pool_db.estadisticas()['en_uso']), (('libres',), pool_db.estadisticas()['libres'])],
+    ('estado',)))
+registro_metricas.registrar(Medidor(
+    'parqueadero_sse_clientes', 'Monitores conectados por SSE.',
+    lambda: bus_eventos.estadisticas()['clientes_conectados']))
+registro_metricas.registrar(Medidor(
+    'parqueadero_reservas_armadas', 'Reservas pendientes con vencimiento armado.',
+    lambda: expirador_reservas.estadisticas()['armadas_ahora']))
+registro_metricas.registrar(Medidor(
+    'parqueadero_es_lider', '1 si este proceso ejecuta la ingesta MQTT y el scheduler.',
+    lambda: 1 if eleccion_lider.es_lider else 0))
+registro_metricas.registrar(Medidor(
+    'parqueadero_cubiculos_libres', 'Cubículos libres en memoria por zona.',
+    lambda: [((zona,), libres) for zona, libres in asignador.estadisticas()['libres_por_zona'].items()],
+    ('zona',)))
+
+TIPO_CONTENIDO_METRICAS = 'text/plain; version=0.0.4; charset=utf-8'
+
+@app.route('/metrics', methods=['GET'])
+def metrics_prometheus():
+    """Histogramas y medidores en formato de texto de Prometheus."""
+    if en_worker_web:
+        # Worker de gunicorn: el puerto web reparte las peticiones entre workers y cada uno tiene
+        # sus propios contadores; se juntan los de todos, con la etiqueta 'worker' (su índice)
+        return Response(exponer_metricas_workers(), mimetype=TIPO_CONTENIDO_METRICAS)
+    return Response(registro_metricas.exponer(), mimetype=TIPO_CONTENIDO_METRICAS)
+
+def exponer_metricas_workers():
+    """Lee el /metrics propio de cada worker web (WEB_PUERTO_METRICAS_BASE + índice) y los combina."""
+    exposiciones = {}
+    for indice in range(WEB_WORKERS):
+        url = f"http://127.0.0.1:{WEB_PUERTO_METRICAS_BASE + indice}/metrics"
+        try:
+            with urllib.request.urlopen(url, timeout=WEB_TIMEOUT_METRICAS_WORKER_SEGUNDOS) as respuesta:
+                exposiciones[str(indice)] = respuesta.read().decode('utf-8')
+        except OSError as e:
+            logger.warning(f"Métricas: El worker {indice} no respondió en {url}: {e}")
+            exposiciones[str(indice)] = None
+    return combinar_exposiciones(exposiciones)
+
+def app_metricas_worker(environ, start_response):
+    """WSGI mínima del puerto de métricas de un worker web: solo GET /metrics."""
+    if environ.get('PATH_INFO') != '/metrics':
+        start_response('404 NOT FOUND', [('Content-Type', 'text/plain')])
+        return [b'']
+    cuerpo = registro_metricas.exponer().encode('utf-8')
+    start_response('200 OK', [('Content-Type', TIPO_CONTENIDO_METRICAS), ('Content-Length', str(len(cuerpo)))])
+    return [cuerpo]
+
+@app.route('/api/metricas', methods=['GET'])
+def get_metricas():
+    """Contadores internos de rendimiento (aciertos/fallos del cache de tarifas, etc.)."""
+    return jsonify({
+        'cache_tarifas': cache_tarifas.estadisticas(),
+        'asignador': asignador.estadisticas(),
+        'secuencia_tickets': secuencia_tickets.estadisticas(),
+        'latencia_entrada_a_apertura': latencia_entrada.resumen(),
+        'cola_mqtt': despachador_mqtt.estadisticas(),
+        'cola_entradas': despachador_entradas.estadisticas(),
+        'buffer_ocupacion': buffer_ocupacion.estadisticas(),
+        'commits_ocupacion': commits_ocupacion.resumen(),
+        'display': publicador_display.estadisticas(),
+        'sse': bus_eventos.estadisticas(),
+        'pool_db': pool_db.estadisticas(),
+        'expiracion_reservas': expirador_reservas.estadisticas(),
+        'archivo_cobros': archivador_cobros.estadisticas(),
+        'busqueda': {'cubiculos': indice_cubiculos.estadisticas(), 'placas': indice_placas.estadisticas()},
+        'eventos_internos': canal_interno.estadisticas(),
+        'lider': eleccion_lider.estadisticas(),
+        'tareas': {
+            'limpieza_pendientes': metricas_limpieza.resumen(),
+        }
+    })
 
 
-@app.route('/api/reporte', methods=['GET'])
-def get_reporte():
-    fecha_inicio = request.args.get('inicio')
-    fecha_fin = request.args.get('fin')
-    
-    cur = connect_db_dict()
+def rango_reporte(args):
+    """Convierte los parámetros 'inicio' y 'fin' (YYYY-MM-DD) en el filtro SQL sobre hora_salida."""
+    fecha_inicio = args.get('inicio')
+    fecha_fin = args.get('fin')
 
     fecha_inicio_param = fecha_inicio if fecha_inicio else None
     fecha_fin_ajustada = None
@@ -608,84 +1560,201 @@ def get_reporte():
         except ValueError:
             logger.warning(f"Formato de fecha de fin inválido: {fecha_fin}")
             fecha_fin_ajustada = None 
-    
-    query_historial = """
-    SELECT 
-        r.id, 
-        c.nombre AS cubiculo, 
-        r.placa, 
-        r.hora_ingreso, 
-        r.hora_salida, 
-        r.tiempo_total_minutos, 
-        r.monto_cobrado,
-        c.tipo_vehiculo
-    FROM registro_cobro r
-    JOIN cubiculos c ON r.cubiculo_id = c.id
-    WHERE r.hora_salida IS NOT NULL
-    """
-    
+
+    filtro = ""
     params = []
     
     if fecha_inicio_param:
-        query_historial += " AND r.hora_salida >= %s "
+        filtro += " AND r.hora_salida >= %s "
         params.append(fecha_inicio_param)
 
     if fecha_fin_ajustada:
-        query_historial += " AND r.hora_salida < %s "
+        filtro += " AND r.hora_salida < %s "
         params.append(fecha_fin_ajustada)
 
-    query_historial += " ORDER BY r.hora_salida DESC"
+    return filtro, params
+
+# Historial de cobros cerrados: tabla caliente + archivo particionado por mes (archivo_cobros.py)
+TABLAS_HISTORIAL = (
+    ('registro_cobro', 'r.hora_salida IS NOT NULL'),
+    ('registro_cobro_archivo', '1 = 1'),
+)
+
+COLUMNAS_HISTORIAL = "r.id, c.nombre AS cubiculo, r.placa, r.hora_ingreso, r.hora_salida, r.tiempo_total_minutos, r.monto_cobrado, c.tipo_vehiculo"
+
+def union_historial(columnas, filtro, params, sufijo=""):
+    """
+    'SELECT columnas ... WHERE cerrado {filtro} {sufijo}' sobre registro_cobro y sobre
+    registro_cobro_archivo, unidas con UNION ALL (cada ticket está en una sola de las dos).
+    'params' son los de UNA rama (filtro y sufijo); se devuelven repetidos para ambas.
+    Con ORDER BY ... LIMIT en 'sufijo' cada rama recorre solo su índice y las particiones del rango.
+    """
+    ramas = [
+        f"""(SELECT {columnas} FROM {tabla} r JOIN cubiculos c ON r.cubiculo_id = c.id
+        WHERE {cerrado} {filtro} {sufijo})"""
+        for tabla, cerrado in TABLAS_HISTORIAL
+    ]
+    return "\nUNION ALL\n".join(ramas), list(params) * len(TABLAS_HISTORIAL)
+
+def consulta_totales_resumen(filtro, params):
+    """
+    Totales por tipo leídos de resumen_diario: O(días del rango), no O(tickets).
+    Los límites del rango son días completos, así que el mismo filtro aplica sobre 'dia'.
+    """
+    return f"""
+        SELECT tipo_vehiculo AS tipo, SUM(cantidad) AS cantidad, SUM(monto_total) AS total
+        FROM resumen_diario
+        WHERE 1 = 1 {filtro.replace('r.hora_salida', 'dia')}
+        GROUP BY tipo_vehiculo
+    """, list(params)
+
+def totales_resumen(cur, filtro, params):
+    """Sumatoria total y conteo por tipo desde resumen_diario (consulta_totales_resumen)."""
+    query_totales, params_totales = consulta_totales_resumen(filtro, params)
+    cur.execute(query_totales, tuple(params_totales))
+
+    sumatoria = 0.0
+    conteo_tipos = {
+        TIPO_CARRO: {'total': 0.0, 'count': 0}, 
+        TIPO_MOTO: {'total': 0.0, 'count': 0}
+    }
+    for fila in cur.fetchall():
+        total = float(fila['total'] or 0)
+        sumatoria += total
+        if fila['tipo'] in conteo_tipos:
+            conteo_tipos[fila['tipo']]['total'] += total
+            conteo_tipos[fila['tipo']]['count'] += int(fila['cantidad'] or 0)
+    return sumatoria, conteo_tipos
+
+def consulta_totales_reporte(filtro, params):
+    """Totales por tipo de vehículo agregados por MySQL (GROUP BY) sobre la tabla caliente y el archivo."""
+    union, params_union = union_historial(
+        "COALESCE(c.tipo_vehiculo, CASE c.zona WHEN %s THEN %s WHEN %s THEN %s END) AS tipo, r.monto_cobrado",
+        filtro, [ZONA_CARROS, TIPO_CARRO, ZONA_MOTOS, TIPO_MOTO] + list(params))
+    return f"""
+    SELECT tipo, COUNT(*) AS cantidad, COALESCE(SUM(monto_cobrado), 0) AS total
+    FROM ({union}) h
+    GROUP BY tipo
+    """, params_union
+
+def totales_reporte(cur, filtro, params):
+    """Sumatoria total y conteo por tipo de vehículo calculados por MySQL (GROUP BY), sin traer las filas."""
+    query_totales, params_totales = consulta_totales_reporte(filtro, params)
+    cur.execute(query_totales, tuple(params_totales))
+
+    sumatoria = 0.0
+    conteo_tipos = {
+        TIPO_CARRO: {'total': 0.0, 'count': 0}, 
+        TIPO_MOTO: {'total': 0.0, 'count': 0}
+    }
+    for fila in cur.fetchall():
+        total = float(fila['total'])
+        sumatoria += total
+        if fila['tipo'] in conteo_tipos:
+            conteo_tipos[fila['tipo']]['total'] += total
+            conteo_tipos[fila['tipo']]['count'] += int(fila['cantidad'])
+    return sumatoria, conteo_tipos
+
+def consulta_pagina_historial(filtro, params, limite, cursor_reporte=None):
+    """
+    Página de /api/reporte: cobros cerrados de más reciente a más antiguo, después de
+    'cursor_reporte' = (hora_salida, id). Trae limite + 1 filas para saber si hay otra página.
+    """
+    params = list(params)
+    if cursor_reporte:
+        filtro += " AND (r.hora_salida < %s OR (r.hora_salida = %s AND r.id < %s)) "
+        params += [cursor_reporte[0], cursor_reporte[0], cursor_reporte[1]]
+
+    # Cada rama (caliente y archivo) entrega su propia página; la unión se vuelve a cortar
+    union, params_historial = union_historial(
+        COLUMNAS_HISTORIAL, filtro, params + [limite + 1],
+        "ORDER BY r.hora_salida DESC, r.id DESC LIMIT %s")
+    return union + " ORDER BY hora_salida DESC, id DESC LIMIT %s", params_historial + [limite + 1]
+
+def consulta_lote_exportacion(filtro, params, ultimo=None):
+    """Lote de la exportación: EXPORTACION_TAMANO_LOTE filas en orden ascendente después de 'ultimo' = (hora_salida, id)."""
+    params = list(params)
+    if ultimo:
+        filtro += " AND (r.hora_salida > %s OR (r.hora_salida = %s AND r.id > %s)) "
+        params += [ultimo[0], ultimo[0], ultimo[1]]
+    union, params_export = union_historial(
+        COLUMNAS_HISTORIAL, filtro, params + [EXPORTACION_TAMANO_LOTE],
+        "ORDER BY r.hora_salida ASC, r.id ASC LIMIT %s")
+    return union + " ORDER BY hora_salida ASC, id ASC LIMIT %s", params_export + [EXPORTACION_TAMANO_LOTE]
+
+def leer_cursor_reporte(cursor_param):
+    """El cursor de paginación es 'YYYY-MM-DD HH:MM:SS|id' de la última fila entregada."""
+    hora_salida, registro_id = cursor_param.rsplit('|', 1)
+    return datetime.strptime(hora_salida, '%Y-%m-%d %H:%M:%S'), int(registro_id)
+
+@app.route('/api/reporte', methods=['GET'])
+def get_reporte():
+    """
+    Historial de cobros cerrados (tabla caliente y archivo), paginado por llave (hora_salida, id) de más reciente a más antiguo.
+    - 'limite' filas por página (máx. REPORTE_LIMITE_MAXIMO); 'cursor' = 'siguiente_cursor' de la página anterior.
+    - La primera página (sin cursor) incluye 'sumatoria_total' y 'conteo_tipos' de TODO el rango,
+      leídos de resumen_diario (o con agregados sobre registro_cobro si REPORTE_TOTALES_DESDE_RESUMEN es False).
+    - 'buscar' filtra por placa/código o cubículo; los totales son entonces los de las filas encontradas.
+    """
+    cursor_param = request.args.get('cursor')
+    try:
+        limite = int(request.args.get('limite', REPORTE_LIMITE_POR_DEFECTO))
+        limite = max(1, min(limite, REPORTE_LIMITE_MAXIMO))
+        cursor_reporte = leer_cursor_reporte(cursor_param) if cursor_param else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Parámetros de paginación inválidos.'}), 400
+
+    filtro, params = rango_reporte(request.args)
+    termino = request.args.get('buscar', '').strip().upper()
+    try:
+        if termino:
+            filtro_busqueda, params_busqueda = filtro_busqueda_historial(termino)
+            filtro += filtro_busqueda
+            params += params_busqueda
+    except Exception as e:
+        logger.error(f"ERROR EN BÚSQUEDA DEL HISTORIAL: {e}")
+        return jsonify({'success': False, 'message': 'Error interno del servidor al consultar la DB.'}), 500
+    cur = connect_db_dict()
+    query_historial, params_historial = consulta_pagina_historial(filtro, params, limite, cursor_reporte)
     
     try:
-        cur.execute(query_historial, tuple(params))
+        cur.execute(query_historial, tuple(params_historial))
         historial = cur.fetchall()
+
+        siguiente_cursor = None
+        if len(historial) > limite:
+            historial = historial[:limite]
+            ultimo = historial[-1]
+            siguiente_cursor = f"{formatear_fecha(ultimo['hora_salida'])}|{ultimo['id']}"
         
         historial_corregido = []
-        sumatoria = 0
-        
-        conteo_tipos = {
-            TIPO_CARRO: {'total': 0.0, 'count': 0}, 
-            TIPO_MOTO: {'total': 0.0, 'count': 0}
-        }
-        
         for item in historial:
             registro = dict(item) 
-            
-            if registro['hora_ingreso']:
-                registro['hora_ingreso'] = registro['hora_ingreso'].strftime('%Y-%m-%d %H:%M:%S')
-            
-            if registro['hora_salida']:
-                registro['hora_salida'] = registro['hora_salida'].strftime('%Y-%m-%d %H:%M:%S')
-                
+            registro['hora_ingreso'] = formatear_fecha(registro['hora_ingreso'])
+            registro['hora_salida'] = formatear_fecha(registro['hora_salida'])
             historial_corregido.append(registro)
-            
-            monto = float(registro['monto_cobrado']) if registro['monto_cobrado'] is not None else 0.0
-            
-            tipo = registro['tipo_vehiculo']
-            if not tipo and registro.get('cubiculo'):
-                 if registro['cubiculo'].startswith('A'):
-                     tipo = TIPO_CARRO
-                 elif registro['cubiculo'].startswith('B'):
-                     tipo = TIPO_MOTO
-                     
-            sumatoria += monto
-            
-            if tipo in conteo_tipos:
-                conteo_tipos[tipo]['total'] += monto
-                conteo_tipos[tipo]['count'] += 1
-            
-        
-        cur.close()
-        logger.info(f"Reporte generado. Total: {int(sumatoria)} COP. Carros: {conteo_tipos[TIPO_CARRO]['count']}, Motos: {conteo_tipos[TIPO_MOTO]['count']}")
 
-        return jsonify({
+        respuesta = {
             'historial': historial_corregido,
-            'sumatoria_total': int(sumatoria),
-            'conteo_tipos': {
+            'siguiente_cursor': siguiente_cursor,
+            'limite': limite
+        }
+
+        if not cursor_reporte:
+            # resumen_diario no tiene placas: con búsqueda se agregan las filas filtradas
+            if REPORTE_TOTALES_DESDE_RESUMEN and not termino:
+                sumatoria, conteo_tipos = totales_resumen(cur, filtro, params)
+            else:
+                sumatoria, conteo_tipos = totales_reporte(cur, filtro, params)
+            logger.info(f"Reporte generado. Total: {int(sumatoria)} COP. Carros: {conteo_tipos[TIPO_CARRO]['count']}, Motos: {conteo_tipos[TIPO_MOTO]['count']}")
+            respuesta['sumatoria_total'] = int(sumatoria)
+            respuesta['conteo_tipos'] = {
                 TIPO_CARRO: {'total_cobrado': int(conteo_tipos[TIPO_CARRO]['total']), 'cantidad': conteo_tipos[TIPO_CARRO]['count']},
                 TIPO_MOTO: {'total_cobrado': int(conteo_tipos[TIPO_MOTO]['total']), 'cantidad': conteo_tipos[TIPO_MOTO]['count']},
             }
-        })
+        
+        cur.close()
+        return jsonify(respuesta)
 
     except Exception as e:
         cur.close()
@@ -693,11 +1762,124 @@ def get_reporte():
         return jsonify({'success': False, 'message': 'Error interno del servidor al consultar la DB.'}), 500
 
 
-if __name__ == '__main__':
+COLUMNAS_EXPORTACION = ['id', 'cubiculo', 'placa', 'hora_ingreso', 'hora_salida', 'tiempo_total_minutos', 'monto_cobrado', 'tipo_vehiculo']
+
+@app.route('/api/reporte/export', methods=['GET'])
+def exportar_reporte():
+    """
+    Exporta el historial de cobros del rango ('inicio', 'fin', y 'buscar' opcional) como CSV o NDJSON ('formato').
+    Las filas se leen por páginas de EXPORTACION_TAMANO_LOTE con llave (hora_salida, id) sobre la
+    tabla caliente y el archivo, y se envían a medida que llegan: la memoria no crece con el rango.
+    """
+    formato = request.args.get('formato', 'csv').lower()
+    if formato not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'message': "Formato no soportado (use 'csv' o 'ndjson')."}), 400
+
+    filtro, params = rango_reporte(request.args)
+    termino = request.args.get('buscar', '').strip().upper()
+    if termino:
+        filtro_busqueda, params_busqueda = filtro_busqueda_historial(termino)
+        filtro += filtro_busqueda
+        params += params_busqueda
+
+    def filas():
+        cur = mysql.connection.cursor()
+        ultimo = None
+        try:
+            while True:
+                query_lote, params_lote = consulta_lote_exportacion(filtro, params, ultimo)
+                cur.execute(query_lote, tuple(params_lote))
+                lote = cur.fetchall()
+                if not lote:
+                    break
+                ultimo = (lote[-1][4], lote[-1][0])
+                for fila in lote:
+                    registro = dict(zip(COLUMNAS_EXPORTACION, fila))
+                    registro['hora_ingreso'] = formatear_fecha(registro['hora_ingreso'])
+                    registro['hora_salida'] = formatear_fecha(registro['hora_salida'])
+                    if registro['monto_cobrado'] is not None:
+                        registro['monto_cobrado'] = float(registro['monto_cobrado'])
+                    yield registro
+        except Exception as e:
+            logger.error(f"ERROR EN EXPORTACIÓN DE REPORTE: {e}")
+            raise
+        finally:
+            cur.close()
+
+    def generar_csv():
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(COLUMNAS_EXPORTACION)
+        for i, registro in enumerate(filas(), 1):
+            escritor.writerow([registro[columna] for columna in COLUMNAS_EXPORTACION])
+            if i % EXPORTACION_TAMANO_LOTE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        yield buffer.getvalue()
+
+    def generar_ndjson():
+        for registro in filas():
+            yield json.dumps(registro, ensure_ascii=False) + "\n"
+
+    nombre_archivo = f"historial_{request.args.get('inicio') or 'inicio'}_{request.args.get('fin') or 'hoy'}.{formato}"
+    generador = generar_csv() if formato == 'csv' else generar_ndjson()
+    mimetype = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+
+    # stream_with_context mantiene el contexto de aplicación (y su conexión del pool) mientras se envía
+    return Response(stream_with_context(generador), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={nombre_archivo}',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+# ------------------------- ARRANQUE Y APAGADO POR ROL -------------------------
+# Cada réplica (python ingesta.py, o python app.py en desarrollo) compite por el candado de líder:
+# solo el líder ejecuta la ingesta (MQTT de dispositivos, trabajadores de DB, buffer, expirador y
+# scheduler). Los workers web (wsgi.py + gunicorn) y las réplicas en espera solo atienden HTTP y
+# reciben los cambios por el canal de eventos internos.
+
+# Cliente MQTT propio del canal de eventos internos (uno por proceso, con client_id único)
+cliente_mqtt_interno = None
+
+def conectar_canal_interno():
+    global cliente_mqtt_interno
+    cliente = mqtt.Client(client_id=f"FlaskInterno-{socket.gethostname()}-{os.getpid()}", clean_session=True)
+    cliente.username_pw_set(username=MQTT_USER, password=MQTT_PASSWORD)
+    cliente.on_connect = lambda c, userdata, flags, rc: c.subscribe(TOPIC_EVENTOS_INTERNOS, qos=1)
+    cliente.on_message = lambda c, userdata, msg: canal_interno.recibir(msg.payload)
+    canal_interno.conectar(cliente)
+    try:
+        cliente.connect(MQTT_BROKER, MQTT_PORT, 60)
+        cliente.loop_start()
+    except Exception as e:
+        logger.error(f"ERROR: Proceso sin canal de eventos internos ({MQTT_BROKER}:{MQTT_PORT}). El monitor en vivo no recibirá cambios de otros procesos. Error: {e}")
+    cliente_mqtt_interno = cliente
+
+def desconectar_canal_interno():
+    canal_interno.desconectar()
+    if cliente_mqtt_interno is not None:
+        cliente_mqtt_interno.disconnect()
+        cliente_mqtt_interno.loop_stop()
+
+def iniciar_ingesta():
+    """Al ganar el liderazgo: precalienta la DB, conecta MQTT y arranca trabajadores y scheduler."""
+    # Abrir las conexiones mínimas del pool antes de recibir tráfico
+    try:
+        pool_db.precalentar()
+    except Exception as e:
+        logger.error(f"ERROR: No se pudo precalentar el pool de conexiones MySQL. Error: {e}")
+
+    ingesta_activa.set()
+
     # Configurar el cliente MQTT
     client_mqtt.username_pw_set(username=MQTT_USER, password=MQTT_PASSWORD)
     client_mqtt.on_connect = on_connect
     client_mqtt.on_message = on_message
+    despachador_entradas.iniciar()
+    despachador_mqtt.iniciar()
+    buffer_ocupacion.iniciar()
+    expirador_reservas.iniciar()
     
     # Intentar conectar al broker MQTT
     try:
@@ -707,6 +1889,113 @@ if __name__ == '__main__':
     except Exception as e:
         logger.error(f"ERROR: No se pudo conectar al broker MQTT {MQTT_BROKER}:{MQTT_PORT}. Asegúrate de que Mosquitto esté corriendo. Error: {e}")
 
-    # Inicia el scheduler y la aplicación Flask
-    scheduler.start()
-    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
\ No newline at end of file
+    # Sembrar el asignador de cubículos libres antes de procesar entradas
+    try:
+        with app.app_context():
+            sincronizar_asignador()
+            armar_pendientes_sin_plazo()
+        logger.info(f"Asignador de cubículos sembrado: {asignador.estadisticas()['libres_por_zona']}")
+    except Exception as e:
+        logger.error(f"ERROR: No se pudo sembrar el asignador desde la DB (se reintentará en la reconciliación). Error: {e}")
+
+    # El scheduler se arranca una vez; entre liderazgos solo se pausa y se reanuda
+    if scheduler.running:
+        scheduler.resume()
+    else:
+        scheduler.start()
+
+def detener_ingesta(voluntario=True, timeout=INGESTA_TIMEOUT_DRENADO_SEGUNDOS):
+    """
+    Apagado voluntario (SIGTERM, fin de la elección): deja de aceptar mensajes nuevos, pausa el
+    scheduler, procesa lo ya encolado (las órdenes ABRIR aún salen por MQTT) hasta 'timeout'
+    segundos, escribe el buffer de ocupación y recién entonces se desconecta del broker.
+
+    Liderazgo perdido (voluntario=False): otra réplica puede tener ya el candado y estar
+    ingestando, así que se corta MQTT PRIMERO y se descarta lo encolado; solo termina lo que
+    cada trabajador tenga en curso.
+    """
+    ingesta_activa.clear()
+    if not voluntario:
+        logger.warning("Ingesta: liderazgo perdido; desconectando MQTT y descartando lo encolado...")
+        client_mqtt.disconnect()
+        client_mqtt.loop_stop()
+    else:
+        logger.info("Ingesta: apagado ordenado en curso...")
+        try:
+            client_mqtt.unsubscribe(topicos_suscritos())
+        except Exception as e:
+            logger.error(f"Ingesta: No se pudo cancelar la suscripción MQTT: {e}")
+
+    if scheduler.running:
+        scheduler.pause()
+    expirador_reservas.detener()
+    despachador_entradas.detener(drenar=voluntario, timeout=timeout)
+    despachador_mqtt.detener(drenar=voluntario, timeout=timeout)
+    buffer_ocupacion.detener(vaciar=voluntario)
+
+    if voluntario:
+        client_mqtt.disconnect()
+        client_mqtt.loop_stop()
+    logger.info(f"Ingesta detenida. Entradas: {despachador_entradas.estadisticas()} Cola MQTT: {despachador_mqtt.estadisticas()}")
+
+# Solo la réplica con el candado GET_LOCK ejecuta la ingesta; conmutación al morir el líder
+eleccion_lider = EleccionLider(
+    PARAMETROS_DB,
+    nombre_lock=LIDER_NOMBRE_LOCK,
+    al_ganar=iniciar_ingesta,
+    al_perder=detener_ingesta,
+    intervalo=LIDER_INTERVALO_SEGUNDOS,
+    tiempo_sesion=LIDER_TIEMPO_SESION_SEGUNDOS
+)
+
+def iniciar_replica():
+    """Proceso candidato a líder (ingesta.py o app.py): canal interno + elección."""
+    conectar_canal_interno()
+    eleccion_lider.iniciar()
+
+def detener_replica():
+    eleccion_lider.detener()
+    if scheduler.running:
+        scheduler.shutdown(wait=True)
+    desconectar_canal_interno()
+    pool_db.cerrar_todo()
+
+# Servidor de /metrics propio de este worker web (None fuera de gunicorn o si no se pudo abrir el puerto)
+servidor_metricas_worker = None
+en_worker_web = False
+
+def iniciar_web(puerto_metricas=None):
+    """Arranque de cada worker web (post_fork de gunicorn): pool precalentado, canal de eventos internos y /metrics propio."""
+    global servidor_metricas_worker, en_worker_web
+    # Cada worker tiene su propio pool (se crea tras el fork): abrir las conexiones mínimas antes de atender HTTP
+    try:
+        pool_db.precalentar()
+    except Exception as e:
+        logger.error(f"ERROR: No se pudo precalentar el pool de conexiones MySQL del worker {os.getpid()}. Error: {e}")
+    conectar_canal_interno()
+    if puerto_metricas is None:
+        return
+    en_worker_web = True
+    try:
+        servidor_metricas_worker = make_server('0.0.0.0', puerto_metricas, app_metricas_worker, threaded=True)
+    except OSError as e:
+        logger.error(f"Web: No se pudo abrir el puerto de métricas {puerto_metricas}: {e}")
+        return
+    threading.Thread(target=servidor_metricas_worker.serve_forever, name="metricas-web", daemon=True).start()
+    logger.info(f"Worker web {os.getpid()}: métricas en :{puerto_metricas}/metrics")
+
+def detener_web():
+    if servidor_metricas_worker is not None:
+        servidor_metricas_worker.shutdown()
+    desconectar_canal_interno()
+    pool_db.cerrar_todo()
+
+
+if __name__ == '__main__':
+    # Modo de desarrollo: réplica completa (HTTP + candidata a ingesta) en un solo proceso.
+    # En producción: gunicorn -c gunicorn.conf.py wsgi:app  +  python ingesta.py
+    iniciar_replica()
+    try:
+        app.run(host='0.0.0.0', port=WEB_PUERTO, debug=FLASK_DEBUG, use_reloader=False, threaded=True)
+    finally:
+        detener_replica()
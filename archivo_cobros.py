@@ -0,0 +1,125 @@
+# archivo_cobros.py
+# ===========================================
+# ARCHIVO DE COBROS CERRADOS (registro_cobro -> registro_cobro_archivo POR MES)
+# ===========================================
+import logging
+import threading
+from datetime import date
+
+logger = logging.getLogger('FlaskApp')
+
+COLUMNAS_REGISTRO = "id, hora_ingreso, hora_salida, cubiculo_id, placa, tiempo_total_minutos, monto_cobrado"
+
+
+def primer_dia_mes(fecha):
+    return date(fecha.year, fecha.month, 1)
+
+
+def mes_siguiente(mes):
+    return date(mes.year + 1, 1, 1) if mes.month == 12 else date(mes.year, mes.month + 1, 1)
+
+
+def nombre_particion(mes):
+    """Partición mensual: p202405 guarda hora_salida < 2024-06-01 (y >= la partición anterior)."""
+    return f"p{mes:%Y%m}"
+
+
+class ArchivadorCobros:
+    """
+    Mueve a registro_cobro_archivo (migraciones/005_archivo_registro_cobro.sql) los tickets
+    cerrados antes de un corte, sin tocar los activos.
+
+    - 'archivar_lote(conexion, corte)' toma los 'tamano_lote' cerrados más antiguos por
+      (hora_salida, id), los copia con INSERT IGNORE (repetir un lote es inofensivo) y los borra
+      de la tabla caliente en la misma transacción corta: solo se bloquean filas ya cerradas.
+    - Antes de copiar, 'asegurar_particiones' parte p_max en las particiones mensuales que falten
+      entre el mes más antiguo y el más nuevo del lote. El DDL confirma implícitamente, por eso va antes de la transacción.
+    - Devuelve los tickets movidos; el llamador decide la pausa entre lotes.
+    """
+
+    def __init__(self, tamano_lote):
+        self._tamano_lote = tamano_lote
+        self._lock = threading.Lock()
+        self._ultimo_mes = None
+        self.lotes = 0
+        self.movidos = 0
+        self.particiones_creadas = 0
+        self.errores = 0
+
+    def asegurar_particiones(self, cur, desde, hasta):
+        """
+        Crea las particiones mensuales posteriores a la última existente hasta el mes de 'hasta'. Si
+        aún no hay ninguna, empieza en el mes de 'desde' (la fila más antigua del lote), para que
+        cada mes ya archivado quede en su propia partición.
+        """
+        mes_objetivo = primer_dia_mes(hasta)
+        if self._ultimo_mes is not None and self._ultimo_mes >= mes_objetivo:
+            return
+
+        cur.execute("""
+            SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'registro_cobro_archivo'
+              AND PARTITION_NAME IS NOT NULL AND PARTITION_NAME <> 'p_max'
+        """)
+        existentes = sorted(date(int(n[1:5]), int(n[5:7]), 1) for (n,) in cur.fetchall())
+
+        # Las filas anteriores a la primera partición caen en ella (RANGE), así que solo se
+        # agregan meses posteriores a la última: p_max siempre queda al final
+        mes = mes_siguiente(existentes[-1]) if existentes else primer_dia_mes(desde)
+        nuevas = []
+        while mes <= mes_objetivo:
+            nuevas.append(f"PARTITION {nombre_particion(mes)} VALUES LESS THAN ('{mes_siguiente(mes):%Y-%m-%d}')")
+            mes = mes_siguiente(mes)
+        if nuevas:
+            cur.execute(f"""
+                ALTER TABLE registro_cobro_archivo REORGANIZE PARTITION p_max INTO (
+                    {', '.join(nuevas)}, PARTITION p_max VALUES LESS THAN (MAXVALUE))
+            """)
+            self.particiones_creadas += len(nuevas)
+            logger.info(f"Archivo: {len(nuevas)} particiones mensuales creadas hasta {nombre_particion(mes_objetivo)}.")
+        self._ultimo_mes = mes_objetivo
+
+    def archivar_lote(self, conexion, corte):
+        """Mueve un lote de cobros cerrados antes de 'corte'. Devuelve cuántos tickets se movieron."""
+        with self._lock:
+            cur = conexion.cursor()
+            try:
+                cur.execute("""
+                    SELECT id, hora_salida FROM registro_cobro
+                    WHERE hora_salida IS NOT NULL AND hora_salida < %s
+                    ORDER BY hora_salida, id LIMIT %s
+                """, (corte, self._tamano_lote))
+                filas = cur.fetchall()
+                if not filas:
+                    return 0
+
+                self.asegurar_particiones(cur, filas[0][1], filas[-1][1])
+
+                ids = tuple(fila[0] for fila in filas)
+                marcadores = ", ".join(["%s"] * len(ids))
+                cur.execute(f"""
+                    INSERT IGNORE INTO registro_cobro_archivo ({COLUMNAS_REGISTRO})
+                    SELECT {COLUMNAS_REGISTRO} FROM registro_cobro
+                    WHERE id IN ({marcadores}) AND hora_salida IS NOT NULL
+                """, ids)
+                cur.execute(f"DELETE FROM registro_cobro WHERE id IN ({marcadores}) AND hora_salida IS NOT NULL", ids)
+                conexion.commit()
+            except Exception:
+                conexion.rollback()
+                self.errores += 1
+                raise
+            finally:
+                cur.close()
+
+            self.lotes += 1
+            self.movidos += len(ids)
+            return len(ids)
+
+    def estadisticas(self):
+        return {
+            'lotes': self.lotes,
+            'movidos': self.movidos,
+            'particiones_creadas': self.particiones_creadas,
+            'errores': self.errores,
+            'ultimo_mes': nombre_particion(self._ultimo_mes) if self._ultimo_mes else None,
+        }
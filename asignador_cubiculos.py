@@ -0,0 +1,140 @@
+# asignador_cubiculos.py
+# ===========================================
+# ASIGNADOR EN MEMORIA DE CUBÍCULOS LIBRES (POR ZONA)
+# ===========================================
+import heapq
+import threading
+
+
+def zona_de(nombre):
+    """La zona es la letra inicial del cubículo: 'A' = carros, 'B' = motos."""
+    return nombre[:1].upper() if nombre else ''
+
+
+class AsignadorCubiculos:
+    """
+    Mantiene, por zona, el conjunto ordenado de cubículos 'Libre' (montículo + conjunto).
+
+    - reservar(zona) entrega el cubículo libre de menor nombre en O(log n) y lo marca como
+      'en proceso' hasta que la transacción en la DB se confirme (confirmar) o falle (devolver).
+    - liberar se llama tras cada transición a 'Libre' ya confirmada en la DB.
+    - sincronizar(filas, version) reconcilia contra la DB sin pisar transiciones posteriores
+      a la lectura: los cubículos tocados después de 'version' se ignoran.
+
+    Todas las operaciones se serializan con un único lock, así dos entradas simultáneas nunca
+    reciben el mismo cubículo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heaps = {}
+        self._libres = {}
+        self._ids = {}
+        self._en_proceso = set()
+        self._version = 0
+        self._tocados = {}
+        self.sincronizado = False
+
+    # --- Utilidades internas (llamar con el lock tomado) ---
+
+    def _tocar(self, nombre):
+        self._version += 1
+        self._tocados[nombre] = self._version
+
+    def _agregar_libre(self, nombre):
+        zona = zona_de(nombre)
+        libres = self._libres.setdefault(zona, set())
+        if nombre not in libres:
+            libres.add(nombre)
+            heapq.heappush(self._heaps.setdefault(zona, []), nombre)
+
+    def _quitar_libre(self, nombre):
+        self._libres.get(zona_de(nombre), set()).discard(nombre)
+
+    # --- API pública ---
+
+    def version(self):
+        """Versión actual; se toma ANTES de leer la DB para sincronizar."""
+        with self._lock:
+            return self._version
+
+    def sincronizar(self, filas, version_lectura):
+        """
+        Reconstruye los conjuntos libres a partir de filas (id, nombre, estado) leídas de la DB.
+        Devuelve (agregados, retirados) respecto al estado en memoria.
+        """
+        with self._lock:
+            agregados = retirados = 0
+            for cubiculo_id, nombre, estado in filas:
+                self._ids[nombre] = cubiculo_id
+
+                if nombre in self._en_proceso or self._tocados.get(nombre, 0) > version_lectura:
+                    continue
+
+                libre_en_memoria = nombre in self._libres.get(zona_de(nombre), set())
+                if estado == 'Libre' and not libre_en_memoria:
+                    self._agregar_libre(nombre)
+                    agregados += 1
+                elif estado != 'Libre' and libre_en_memoria:
+                    self._quitar_libre(nombre)
+                    retirados += 1
+
+            # Reconstruye los montículos para descartar entradas obsoletas acumuladas
+            for zona, libres in self._libres.items():
+                self._heaps[zona] = sorted(libres)
+
+            self._tocados = {n: v for n, v in self._tocados.items() if v > version_lectura}
+            self.sincronizado = True
+            return agregados, retirados
+
+    def reservar(self, zona):
+        """Devuelve (id, nombre) del primer cubículo libre de la zona, o None si no hay cupo."""
+        with self._lock:
+            heap = self._heaps.get(zona, [])
+            libres = self._libres.get(zona, set())
+            while heap:
+                nombre = heapq.heappop(heap)
+                if nombre in libres:
+                    libres.discard(nombre)
+                    self._en_proceso.add(nombre)
+                    self._tocar(nombre)
+                    return self._ids[nombre], nombre
+            return None
+
+    def confirmar(self, nombre):
+        """La reserva quedó registrada en la DB como 'Pendiente'."""
+        with self._lock:
+            self._en_proceso.discard(nombre)
+            self._tocar(nombre)
+
+    def devolver(self, nombre):
+        """La transacción falló: el cubículo vuelve a estar libre."""
+        with self._lock:
+            self._en_proceso.discard(nombre)
+            self._agregar_libre(nombre)
+            self._tocar(nombre)
+
+    def descartar(self, nombre):
+        """La DB indica que el cubículo no estaba libre: se retira sin devolverlo."""
+        with self._lock:
+            self._en_proceso.discard(nombre)
+            self._quitar_libre(nombre)
+            self._tocar(nombre)
+
+    def liberar(self, nombre):
+        with self._lock:
+            if nombre in self._ids:
+                self._agregar_libre(nombre)
+                self._tocar(nombre)
+
+    def libres(self, zona):
+        with self._lock:
+            return len(self._libres.get(zona, ()))
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'libres_por_zona': {zona: len(libres) for zona, libres in sorted(self._libres.items())},
+                'en_proceso': len(self._en_proceso),
+                'sincronizado': self.sincronizado,
+            }
@@ -0,0 +1,49 @@
+# bench/comparar.py
+# ===========================================
+# COMPARACIÓN DE DOS RESULTADOS DE bench/ejecutar_bench.py
+# ===========================================
+# Uso: python bench/comparar.py bench/resultados/base.json bench/resultados/nuevo.json
+import json
+import sys
+
+# (ruta dentro del JSON, mayor es mejor)
+INDICADORES = [
+    (('entradas', 'por_segundo'), True),
+    (('entradas', 'latencia_entrada_a_apertura', 'p50_ms'), False),
+    (('entradas', 'latencia_entrada_a_apertura', 'p95_ms'), False),
+    (('entradas', 'latencia_entrada_a_apertura', 'p99_ms'), False),
+    (('http', 'estado_parqueadero', 'p50_ms'), False),
+    (('http', 'estado_parqueadero', 'p99_ms'), False),
+    (('http', 'finalizar_cobro', 'p50_ms'), False),
+    (('http', 'finalizar_cobro', 'p99_ms'), False),
+    (('http', 'errores'), False),
+    (('db', 'sentencias_por_evento'), False),
+]
+
+
+def leer(ruta, claves):
+    with open(ruta, encoding='utf-8') as f:
+        valor = json.load(f)
+    for clave in claves:
+        valor = valor.get(clave) if isinstance(valor, dict) else None
+    return valor
+
+
+def main():
+    if len(sys.argv) != 3:
+        print("Uso: python bench/comparar.py <base.json> <nuevo.json>")
+        sys.exit(2)
+    base, nuevo = sys.argv[1], sys.argv[2]
+    print(f"{'indicador':48} {'base':>12} {'nuevo':>12} {'cambio':>9}")
+    for claves, mayor_es_mejor in INDICADORES:
+        a, b = leer(base, claves), leer(nuevo, claves)
+        cambio = ''
+        if isinstance(a, (int, float)) and isinstance(b, (int, float)) and a:
+            porcentaje = (b - a) * 100.0 / a
+            mejora = porcentaje > 0 if mayor_es_mejor else porcentaje < 0
+            cambio = f"{porcentaje:+.1f}%{' ✓' if mejora else ''}"
+        print(f"{'.'.join(claves):48} {str(a):>12} {str(b):>12} {cambio:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# bench/comparar_commits.py
+# ===========================================
+# MISMA CARGA CONTRA DOS COMMITS (ANTES / DESPUÉS DE UN CAMBIO)
+# ===========================================
+# Uso (con los servicios de bench/docker-compose.yml levantados):
+#   python bench/comparar_commits.py <commit_base> <commit_nuevo> [opciones de ejecutar_bench.py]
+#   python bench/comparar_commits.py --pedido <id> [opciones]   (el commit '[<id>] ...' contra su padre)
+#   ej. python bench/comparar_commits.py --pedido user-004 --duracion 60 --dispositivos 4
+# Cada commit se revisa en un worktree temporal bajo bench/resultados/worktrees/ y se mide con el
+# ejecutar_bench.py de ESTE árbol, así ambos corren exactamente la misma carga.
+import os
+import shutil
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORIO_RESULTADOS = os.path.join(RAIZ, 'bench', 'resultados')
+DIRECTORIO_WORKTREES = os.path.join(DIRECTORIO_RESULTADOS, 'worktrees')
+
+
+def git(*args):
+    return subprocess.check_output(['git', *args], cwd=RAIZ, text=True).strip()
+
+
+def commit_de_pedido(pedido):
+    """Commit principal de un pedido del backlog: asunto '[<pedido>] ...' que no sea un 'fix:' de revisión."""
+    for linea in git('log', '--format=%h %s', '--fixed-strings', f'--grep=[{pedido}] ').splitlines():
+        sha, asunto = linea.split(' ', 1)
+        if asunto.startswith(f'[{pedido}] ') and not asunto.startswith(f'[{pedido}] fix:'):
+            return sha
+    raise SystemExit(f"No hay un commit '[{pedido}] ...' en la historia.")
+
+
+def preparar_worktree(commit):
+    """Worktree del commit. Si su config.py no lee PARQUEADERO_* (commits viejos), se usa el actual."""
+    sha = git('rev-parse', '--short', commit)
+    ruta = os.path.join(DIRECTORIO_WORKTREES, sha)
+    if not os.path.isdir(ruta):
+        os.makedirs(DIRECTORIO_WORKTREES, exist_ok=True)
+        git('worktree', 'add', '--detach', ruta, sha)
+
+    with open(os.path.join(ruta, 'config.py'), encoding='utf-8') as f:
+        if 'PARQUEADERO_MYSQL_HOST' not in f.read():
+            # El config.py actual solo agrega constantes: sirve también a las versiones anteriores
+            shutil.copy(os.path.join(RAIZ, 'config.py'), os.path.join(ruta, 'config.py'))
+            print(f"{sha}: config.py sin variables PARQUEADERO_*; se usa el config.py actual.")
+    return sha, ruta
+
+
+def main():
+    if len(sys.argv) >= 3 and sys.argv[1] == '--pedido':
+        nuevo = commit_de_pedido(sys.argv[2])
+        base, opciones = f"{nuevo}~1", sys.argv[3:]
+    elif len(sys.argv) >= 3:
+        base, nuevo, opciones = sys.argv[1], sys.argv[2], sys.argv[3:]
+    else:
+        print("Uso: python bench/comparar_commits.py <commit_base> <commit_nuevo> [opciones de ejecutar_bench.py]")
+        print("     python bench/comparar_commits.py --pedido <id> [opciones de ejecutar_bench.py]")
+        sys.exit(2)
+
+    resultados = []
+    for commit in (base, nuevo):
+        sha, ruta = preparar_worktree(commit)
+        salida = os.path.join(DIRECTORIO_RESULTADOS, f"comparacion_{sha}.json")
+        subprocess.check_call([sys.executable, os.path.join(RAIZ, 'bench', 'ejecutar_bench.py'),
+                               '--raiz-app', ruta, '--salida', salida, *opciones], cwd=RAIZ)
+        resultados.append(salida)
+
+    subprocess.check_call([sys.executable, os.path.join(RAIZ, 'bench', 'comparar.py'), *resultados], cwd=RAIZ)
+    print(f"Worktrees en {DIRECTORIO_WORKTREES} (borrar con: git worktree prune tras eliminarlos).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+# bench/ejecutar_bench.py
+# ===========================================
+# PRUEBA DE CARGA REPRODUCIBLE: N DISPOSITIVOS MQTT + CLIENTES HTTP CONTRA app.py
+# ===========================================
+# Uso (con los servicios de bench/docker-compose.yml levantados):
+#   python bench/ejecutar_bench.py --duracion 60 --dispositivos 4 --tasa-entrada 2
+# Deja un JSON en bench/resultados/ para comparar entre commits con bench/comparar.py.
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from datetime import datetime
+
+import MySQLdb
+import paho.mqtt.client as mqtt
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import config  # noqa: E402
+from migrador import aplicar_migraciones  # noqa: E402
+
+# Contadores del servidor MySQL/MariaDB que se comparan antes y después de la carga
+VARIABLES_SENTENCIAS = ('Com_select', 'Com_insert', 'Com_update', 'Com_delete', 'Com_commit', 'Com_rollback')
+
+
+def percentiles(muestras):
+    """p50/p95/p99/max en ms (rango más cercano) de una lista de segundos."""
+    if not muestras:
+        return {'muestras': 0, 'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'max_ms': None}
+    ordenadas = sorted(muestras)
+
+    def _p(p):
+        return round(ordenadas[min(len(ordenadas) - 1, int(round(p / 100.0 * (len(ordenadas) - 1))))] * 1000.0, 3)
+
+    return {
+        'muestras': len(ordenadas),
+        'p50_ms': _p(50),
+        'p95_ms': _p(95),
+        'p99_ms': _p(99),
+        'max_ms': round(ordenadas[-1] * 1000.0, 3),
+    }
+
+
+# ------------------------- PREPARACIÓN DE SERVICIOS -------------------------
+
+def conectar_db(args):
+    return MySQLdb.connect(host=args.mysql_host, port=args.mysql_port, user=args.mysql_user,
+                           passwd=args.mysql_password, db=args.mysql_db, charset='utf8')
+
+
+def preparar_db(args):
+    """Aplica las migraciones y deja cubículos, tarifas y secuencia en un estado conocido."""
+    conexion = conectar_db(args)
+    try:
+        aplicar_migraciones(conexion)
+        cur = conexion.cursor()
+        cur.execute("DELETE FROM registro_cobro")
+        cur.execute("DELETE FROM cubiculos")
+        cur.execute("DELETE FROM resumen_diario")
+        cur.execute("UPDATE secuencias SET siguiente = 1 WHERE nombre = 'registro_cobro'")
+        cubiculos = [(f"A{i}",) for i in range(1, args.cubiculos_carro + 1)]
+        cubiculos += [(f"B{i}",) for i in range(1, args.cubiculos_moto + 1)]
+        cur.executemany("INSERT INTO cubiculos (nombre, estado) VALUES (%s, 'Libre')", cubiculos)
+        cur.executemany(
+            "REPLACE INTO tarifas (tipo, tarifa_primera_hora, tarifa_hora_subsiguiente) VALUES (%s, %s, %s)",
+            [('CARRO', 3000, 2000), ('MOTO', 1500, 1000)]
+        )
+        conexion.commit()
+        cur.close()
+    finally:
+        conexion.close()
+
+
+def leer_contadores_db(args):
+    conexion = conectar_db(args)
+    try:
+        cur = conexion.cursor()
+        marcadores = ', '.join(['%s'] * len(VARIABLES_SENTENCIAS))
+        cur.execute(f"SHOW GLOBAL STATUS WHERE Variable_name IN ({marcadores})", VARIABLES_SENTENCIAS)
+        return {nombre: int(valor) for nombre, valor in cur.fetchall()}
+    finally:
+        conexion.close()
+
+
+def app_lista(url):
+    """
+    Lista cuando la réplica ganó el liderazgo y la ingesta MQTT está activa. Los commits anteriores a
+    la elección de líder (o a /api/metricas) conectan MQTT antes de atender HTTP: basta con que
+    respondan.
+    """
+    try:
+        metricas = json.loads(urllib.request.urlopen(f"{url}/api/metricas", timeout=1).read())
+        return metricas.get('lider', {}).get('es_lider', 'lider' not in metricas)
+    except urllib.error.HTTPError as e:
+        if e.code != 404:
+            return False
+    except Exception:
+        return False
+    try:
+        return urllib.request.urlopen(f"{url}/api/estado_parqueadero", timeout=1).status == 200
+    except Exception:
+        return False
+
+
+def iniciar_app(args, archivo_log):
+    entorno = dict(os.environ)
+    entorno.update({
+        'PARQUEADERO_MYSQL_HOST': args.mysql_host,
+        'PARQUEADERO_MYSQL_PORT': str(args.mysql_port),
+        'PARQUEADERO_MYSQL_USER': args.mysql_user,
+        'PARQUEADERO_MYSQL_PASSWORD': args.mysql_password,
+        'PARQUEADERO_MYSQL_DB': args.mysql_db,
+        'PARQUEADERO_MQTT_BROKER': args.mqtt_host,
+        'PARQUEADERO_MQTT_PORT': str(args.mqtt_port),
+    })
+    proceso = subprocess.Popen([sys.executable, 'app.py'], cwd=args.raiz_app, env=entorno,
+                               stdout=archivo_log, stderr=subprocess.STDOUT)
+    limite = time.monotonic() + 30
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"app.py terminó al iniciar (código {proceso.returncode}); ver {archivo_log.name}")
+        if app_lista(args.url):
+            return proceso
+        time.sleep(0.5)
+    proceso.terminate()
+    raise RuntimeError("app.py no respondió en 30 s")
+
+
+# ------------------------- SIMULACIÓN -------------------------
+
+class Simulacion:
+    """Estado compartido entre los dispositivos simulados, los sensores y los clientes HTTP."""
+
+    def __init__(self, args, config):
+        self.args = args
+        self.config = config
+        self.lock = threading.Lock()
+        self.detener = threading.Event()
+        self.entradas_en_vuelo = deque()
+        self.latencias_entrada = []
+        self.latencias_estado = []
+        self.latencias_finalizar = []
+        self.por_ocupar = deque()
+        self.ocupados = set()
+        self.candidatos_finalizar = deque()
+        self.entradas = 0
+        self.aperturas = 0
+        self.reportes = 0
+        self.consultas_estado = 0
+        self.finalizados = 0
+        self.errores_http = 0
+
+    def cliente_mqtt(self, nombre):
+        cliente = mqtt.Client(client_id=f"bench-{nombre}-{os.getpid()}", clean_session=True)
+        cliente.connect(self.args.mqtt_host, self.args.mqtt_port, 60)
+        cliente.loop_start()
+        return cliente
+
+    # --- Talanquera: empareja cada ABRIR con la entrada más antigua aún sin respuesta (FIFO) ---
+    def al_recibir_apertura(self, cliente, datos, msg):
+        ahora = time.perf_counter()
+        try:
+            cub = json.loads(msg.payload.decode('utf-8')).get('cub')
+        except Exception:
+            return
+        with self.lock:
+            if self.entradas_en_vuelo:
+                self.latencias_entrada.append(ahora - self.entradas_en_vuelo.popleft())
+            self.aperturas += 1
+            self.por_ocupar.append((ahora + self.args.demora_ocupacion, cub))
+
+    def dispositivo(self, indice):
+        cliente = self.cliente_mqtt(f"dispositivo{indice}")
+        intervalo = 1.0 / self.args.tasa_entrada
+        try:
+            while not self.detener.wait(random.expovariate(1.0 / intervalo)):
+                with self.lock:
+                    self.entradas_en_vuelo.append(time.perf_counter())
+                    self.entradas += 1
+                cliente.publish(self.config.MQTT_TOPIC_ENTRADA_CARRO, json.dumps({"estado": "Esperando"}), qos=1)
+        finally:
+            cliente.loop_stop()
+            cliente.disconnect()
+
+    def sensores(self):
+        """Confirma cada cubículo asignado tras 'demora_ocupacion' y repite reportes como los sensores reales."""
+        cliente = self.cliente_mqtt("sensores")
+        intervalo_repeticion = 1.0 / self.args.tasa_reportes if self.args.tasa_reportes > 0 else None
+        proxima_repeticion = time.perf_counter()
+        try:
+            while not self.detener.wait(0.01):
+                ahora = time.perf_counter()
+                nuevos = []
+                with self.lock:
+                    while self.por_ocupar and self.por_ocupar[0][0] <= ahora:
+                        nuevos.append(self.por_ocupar.popleft()[1])
+                    self.ocupados.update(nuevos)
+                    repetir = None
+                    if intervalo_repeticion and ahora >= proxima_repeticion and self.ocupados:
+                        repetir = random.choice(tuple(self.ocupados))
+                        proxima_repeticion = ahora + intervalo_repeticion
+                for cub in nuevos + ([repetir] if repetir else []):
+                    cliente.publish(f"{self.config.MQTT_TOPIC_UBICACION}/{cub}", json.dumps({"estado": "Ocupado"}), qos=1)
+                    with self.lock:
+                        self.reportes += 1
+        finally:
+            cliente.loop_stop()
+            cliente.disconnect()
+
+    def _http(self, metodo, ruta, cuerpo=None):
+        datos = json.dumps(cuerpo).encode('utf-8') if cuerpo is not None else None
+        peticion = urllib.request.Request(f"{self.args.url}{ruta}", data=datos, method=metodo,
+                                          headers={'Content-Type': 'application/json'})
+        inicio = time.perf_counter()
+        with urllib.request.urlopen(peticion, timeout=10) as respuesta:
+            contenido = respuesta.read()
+        return time.perf_counter() - inicio, contenido
+
+    def sondeo_estado(self):
+        while not self.detener.wait(self.args.intervalo_sondeo):
+            try:
+                duracion, contenido = self._http('GET', '/api/estado_parqueadero')
+            except Exception:
+                with self.lock:
+                    self.errores_http += 1
+                continue
+            ocupados = [c for c in json.loads(contenido) if c['estado'] == 'Ocupado' and c['registro_id']]
+            with self.lock:
+                self.latencias_estado.append(duracion)
+                self.consultas_estado += 1
+                pendientes = {r for _, r in self.candidatos_finalizar}
+                for c in ocupados:
+                    if c['registro_id'] not in pendientes:
+                        self.candidatos_finalizar.append((c['nombre'], c['registro_id']))
+
+    def finalizador(self):
+        """Cobra los cubículos ocupados para que la simulación no se quede sin cupo."""
+        if self.args.tasa_finalizar <= 0:
+            return
+        while not self.detener.wait(1.0 / self.args.tasa_finalizar):
+            with self.lock:
+                if not self.candidatos_finalizar:
+                    continue
+                nombre, registro_id = self.candidatos_finalizar.popleft()
+            try:
+                duracion, _ = self._http('POST', '/api/finalizar_cobro', {'registro_id': registro_id})
+            except Exception:
+                with self.lock:
+                    self.errores_http += 1
+                continue
+            with self.lock:
+                self.latencias_finalizar.append(duracion)
+                self.finalizados += 1
+                self.ocupados.discard(nombre)
+
+    def ejecutar(self):
+        talanquera = self.cliente_mqtt("talanquera")
+        talanquera.on_message = self.al_recibir_apertura
+        talanquera.subscribe(self.config.TOPIC_CONTROL_TALANQUERA, qos=1)
+
+        hilos = [threading.Thread(target=self.dispositivo, args=(i,)) for i in range(self.args.dispositivos)]
+        hilos += [threading.Thread(target=self.sondeo_estado) for _ in range(self.args.clientes_http)]
+        hilos += [threading.Thread(target=self.sensores), threading.Thread(target=self.finalizador)]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        time.sleep(self.args.duracion)
+        self.detener.set()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        # Deja llegar las últimas órdenes ABRIR antes de cerrar
+        time.sleep(self.args.espera_drenado)
+        talanquera.loop_stop()
+        talanquera.disconnect()
+        return duracion
+
+
+def leer_metricas_servidor(url):
+    try:
+        return json.loads(urllib.request.urlopen(f"{url}/api/metricas", timeout=5).read())
+    except Exception as e:
+        return {'error': str(e)}
+
+
+def commit_actual(raiz):
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=raiz, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de app.py con dispositivos MQTT y clientes HTTP simulados.")
+    parser.add_argument('--duracion', type=float, default=60, help='Segundos de carga.')
+    parser.add_argument('--dispositivos', type=int, default=4, help='ESP32 de entrada simulados.')
+    parser.add_argument('--tasa-entrada', type=float, default=1.0, help='Entradas por segundo por dispositivo (Poisson).')
+    parser.add_argument('--tasa-reportes', type=float, default=5.0, help='Reportes repetidos de sensores por segundo (total).')
+    parser.add_argument('--demora-ocupacion', type=float, default=0.5, help='Segundos entre ABRIR y el primer reporte Ocupado.')
+    parser.add_argument('--clientes-http', type=int, default=2, help='Clientes que consultan /api/estado_parqueadero.')
+    parser.add_argument('--intervalo-sondeo', type=float, default=1.0, help='Segundos entre consultas de cada cliente.')
+    parser.add_argument('--tasa-finalizar', type=float, default=4.0, help='Llamadas a /api/finalizar_cobro por segundo.')
+    parser.add_argument('--cubiculos-carro', type=int, default=200)
+    parser.add_argument('--cubiculos-moto', type=int, default=50)
+    parser.add_argument('--espera-drenado', type=float, default=2.0)
+    parser.add_argument('--mysql-host', default='127.0.0.1')
+    parser.add_argument('--mysql-port', type=int, default=3307)
+    parser.add_argument('--mysql-user', default='root')
+    parser.add_argument('--mysql-password', default='bench')
+    parser.add_argument('--mysql-db', default='parqueadero_bench')
+    parser.add_argument('--mqtt-host', default='127.0.0.1')
+    parser.add_argument('--mqtt-port', type=int, default=1884)
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='URL base de app.py.')
+    parser.add_argument('--sin-iniciar-app', action='store_true', help='Usar un app.py ya corriendo en --url.')
+    parser.add_argument('--raiz-app', default=RAIZ,
+                        help='Directorio del app.py a medir (ej. un worktree de otro commit, ver bench/comparar_commits.py).')
+    parser.add_argument('--salida', default=None, help='Ruta del JSON de resultados.')
+    args = parser.parse_args()
+
+    directorio_resultados = os.path.join(RAIZ, 'bench', 'resultados')
+    os.makedirs(directorio_resultados, exist_ok=True)
+    marca = datetime.now().strftime('%Y%m%d_%H%M%S')
+    commit = commit_actual(args.raiz_app)
+    salida = args.salida or os.path.join(directorio_resultados, f"{marca}_{commit or 'sin_git'}.json")
+
+    preparar_db(args)
+    proceso = None
+    archivo_log = open(os.path.join(directorio_resultados, f"{marca}_app.log"), 'w')
+    try:
+        if not args.sin_iniciar_app:
+            proceso = iniciar_app(args, archivo_log)
+
+        antes = leer_contadores_db(args)
+        simulacion = Simulacion(args, config)
+        duracion = simulacion.ejecutar()
+        despues = leer_contadores_db(args)
+        metricas_servidor = leer_metricas_servidor(args.url)
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait(timeout=15)
+        archivo_log.close()
+
+    sentencias = {nombre: despues.get(nombre, 0) - antes.get(nombre, 0) for nombre in VARIABLES_SENTENCIAS}
+    total_sentencias = sum(v for k, v in sentencias.items() if k not in ('Com_commit', 'Com_rollback'))
+    eventos = simulacion.entradas + simulacion.reportes + simulacion.consultas_estado + simulacion.finalizados
+
+    resultado = {
+        'commit': commit,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'parametros': vars(args),
+        'duracion_segundos': round(duracion, 3),
+        'entradas': {
+            'enviadas': simulacion.entradas,
+            'aperturas': simulacion.aperturas,
+            'por_segundo': round(simulacion.aperturas / duracion, 3),
+            # Emparejamiento FIFO del lado del cliente; si hubo entradas sin cupo (sin ABRIR) se sobreestima
+            'latencia_entrada_a_apertura': percentiles(simulacion.latencias_entrada),
+        },
+        'reportes_ocupacion_enviados': simulacion.reportes,
+        'http': {
+            'estado_parqueadero': percentiles(simulacion.latencias_estado),
+            'finalizar_cobro': percentiles(simulacion.latencias_finalizar),
+            'errores': simulacion.errores_http,
+        },
+        'db': {
+            'sentencias': sentencias,
+            'eventos': eventos,
+            'sentencias_por_evento': round(total_sentencias / eventos, 3) if eventos else None,
+        },
+        'metricas_servidor': metricas_servidor,
+    }
+
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False, default=str)
+    print(json.dumps({k: resultado[k] for k in ('commit', 'entradas', 'http', 'db')}, indent=2, ensure_ascii=False))
+    print(f"Resultados en {salida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+# buffer_ocupacion.py
+# ===========================================
+# BUFFER DE REPORTES DE OCUPACIÓN (COALESCENCIA + ESCRITURA POR LOTES)
+# ===========================================
+import logging
+import threading
+
+logger = logging.getLogger('FlaskApp')
+
+
+class BufferOcupacion:
+    """
+    Acumula los reportes 'Ocupado' de los sensores y los escribe en la DB por lotes.
+
+    - Solo se guarda el último estado por cubículo.
+    - Si el cubículo ya se confirmó como 'Ocupado' en la DB, el reporte repetido se omite sin
+      llegar a MySQL. 'olvidar(nombre)' borra esa confirmación cuando el cubículo cambia por otra
+      vía (asignación, cobro, cancelación, limpieza).
+    - 'escribir_lote(nombres)' recibe los cubículos pendientes, los actualiza en UNA transacción y
+      devuelve el conjunto de nombres que quedaron 'Ocupado' en la DB.
+    - El lote se vacía cada 'intervalo_ms' o antes si llega a 'max_eventos' cubículos.
+    """
+
+    def __init__(self, escribir_lote, intervalo_ms, max_eventos, contador_commits=None):
+        self._escribir_lote = escribir_lote
+        self._intervalo = intervalo_ms / 1000.0
+        self._max_eventos = max_eventos
+        self._contador_commits = contador_commits
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._detenido = threading.Event()
+        self._pendientes = {}
+        self._confirmados = set()
+        self._hilo = None
+        self.eventos = 0
+        self.omitidos = 0
+        self.lotes = 0
+        self.filas_cambiadas = 0
+        self.descartados = 0
+
+    def iniciar(self):
+        self._detenido.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="buffer-ocupacion", daemon=True)
+        self._hilo.start()
+
+    def registrar(self, nombre, estado):
+        with self._lock:
+            self.eventos += 1
+            if estado == 'Ocupado' and nombre in self._confirmados and nombre not in self._pendientes:
+                self.omitidos += 1
+                return
+            self._pendientes[nombre] = estado
+            lleno = len(self._pendientes) >= self._max_eventos
+        if lleno:
+            self._despertar.set()
+
+    def olvidar(self, nombre):
+        with self._lock:
+            self._confirmados.discard(nombre)
+
+    def _bucle(self):
+        while not self._detenido.is_set():
+            self._despertar.wait(self._intervalo)
+            self._despertar.clear()
+            self.vaciar()
+
+    def vaciar(self):
+        with self._lock:
+            lote, self._pendientes = self._pendientes, {}
+        ocupados = [nombre for nombre, estado in lote.items() if estado == 'Ocupado']
+        if not ocupados:
+            return
+
+        try:
+            confirmados, cambiadas = self._escribir_lote(ocupados)
+        except Exception as e:
+            logger.error(f"Buffer ocupación: Error al escribir lote de {len(ocupados)} cubículos: {e}")
+            # Se reintenta en el siguiente ciclo salvo que ya haya llegado un reporte más nuevo
+            with self._lock:
+                for nombre in ocupados:
+                    self._pendientes.setdefault(nombre, 'Ocupado')
+            return
+
+        with self._lock:
+            self._confirmados.update(confirmados)
+            self.lotes += 1
+            self.filas_cambiadas += cambiadas
+        if self._contador_commits is not None:
+            self._contador_commits.incrementar()
+
+    def detener(self, vaciar=True):
+        """
+        Detiene el hilo. Con vaciar=True escribe lo pendiente; con vaciar=False lo descarta (al
+        perder el liderazgo, la nueva ingesta ya es dueña de la DB).
+        """
+        self._detenido.set()
+        self._despertar.set()
+        if self._hilo:
+            self._hilo.join()
+            self._hilo = None
+        if vaciar:
+            self.vaciar()
+            return
+        with self._lock:
+            self.descartados += len(self._pendientes)
+            self._pendientes.clear()
+            self._confirmados.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'eventos': self.eventos,
+                'omitidos_sin_cambio': self.omitidos,
+                'lotes_escritos': self.lotes,
+                'filas_cambiadas': self.filas_cambiadas,
+                'descartados': self.descartados,
+                'pendientes': len(self._pendientes),
+            }
@@ -0,0 +1,85 @@
+# cache_tarifas.py
+# ===========================================
+# CACHE EN MEMORIA DE TARIFAS (CLAVE: TIPO DE VEHÍCULO)
+# ===========================================
+import threading
+import time
+
+
+class CacheTarifas:
+    """
+    Cache de proceso para la tabla 'tarifas', indexada por tipo ('CARRO' / 'MOTO').
+
+    - 'cargador' es una función sin argumentos que devuelve {tipo: (primera_hora, subsiguiente)}
+      leyendo la tabla completa (es pequeña, se recarga entera en cada fallo).
+    - 'invalidar()' se llama tras el POST a /api/tarifas. Usa un contador de generación para que
+      una recarga que estaba en curso durante la invalidación no vuelva a guardar datos viejos.
+    - 'ttl_segundos' protege contra cambios hechos directamente en MySQL.
+    """
+
+    def __init__(self, cargador, ttl_segundos):
+        self._cargador = cargador
+        self._ttl = ttl_segundos
+        self._lock = threading.Lock()
+        self._tarifas = None
+        self._expira_en = 0.0
+        self._generacion = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.recargas = 0
+        self.invalidaciones = 0
+
+    def _vigente(self):
+        return self._tarifas is not None and time.monotonic() < self._expira_en
+
+    def _recargar(self):
+        with self._lock:
+            generacion = self._generacion
+
+        tarifas = self._cargador()
+
+        with self._lock:
+            self.recargas += 1
+            # Solo se guarda si nadie invalidó mientras se consultaba la DB
+            if generacion == self._generacion:
+                self._tarifas = dict(tarifas)
+                self._expira_en = time.monotonic() + self._ttl
+        return tarifas
+
+    def obtener(self, tipo_vehiculo):
+        """Devuelve (primera_hora, subsiguiente) del tipo, o None si no existe en la tabla."""
+        with self._lock:
+            if self._vigente():
+                self.aciertos += 1
+                return self._tarifas.get(tipo_vehiculo)
+            self.fallos += 1
+        return self._recargar().get(tipo_vehiculo)
+
+    def todas(self):
+        """Devuelve una copia de {tipo: (primera_hora, subsiguiente)} con todas las tarifas."""
+        with self._lock:
+            if self._vigente():
+                self.aciertos += 1
+                return dict(self._tarifas)
+            self.fallos += 1
+        return dict(self._recargar())
+
+    def invalidar(self):
+        """Descarta el contenido actual; la siguiente lectura vuelve a la DB."""
+        with self._lock:
+            self._generacion += 1
+            self._tarifas = None
+            self._expira_en = 0.0
+            self.invalidaciones += 1
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'recargas': self.recargas,
+                'invalidaciones': self.invalidaciones,
+                'tasa_aciertos': round(self.aciertos / total, 4) if total else 0.0,
+                'ttl_segundos': self._ttl,
+            }
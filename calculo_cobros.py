@@ -0,0 +1,32 @@
+# calculo_cobros.py
+# ===========================================
+# REGLA DE COBRO POR ESTADÍA (SIN FLASK NI DB)
+# ===========================================
+from math import ceil
+
+from config import TIEMPO_GRACIA_MINUTOS
+
+
+def calcular_cobro_avanzado(minutos_totales, tarifas, tiempo_gracia=TIEMPO_GRACIA_MINUTOS):
+    """Calcula el monto según tarifas variables e incluye TIEMPO DE GRACIA."""
+    TARIFA_PRIMERA_HORA, TARIFA_HORA_SUBSECUENTE = tarifas
+    minutos_totales = int(minutos_totales)
+    monto_total = 0
+
+    if minutos_totales <= tiempo_gracia:
+        return 0
+
+    if minutos_totales <= 60:
+        monto_total = TARIFA_PRIMERA_HORA
+    else:
+        monto_total = TARIFA_PRIMERA_HORA
+        minutos_restantes = minutos_totales - 60 
+        horas_subsiguientes = ceil(minutos_restantes / 60.0)
+        monto_total += (horas_subsiguientes * TARIFA_HORA_SUBSECUENTE)
+        
+    return int(monto_total)
+
+
+def calcular_minutos_estadia(hora_ingreso, ahora):
+    """Minutos completos transcurridos entre la hora de ingreso y 'ahora'."""
+    return int((ahora - hora_ingreso).total_seconds() / 60)
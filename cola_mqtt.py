@@ -0,0 +1,183 @@
+# cola_mqtt.py
+# ===========================================
+# DESPACHADOR DE MENSAJES MQTT A TRABAJADORES DE DB
+# ===========================================
+import logging
+import queue
+import threading
+import time
+import zlib
+
+logger = logging.getLogger('FlaskApp')
+
+# Marca interna: "procesar el último valor pendiente de esta clave"
+_COALESCIDO = object()
+_DETENER = object()
+
+
+class DespachadorMQTT:
+    """
+    Separa la recepción MQTT (hilo de red de paho) del trabajo contra la DB.
+
+    - Cada mensaje se encola con una 'clave' (ej. nombre del cubículo). Todas las tareas de una
+      misma clave van al mismo trabajador, así se procesan en el orden en que llegaron.
+    - Colas acotadas: si un trabajador está lleno, 'encolar' espera como máximo 'timeout_encolado'
+      (contrapresión sobre el hilo de red) y luego descarta el mensaje.
+    - 'enrutar(clave)' opcional fija el trabajador de cada clave (ej. un trabajador por carril de
+      entrada); por defecto se reparte por crc32 de la clave.
+    - Tareas 'coalescibles' (reportes de sensores): si ya hay una pendiente para la clave, solo se
+      reemplaza su contenido por el más reciente en lugar de encolar otra.
+    - Cada 'iniciar' crea colas nuevas: un trabajador que siguió ocupado tras un 'detener' con
+      plazo vencido se queda con sus colas viejas (y su _DETENER) y no compite con los nuevos.
+    """
+
+    def __init__(self, procesar, num_trabajadores, capacidad, timeout_encolado, enrutar=None, nombre="mqtt-db"):
+        self._procesar = procesar
+        self._enrutar = enrutar
+        self._nombre = nombre
+        self._timeout = timeout_encolado
+        self._capacidad = capacidad
+        self._colas = [queue.Queue(maxsize=capacidad) for _ in range(num_trabajadores)]
+        self._hilos = []
+        # Trabajadores que no terminaron dentro del plazo de 'detener'
+        self._rezagados = []
+        self._lock = threading.Lock()
+        self._pendientes = {}
+        self.encolados = 0
+        self.procesados = 0
+        self.coalescidos = 0
+        self.descartados = 0
+        self.errores = 0
+        self.profundidad_maxima = 0
+
+    def _indice(self, clave):
+        if self._enrutar is not None:
+            return self._enrutar(clave)
+        return zlib.crc32(clave.encode('utf-8')) % len(self._colas)
+
+    def iniciar(self, timeout_rezagados=5):
+        """
+        Arranca un trabajador por cola. Antes espera (como máximo 'timeout_rezagados' segundos) a los
+        trabajadores de un 'detener' anterior que seguían ocupados, para no mezclar tareas de una clave.
+        """
+        limite = time.monotonic() + timeout_rezagados
+        for hilo in self._rezagados:
+            hilo.join(max(0, limite - time.monotonic()))
+        self._rezagados = [hilo for hilo in self._rezagados if hilo.is_alive()]
+        if self._rezagados:
+            logger.warning(f"Despachador MQTT '{self._nombre}': {len(self._rezagados)} trabajadores anteriores siguen "
+                           f"ocupados; terminarán su tarea actual con sus colas viejas.")
+
+        # Colas nuevas: las anteriores pueden conservar un _DETENER que aún no leyó un rezagado
+        self._colas = [queue.Queue(maxsize=self._capacidad) for _ in range(len(self._colas))]
+        for i, cola in enumerate(self._colas):
+            hilo = threading.Thread(target=self._trabajar, args=(cola,), name=f"{self._nombre}-{i}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+        logger.info(f"Despachador MQTT '{self._nombre}': {len(self._colas)} trabajadores de DB iniciados.")
+
+    def encolar(self, clave, tarea, coalescible=False):
+        """Devuelve False si el mensaje se descartó por cola llena."""
+        cola = self._colas[self._indice(clave)]
+
+        if coalescible:
+            with self._lock:
+                if clave in self._pendientes:
+                    self._pendientes[clave] = tarea
+                    self.coalescidos += 1
+                    return True
+                self._pendientes[clave] = tarea
+            elemento = (_COALESCIDO, clave)
+        else:
+            elemento = tarea
+
+        try:
+            cola.put(elemento, timeout=self._timeout)
+        except queue.Full:
+            with self._lock:
+                if coalescible:
+                    self._pendientes.pop(clave, None)
+                self.descartados += 1
+            logger.error(f"Despachador MQTT: Cola llena, mensaje descartado (clave {clave}).")
+            return False
+
+        with self._lock:
+            self.encolados += 1
+            self.profundidad_maxima = max(self.profundidad_maxima, cola.qsize())
+        return True
+
+    def _trabajar(self, cola):
+        while True:
+            elemento = cola.get()
+            try:
+                if elemento is _DETENER:
+                    return
+                if isinstance(elemento, tuple) and elemento and elemento[0] is _COALESCIDO:
+                    with self._lock:
+                        tarea = self._pendientes.pop(elemento[1], None)
+                    if tarea is None:
+                        continue
+                else:
+                    tarea = elemento
+
+                try:
+                    self._procesar(tarea)
+                except Exception as e:
+                    with self._lock:
+                        self.errores += 1
+                    logger.error(f"Despachador MQTT: Error en trabajador al procesar tarea: {e}")
+                with self._lock:
+                    self.procesados += 1
+            finally:
+                cola.task_done()
+
+    def detener(self, drenar=True, timeout=None):
+        """
+        Detiene los trabajadores. Con drenar=True procesa antes lo ya encolado, como máximo
+        'timeout' segundos; lo que quede sin procesar al vencer el plazo se descarta.
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        if drenar:
+            for cola in self._colas:
+                with cola.all_tasks_done:
+                    while cola.unfinished_tasks:
+                        restante = None if limite is None else limite - time.monotonic()
+                        if restante is not None and restante <= 0:
+                            break
+                        cola.all_tasks_done.wait(restante)
+
+        for cola in self._colas:
+            while True:
+                try:
+                    cola.get_nowait()
+                except queue.Empty:
+                    break
+                cola.task_done()
+                with self._lock:
+                    self.descartados += 1
+            cola.put(_DETENER)
+        for hilo in self._hilos + self._rezagados:
+            hilo.join(None if limite is None else max(0, limite - time.monotonic()))
+        self._rezagados = [hilo for hilo in self._hilos + self._rezagados if hilo.is_alive()]
+        self._hilos = []
+        if self._rezagados:
+            logger.warning(f"Despachador MQTT '{self._nombre}': {len(self._rezagados)} trabajadores no terminaron en el plazo.")
+        with self._lock:
+            self._pendientes.clear()
+
+    def profundidad(self):
+        return sum(cola.qsize() for cola in self._colas)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'trabajadores': len(self._colas),
+                'rezagados': sum(1 for hilo in self._rezagados if hilo.is_alive()),
+                'profundidad_por_trabajador': [cola.qsize() for cola in self._colas],
+                'profundidad_maxima': self.profundidad_maxima,
+                'encolados': self.encolados,
+                'procesados': self.procesados,
+                'coalescidos': self.coalescidos,
+                'descartados': self.descartados,
+                'errores': self.errores,
+            }
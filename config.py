@@ -1,17 +1,27 @@
 # config.py
+import os
+
+# Los datos de conexión (DB y broker) aceptan variables de entorno PARQUEADERO_* para apuntar
+# a otros servicios sin editar este archivo (ej. bench/ con MariaDB y Mosquitto locales).
 
 # --- CONFIGURACIÓN DE LA BASE DE DATOS MYSQL ---
-MYSQL_HOST = 'localhost'
-MYSQL_USER = 'root'
-MYSQL_PASSWORD = '' 
-MYSQL_DB = 'parqueadero_db'
-MYSQL_PORT = 3306
+MYSQL_HOST = os.environ.get('PARQUEADERO_MYSQL_HOST', 'localhost')
+MYSQL_USER = os.environ.get('PARQUEADERO_MYSQL_USER', 'root')
+MYSQL_PASSWORD = os.environ.get('PARQUEADERO_MYSQL_PASSWORD', '')
+MYSQL_DB = os.environ.get('PARQUEADERO_MYSQL_DB', 'parqueadero_db')
+MYSQL_PORT = int(os.environ.get('PARQUEADERO_MYSQL_PORT', 3306))
+# Pool de conexiones compartido por Flask, los trabajadores MQTT y el scheduler
+DB_POOL_MINIMO = 2                    # Conexiones abiertas al iniciar
+DB_POOL_MAXIMO = 10                   # Tope de conexiones simultáneas
+DB_POOL_VIDA_MAXIMA_SEGUNDOS = 1800   # Una conexión más vieja se cierra y se reemplaza
+DB_POOL_TIMEOUT_ESPERA_SEGUNDOS = 5   # Espera máxima por una conexión libre
+DB_POOL_PING_INACTIVA_SEGUNDOS = 30   # Inactividad a partir de la cual se valida con ping
 
 # --- CONFIGURACIÓN DE MQTT BROKER (Mosquitto) ---
-MQTT_BROKER = 'localhost' 
-MQTT_PORT = 1883
-MQTT_USER = 'parqueadero'
-MQTT_PASSWORD = 'parqueadero'
+MQTT_BROKER = os.environ.get('PARQUEADERO_MQTT_BROKER', 'localhost')
+MQTT_PORT = int(os.environ.get('PARQUEADERO_MQTT_PORT', 1883))
+MQTT_USER = os.environ.get('PARQUEADERO_MQTT_USER', 'parqueadero')
+MQTT_PASSWORD = os.environ.get('PARQUEADERO_MQTT_PASSWORD', 'parqueadero')
 # TÓPICOS DE ENTRADA (ESP32 publica evento de 'Esperando')
 MQTT_TOPIC_ENTRADA_CARRO = "parqueadero/entrada/carro" 
 #  CORRECCIÓN: Tópico de salida debe coincidir con el ESP32
@@ -20,12 +30,21 @@ MQTT_TOPIC_ENTRADA_MOTO = "parqueadero/entrada/moto"
 
 # Tópico para que el backend ordene al ESP32 qué hacer (abrir talanquera)
 TOPIC_CONTROL_TALANQUERA = "parqueadero/control/talanquera" 
+# Talanquera del carril de motos
+TOPIC_CONTROL_TALANQUERA_MOTO = "parqueadero/control/talanquera/moto"
 
 # Tópico para que los sensores internos reporten ocupación/liberación (ej. parqueadero/ubicacion/A1)
 MQTT_TOPIC_UBICACION = "parqueadero/ubicacion" 
 
 # TÓPICO CORREGIDO: Tópico para que el Backend envíe el estado general al Display (OLED)
 TOPIC_DISPLAY_ESTADO_GENERAL = "parqueadero/display/estado_general"
+# Tópico en el que el Display pide un estado completo (keyframe) al detectar un hueco en 'seq'
+TOPIC_DISPLAY_SOLICITAR_KEYFRAME = "parqueadero/display/solicitar_keyframe"
+# Formato binario: plano retenido {"huella", "cubiculos"} que traduce los índices del keyframe a nombres
+TOPIC_DISPLAY_PLANO = "parqueadero/display/plano"
+
+# Tópico interno por el que los procesos (workers web e ingesta) se avisan transiciones y cambios de tarifas
+TOPIC_EVENTOS_INTERNOS = "parqueadero/interno/eventos"
 
 # Tópico de visualización (no usado en la lógica central, pero mantenido)
 MQTT_TOPIC_ASIGNACION_DISPLAY = "parqueadero/asignacion/display" 
@@ -34,10 +53,121 @@ MQTT_TOPIC_ASIGNACION_DISPLAY = "parqueadero/asignacion/display"
 # --- TIPOS DE VEHÍCULO PARA TARIFAS (Usados como claves en la DB) ---
 TIPO_CARRO = 'CARRO'
 TIPO_MOTO = 'MOTO'
+# --- ZONAS (Letra inicial del nombre del cubículo) ---
+ZONA_CARROS = 'A'
+ZONA_MOTOS = 'B'
+# --- CARRILES DE ENTRADA ---
+# Uno por talanquera: tópico donde el ESP32 avisa 'Esperando', zona y tipo que asigna, y tópico de la orden ABRIR.
+# 'formato_control': 'json' o 'binario' (formato_binario.py), según lo que entienda el firmware de esa talanquera.
+# Cada carril tiene su propio trabajador: la asignación es en orden de llegada dentro del carril y
+# los carriles no se bloquean entre sí. Para otra puerta basta agregar un carril (puede repetir zona).
+CARRILES_ENTRADA = [
+    {'nombre': 'carros', 'topico_entrada': MQTT_TOPIC_ENTRADA_CARRO, 'zona': ZONA_CARROS,
+     'tipo_vehiculo': TIPO_CARRO, 'topico_control': TOPIC_CONTROL_TALANQUERA,
+     'formato_control': os.environ.get('PARQUEADERO_FORMATO_TALANQUERA_CARROS', 'json')},
+    {'nombre': 'motos', 'topico_entrada': MQTT_TOPIC_ENTRADA_MOTO, 'zona': ZONA_MOTOS,
+     'tipo_vehiculo': TIPO_MOTO, 'topico_control': TOPIC_CONTROL_TALANQUERA_MOTO,
+     'formato_control': os.environ.get('PARQUEADERO_FORMATO_TALANQUERA_MOTOS', 'json')},
+]
 
 # --- CONSTANTES DE NEGOCIO ---
 # El cubículo 'Asignado'/'Pendiente' caduca y se cobra 0 si el tiempo total es menor o igual a este valor.
 TIEMPO_GRACIA_MINUTOS = 0 
 # --- CONFIGURACIÓN DE LIMPIEZA AUTOMÁTICA ---
-# Frecuencia con la que se revisarán las reservas pendientes caducadas.
-INTERVALO_LIMPIEZA_SEGUNDOS = 90
\ No newline at end of file
+# Plazo de una reserva 'Pendiente' sin confirmación del sensor; al cumplirse se cancela de inmediato (expiracion_reservas.py).
+TIEMPO_EXPIRACION_RESERVA_SEGUNDOS = 90
+# Barrido de reconciliación: cancela las reservas vencidas que el expirador no vio (reinicios, otras instancias).
+INTERVALO_LIMPIEZA_SEGUNDOS = 600
+# --- CACHE DE TARIFAS ---
+# Segundos que una tarifa leída de la DB se considera válida (protege contra cambios hechos directamente en MySQL).
+TARIFAS_CACHE_TTL_SEGUNDOS = 300
+# --- ASIGNADOR DE CUBÍCULOS EN MEMORIA ---
+# Frecuencia con la que el asignador se reconcilia con la tabla 'cubiculos'.
+INTERVALO_RECONCILIACION_ASIGNADOR_SEGUNDOS = 60
+# --- EMISIÓN DE TICKETS ---
+# Cantidad de IDs de registro_cobro que se reservan de la tabla 'secuencias' en cada ida a la DB.
+TAMANO_BLOQUE_TICKETS = 50
+# --- PROCESAMIENTO DE MENSAJES MQTT ---
+# Hilos que ejecutan el trabajo de DB de los mensajes (el hilo de red de MQTT solo decodifica y encola).
+MQTT_TRABAJADORES_DB = 4
+# Mensajes que puede acumular cada trabajador antes de aplicar contrapresión.
+MQTT_CAPACIDAD_COLA = 500
+# Tiempo máximo que el hilo de red espera por espacio en una cola llena antes de descartar el mensaje.
+MQTT_TIMEOUT_ENCOLADO_SEGUNDOS = 0.5
+# --- ESCRITURA POR LOTES DE LA OCUPACIÓN REPORTADA POR LOS SENSORES ---
+# Cada cuánto se escriben en la DB los cubículos reportados como 'Ocupado'.
+OCUPACION_INTERVALO_VACIADO_MS = 500
+# Cantidad de cubículos distintos pendientes que fuerza a escribir el lote antes del intervalo.
+OCUPACION_MAX_EVENTOS_LOTE = 50
+# --- PUBLICACIÓN AL DISPLAY ---
+# Cada cuánto se envía el estado completo (keyframe); entre keyframes solo se publican los cambios.
+DISPLAY_INTERVALO_KEYFRAME_SEGUNDOS = 60
+# 'json' o 'binario': vector de 2 bits por cubículo y deltas por índice (formato_binario.py).
+# Es uno solo para todos los displays suscritos a TOPIC_DISPLAY_ESTADO_GENERAL (no por dispositivo);
+# por dispositivo solo se elige el de las talanqueras ('formato_control' del carril).
+FORMATO_PAYLOAD_DISPLAY = os.environ.get('PARQUEADERO_FORMATO_DISPLAY', 'json')
+# --- MONITOR EN VIVO (SERVER-SENT EVENTS) ---
+# Eventos que puede acumular una conexión lenta antes de cerrarla (el navegador se reconecta con un snapshot nuevo).
+SSE_CAPACIDAD_COLA_CLIENTE = 200
+# Cada cuánto se envía un comentario de keep-alive si no hay eventos.
+SSE_INTERVALO_PING_SEGUNDOS = 15
+# Espera sugerida al navegador antes de reconectar el EventSource.
+SSE_REINTENTO_MS = 3000
+# Streams abiertos a la vez por proceso: cada uno ocupa un hilo de gunicorn (WEB_HILOS_POR_WORKER) mientras
+# dure; al llegar al tope se responde 503 y el monitor sigue por sondeo, reintentando el stream cada
+# SSE_REINTENTO_TOPE_MS.
+SSE_MAXIMO_CLIENTES_POR_PROCESO = int(os.environ.get('PARQUEADERO_SSE_MAXIMO_CLIENTES', 4))
+SSE_REINTENTO_TOPE_MS = 60000
+# --- REPORTE DE HISTORIAL ---
+# Filas por página de /api/reporte (paginación por hora_salida, id).
+REPORTE_LIMITE_POR_DEFECTO = 100
+REPORTE_LIMITE_MAXIMO = 1000
+# Filas por página de /api/reporte/export: cada página es una consulta por llave (hora_salida, id) sobre
+# registro_cobro y registro_cobro_archivo (cada rama con LIMIT); la memoria queda acotada a una página.
+EXPORTACION_TAMANO_LOTE = 500
+# Totales de /api/reporte desde la tabla resumen_diario (migraciones/002_resumen_diario.sql).
+# Tras crearla, llenarla una vez con: flask --app app reconstruir-resumen
+REPORTE_TOTALES_DESDE_RESUMEN = True
+# Búsqueda del historial ('buscar'): si el término coincide con más placas que esto (ej. una sola
+# letra), se filtra con LIKE sobre el rango de fechas en lugar de una lista IN desde el índice en memoria.
+BUSQUEDA_MAXIMO_PLACAS_HISTORIAL = 500
+# Cada cuánto se vuelven a sembrar desde la DB los índices de búsqueda de cada proceso (corrige
+# eventos internos perdidos y descarta placas que ya no están en el historial).
+BUSQUEDA_RESIEMBRA_SEGUNDOS = 600
+# --- ARCHIVO DE COBROS (registro_cobro -> registro_cobro_archivo, particionada por mes) ---
+# Los cobros cerrados hace más de estos días salen de la tabla caliente.
+ARCHIVO_ANTIGUEDAD_DIAS = 90
+# Tickets movidos por transacción; lotes cortos para no retener bloqueos frente a entradas y cobros.
+ARCHIVO_TAMANO_LOTE = 500
+# Pausa entre lotes y máximo de lotes por pasada (el resto queda para la siguiente pasada).
+ARCHIVO_PAUSA_ENTRE_LOTES_SEGUNDOS = 0.2
+ARCHIVO_MAXIMO_LOTES_POR_PASADA = 200
+# Frecuencia de la tarea de archivo.
+INTERVALO_ARCHIVO_SEGUNDOS = 3600
+# --- SIMULACIÓN DE TARIFAS (flask --app app simular-tarifas) ---
+# Estadías del historial que se leen y se cobran en cada pasada vectorizada.
+SIMULACION_TAMANO_LOTE = 50000
+# --- SERVIDOR DE PRODUCCIÓN (gunicorn -c gunicorn.conf.py wsgi:app  +  python ingesta.py) ---
+WEB_PUERTO = int(os.environ.get('PARQUEADERO_WEB_PUERTO', 5000))
+# Procesos y hilos por proceso de gunicorn (worker 'gthread'); cada monitor SSE abierto ocupa un hilo
+WEB_WORKERS = int(os.environ.get('PARQUEADERO_WEB_WORKERS', 2))
+WEB_HILOS_POR_WORKER = int(os.environ.get('PARQUEADERO_WEB_HILOS', 16))
+# /metrics de cada worker en su propio puerto (base + índice 0..WEB_WORKERS-1): un objetivo de scrape
+# por worker, porque cada proceso lleva sus propios contadores e histogramas
+WEB_PUERTO_METRICAS_BASE = int(os.environ.get('PARQUEADERO_WEB_PUERTO_METRICAS', 9111))
+# El /metrics del puerto web junta los de todos los workers (etiqueta 'worker'); espera máxima por worker
+WEB_TIMEOUT_METRICAS_WORKER_SEGUNDOS = 2
+# Tiempo que gunicorn espera a las peticiones en curso al apagarse
+WEB_TIMEOUT_APAGADO_SEGUNDOS = 30
+# Debugger de Flask: solo para desarrollo local con 'python app.py'
+FLASK_DEBUG = os.environ.get('PARQUEADERO_FLASK_DEBUG', '0') == '1'
+# Proceso de ingesta: espera máxima para drenar la cola MQTT al apagarse, y puerto de /metrics y /api/metricas
+INGESTA_TIMEOUT_DRENADO_SEGUNDOS = 30
+INGESTA_PUERTO_METRICAS = int(os.environ.get('PARQUEADERO_INGESTA_PUERTO_METRICAS', 9101))
+# --- ELECCIÓN DE LÍDER (GET_LOCK de MySQL) ---
+# Solo la réplica con este candado ejecuta la ingesta MQTT y el scheduler.
+LIDER_NOMBRE_LOCK = f"parqueadero_ingesta_{MYSQL_DB}"
+# Espera de GET_LOCK en las réplicas en espera y período de verificación del líder (tiempo de conmutación).
+LIDER_INTERVALO_SEGUNDOS = 2
+# wait_timeout de la conexión del candado: un líder colgado lo pierde tras este tiempo sin verificar.
+LIDER_TIEMPO_SESION_SEGUNDOS = 10
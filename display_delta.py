@@ -0,0 +1,103 @@
+# display_delta.py
+# ===========================================
+# PUBLICACIÓN INCREMENTAL DEL ESTADO AL DISPLAY (DELTAS + KEYFRAMES)
+# ===========================================
+import threading
+import time
+
+
+class PublicadorDisplay:
+    """
+    Recuerda el último estado enviado al display y solo publica lo que cambió.
+
+    - 'marcar_cambio()' lo llaman las transiciones de cubículos; si nada se marcó y no toca
+      keyframe, el ciclo del scheduler ni siquiera consulta la DB (ver 'necesita_consulta').
+    - 'construir(estados, libres)' compara contra lo último publicado y devuelve el payload:
+        keyframe: {"tipo": "full",  "seq": n, "libres": x, "data":    [{"cub":..,"est":..}, ...]}
+        delta:    {"tipo": "delta", "seq": n, "libres": x, "cambios": [{"cub":..,"est":..}, ...]}
+      o None si no hay nada que enviar. 'seq' sube en cada publicación para que el ESP32
+      detecte huecos y pida un keyframe ('forzar_keyframe').
+    - Si cambia el conjunto de cubículos se envía un keyframe: 'orden()' (los nombres del último
+      keyframe) es el plano sobre el que se indexan los deltas del formato binario.
+    """
+
+    def __init__(self, intervalo_keyframe_segundos):
+        self._intervalo_keyframe = intervalo_keyframe_segundos
+        self._lock = threading.Lock()
+        self._ultimo = None
+        self._orden = []
+        self._ultimos_libres = None
+        self._ultimo_keyframe = 0.0
+        self._sucio = True
+        self._forzar_keyframe = True
+        self.seq = 0
+        self.keyframes = 0
+        self.deltas = 0
+        self.ciclos_omitidos = 0
+
+    def marcar_cambio(self):
+        with self._lock:
+            self._sucio = True
+
+    def forzar_keyframe(self):
+        with self._lock:
+            self._forzar_keyframe = True
+
+    def _toca_keyframe(self, ahora):
+        return self._forzar_keyframe or ahora - self._ultimo_keyframe >= self._intervalo_keyframe
+
+    def necesita_consulta(self):
+        """Decide si el ciclo debe leer la DB. Limpia la marca ANTES de la consulta, para no perder cambios concurrentes."""
+        with self._lock:
+            if self._sucio or self._toca_keyframe(time.monotonic()):
+                self._sucio = False
+                return True
+            self.ciclos_omitidos += 1
+            return False
+
+    def construir(self, estados, libres):
+        """'estados' es una lista ordenada de (nombre, estado)."""
+        ahora = time.monotonic()
+        actual = dict(estados)
+        with self._lock:
+            if self._ultimo is None or self._toca_keyframe(ahora) or actual.keys() != self._ultimo.keys():
+                self.seq += 1
+                self._ultimo = actual
+                self._orden = [nombre for nombre, _ in estados]
+                self._ultimos_libres = libres
+                self._ultimo_keyframe = ahora
+                self._forzar_keyframe = False
+                self.keyframes += 1
+                return {
+                    "tipo": "full",
+                    "seq": self.seq,
+                    "libres": libres,
+                    "data": [{"cub": nombre, "est": estado} for nombre, estado in estados]
+                }
+
+            cambios = [
+                {"cub": nombre, "est": estado}
+                for nombre, estado in estados
+                if self._ultimo.get(nombre) != estado
+            ]
+            if not cambios and libres == self._ultimos_libres:
+                return None
+
+            self.seq += 1
+            self._ultimo = actual
+            self._ultimos_libres = libres
+            self.deltas += 1
+            return {"tipo": "delta", "seq": self.seq, "libres": libres, "cambios": cambios}
+
+    def orden(self):
+        with self._lock:
+            return list(self._orden)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'seq': self.seq,
+                'keyframes': self.keyframes,
+                'deltas': self.deltas,
+                'ciclos_sin_consulta': self.ciclos_omitidos,
+            }
@@ -0,0 +1,123 @@
+# eleccion_lider.py
+# ===========================================
+# ELECCIÓN DE LÍDER CON GET_LOCK DE MYSQL (UNA SOLA INGESTA ACTIVA)
+# ===========================================
+import logging
+import threading
+
+import MySQLdb
+
+logger = logging.getLogger('FlaskApp')
+
+
+class EleccionLider:
+    """
+    Solo la réplica que tiene el candado con nombre 'nombre_lock' en MySQL (GET_LOCK) ejecuta la
+    ingesta MQTT y el scheduler; las demás esperan y siguen atendiendo HTTP.
+
+    - El candado pertenece a una conexión dedicada (no del pool). Si el proceso líder muere o
+      pierde la conexión, MySQL libera el candado y una réplica en espera lo toma en cuanto
+      termina su GET_LOCK bloqueante (como máximo 'intervalo' segundos).
+    - La sesión usa wait_timeout = 'tiempo_sesion': un líder colgado pierde el candado solo.
+    - El líder verifica cada 'intervalo' segundos que sigue siéndolo (IS_USED_LOCK = CONNECTION_ID);
+      si la verificación falla llama a 'al_perder(voluntario=False)' ANTES de reintentar, para no
+      tener dos ingestas a la vez: otra réplica puede haber tomado ya el candado, así que ese
+      apagado no debe drenar colas. 'detener()' llama a 'al_perder(voluntario=True)'.
+    """
+
+    def __init__(self, parametros, nombre_lock, al_ganar, al_perder, intervalo, tiempo_sesion):
+        self._parametros = parametros
+        self._nombre = nombre_lock
+        self._al_ganar = al_ganar
+        self._al_perder = al_perder
+        self._intervalo = intervalo
+        self._tiempo_sesion = tiempo_sesion
+        self._conexion = None
+        self._detenido = threading.Event()
+        self._hilo = None
+        self.es_lider = False
+        self.elecciones_ganadas = 0
+        self.liderazgos_perdidos = 0
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._bucle, name="eleccion-lider", daemon=True)
+        self._hilo.start()
+
+    def _conectar(self):
+        if self._conexion is None:
+            self._conexion = MySQLdb.connect(**self._parametros)
+            cur = self._conexion.cursor()
+            cur.execute("SET SESSION wait_timeout = %s", (self._tiempo_sesion,))
+            cur.close()
+        return self._conexion
+
+    def _cerrar_conexion(self):
+        if self._conexion is not None:
+            try:
+                self._conexion.close()
+            except Exception:
+                pass
+            self._conexion = None
+
+    def _consultar(self, sql, params):
+        cur = self._conectar().cursor()
+        try:
+            cur.execute(sql, params)
+            return cur.fetchone()[0]
+        finally:
+            cur.close()
+
+    def _perder(self, motivo):
+        self.es_lider = False
+        self.liderazgos_perdidos += 1
+        logger.warning(f"Líder: liderazgo perdido ({motivo}). Deteniendo ingesta y scheduler.")
+        try:
+            self._al_perder(voluntario=False)
+        except Exception as e:
+            logger.error(f"Líder: Error al detener la ingesta: {e}")
+
+    def _bucle(self):
+        while not self._detenido.is_set():
+            try:
+                if not self.es_lider:
+                    # Bloquea hasta 'intervalo' segundos: la conmutación ocurre apenas se libera el candado
+                    if self._consultar("SELECT GET_LOCK(%s, %s)", (self._nombre, self._intervalo)) == 1:
+                        self.es_lider = True
+                        self.elecciones_ganadas += 1
+                        logger.info(f"Líder: candado '{self._nombre}' obtenido; esta instancia ejecuta la ingesta.")
+                        self._al_ganar()
+                    continue
+
+                if self._consultar("SELECT IS_USED_LOCK(%s) = CONNECTION_ID()", (self._nombre,)) != 1:
+                    self._perder("el candado ya no pertenece a esta conexión")
+            except Exception as e:
+                self._cerrar_conexion()
+                if self.es_lider:
+                    self._perder(f"conexión con MySQL: {e}")
+                else:
+                    logger.error(f"Líder: No se pudo consultar el candado '{self._nombre}': {e}")
+            self._detenido.wait(self._intervalo)
+
+    def detener(self):
+        """Sale de la elección: detiene la ingesta si es líder y libera el candado para otra réplica."""
+        self._detenido.set()
+        if self._hilo:
+            self._hilo.join()
+        if self.es_lider:
+            self.es_lider = False
+            try:
+                self._al_perder(voluntario=True)
+            finally:
+                try:
+                    self._consultar("SELECT RELEASE_LOCK(%s)", (self._nombre,))
+                except Exception:
+                    pass
+        self._cerrar_conexion()
+
+    def estadisticas(self):
+        return {
+            'lock': self._nombre,
+            'es_lider': self.es_lider,
+            'elecciones_ganadas': self.elecciones_ganadas,
+            'liderazgos_perdidos': self.liderazgos_perdidos,
+        }
@@ -0,0 +1,72 @@
+# eventos_internos.py
+# ===========================================
+# EVENTOS ENTRE PROCESOS (WEB <-> INGESTA) POR UN TÓPICO MQTT INTERNO
+# ===========================================
+import json
+import logging
+import uuid
+
+logger = logging.getLogger('FlaskApp')
+
+
+class CanalEventosInternos:
+    """
+    Reparte entre procesos los cambios que cada uno aplica en memoria (transiciones de cubículos,
+    cambios de placa, tarifas), porque los workers web y el proceso de ingesta no comparten
+    memoria: asignador, expirador y display viven en la ingesta; cada worker web tiene su propio
+    bus SSE y su propio cache de tarifas.
+
+    - 'conectar(cliente)' usa un cliente paho ya conectado para publicar; cada proceso recibe los
+      mensajes del tópico en su on_message y los entrega a 'recibir(payload)'.
+    - 'publicar(tipo, **datos)' envía {"origen", "tipo", ...}; el emisor ignora sus propios
+      mensajes, porque ya aplicó el cambio localmente antes de publicarlo.
+    - 'aplicar(evento)' es el callback que ejecuta el cambio en el proceso receptor.
+    """
+
+    def __init__(self, topico, aplicar):
+        self.topico = topico
+        self._aplicar = aplicar
+        self._cliente = None
+        self.origen = None
+        self.publicados = 0
+        self.recibidos = 0
+        self.errores = 0
+
+    def conectar(self, cliente):
+        # El identificador se genera aquí y no al importar: con gunicorn --preload todos los
+        # workers heredarían el mismo
+        self.origen = uuid.uuid4().hex
+        self._cliente = cliente
+
+    def desconectar(self):
+        self._cliente = None
+
+    def publicar(self, tipo, **datos):
+        if self._cliente is None:
+            return
+        datos.update({'origen': self.origen, 'tipo': tipo})
+        try:
+            self._cliente.publish(self.topico, json.dumps(datos, default=str), qos=1)
+            self.publicados += 1
+        except Exception as e:
+            self.errores += 1
+            logger.error(f"Eventos internos: No se pudo publicar '{tipo}': {e}")
+
+    def recibir(self, payload):
+        try:
+            evento = json.loads(payload.decode('utf-8') if isinstance(payload, bytes) else payload)
+            if evento.get('origen') == self.origen:
+                return
+            self.recibidos += 1
+            self._aplicar(evento)
+        except Exception as e:
+            self.errores += 1
+            logger.error(f"Eventos internos: Error al aplicar evento: {e}")
+
+    def estadisticas(self):
+        return {
+            'conectado': self._cliente is not None,
+            'publicados': self.publicados,
+            'recibidos': self.recibidos,
+            'errores': self.errores,
+        }
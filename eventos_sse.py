@@ -0,0 +1,76 @@
+# eventos_sse.py
+# ===========================================
+# BUS DE EVENTOS PARA EL MONITOR EN VIVO (SERVER-SENT EVENTS)
+# ===========================================
+import json
+import queue
+import threading
+
+
+def formatear_sse(evento, datos):
+    """Serializa un evento en el formato de texto de Server-Sent Events."""
+    return f"event: {evento}\ndata: {json.dumps(datos, default=str)}\n\n"
+
+
+class Suscripcion:
+    """
+    Conexión SSE suscrita al bus. Si se queda atrás (cola llena) se marca 'desbordada': su stream
+    debe cerrarse y el navegador (EventSource) se reconecta recibiendo un snapshot nuevo.
+    """
+
+    def __init__(self, capacidad):
+        self.cola = queue.Queue(maxsize=capacidad)
+        self.desbordada = False
+
+
+class BusEventos:
+    """
+    Difunde eventos (tipo, datos) a todas las conexiones SSE abiertas, cada una con su cola acotada.
+    Admite hasta 'maximo_clientes' conexiones: 'suscribir()' devuelve None al llegar al tope.
+    """
+
+    def __init__(self, capacidad_por_cliente, maximo_clientes=None):
+        self._capacidad = capacidad_por_cliente
+        self._maximo = maximo_clientes
+        self._lock = threading.Lock()
+        self._suscriptores = set()
+        self.publicados = 0
+        self.desbordes = 0
+        self.rechazados = 0
+
+    def suscribir(self):
+        suscripcion = Suscripcion(self._capacidad)
+        with self._lock:
+            if self._maximo is not None and len(self._suscriptores) >= self._maximo:
+                self.rechazados += 1
+                return None
+            self._suscriptores.add(suscripcion)
+        return suscripcion
+
+    def desuscribir(self, suscripcion):
+        with self._lock:
+            self._suscriptores.discard(suscripcion)
+
+    def publicar(self, evento, datos):
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+            self.publicados += 1
+        for suscripcion in suscriptores:
+            try:
+                suscripcion.cola.put_nowait((evento, datos))
+            except queue.Full:
+                # Cliente lento: se desconecta en lugar de bloquear al que publica
+                with self._lock:
+                    if suscripcion in self._suscriptores:
+                        self._suscriptores.discard(suscripcion)
+                        suscripcion.desbordada = True
+                        self.desbordes += 1
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'clientes_conectados': len(self._suscriptores),
+                'eventos_publicados': self.publicados,
+                'clientes_desbordados': self.desbordes,
+                'clientes_rechazados_por_tope': self.rechazados,
+            }
@@ -0,0 +1,110 @@
+# expiracion_reservas.py
+# ===========================================
+# VENCIMIENTO DE RESERVAS 'PENDIENTE' POR EVENTOS (MONTÍCULO DE PLAZOS)
+# ===========================================
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger('FlaskApp')
+
+
+class ExpiradorReservas:
+    """
+    Vence cada reserva 'Pendiente' justo a su plazo, sin recorrer la tabla de cubículos.
+
+    - 'armar(nombre, registro_id, segundos)' se llama al crear la reserva; 'desarmar(nombre)'
+      cuando se confirma la ocupación o el cubículo se libera por otra vía.
+    - Un hilo duerme hasta el plazo más cercano (montículo por hora de vencimiento) y entrega los
+      vencidos juntos a 'al_vencer([(nombre, registro_id), ...])', que cancela en la DB.
+    - Las entradas desarmadas o re-armadas quedan en el montículo y se descartan al salir
+      (borrado perezoso): armar/desarmar son O(log n) / O(1).
+    """
+
+    def __init__(self, al_vencer):
+        self._al_vencer = al_vencer
+        self._condicion = threading.Condition()
+        self._heap = []
+        self._armados = {}
+        self._contador = itertools.count()
+        self._detenido = False
+        self._hilo = None
+        self.armadas = 0
+        self.desarmadas = 0
+        self.vencidas = 0
+        self.errores = 0
+
+    def iniciar(self):
+        with self._condicion:
+            self._detenido = False
+        self._hilo = threading.Thread(target=self._bucle, name="expirador-reservas", daemon=True)
+        self._hilo.start()
+
+    def armar(self, nombre, registro_id, segundos):
+        vence = time.monotonic() + max(0.0, segundos)
+        with self._condicion:
+            entrada = (vence, next(self._contador), nombre, registro_id)
+            self._armados[nombre] = entrada
+            heapq.heappush(self._heap, entrada)
+            self.armadas += 1
+            # Despierta al hilo solo si este plazo es ahora el más cercano
+            if self._heap[0] is entrada:
+                self._condicion.notify()
+
+    def desarmar(self, nombre):
+        with self._condicion:
+            if self._armados.pop(nombre, None) is not None:
+                self.desarmadas += 1
+
+    def armado(self, nombre):
+        with self._condicion:
+            return nombre in self._armados
+
+    def _extraer_vencidos(self, ahora):
+        vencidos = []
+        while self._heap and self._heap[0][0] <= ahora:
+            entrada = heapq.heappop(self._heap)
+            if self._armados.get(entrada[2]) is entrada:
+                del self._armados[entrada[2]]
+                vencidos.append((entrada[2], entrada[3]))
+        return vencidos
+
+    def _bucle(self):
+        while True:
+            with self._condicion:
+                while not self._detenido:
+                    vencidos = self._extraer_vencidos(time.monotonic())
+                    if vencidos:
+                        break
+                    espera = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._condicion.wait(espera)
+                if self._detenido:
+                    return
+                self.vencidas += len(vencidos)
+
+            try:
+                self._al_vencer(vencidos)
+            except Exception as e:
+                # La reconciliación periódica las cancelará en su siguiente pasada
+                self.errores += 1
+                logger.error(f"Expirador: Error al cancelar {len(vencidos)} reservas vencidas: {e}")
+
+    def detener(self):
+        with self._condicion:
+            self._detenido = True
+            self._condicion.notify()
+        if self._hilo:
+            self._hilo.join()
+            self._hilo = None
+
+    def estadisticas(self):
+        with self._condicion:
+            return {
+                'armadas_ahora': len(self._armados),
+                'armadas': self.armadas,
+                'desarmadas': self.desarmadas,
+                'vencidas': self.vencidas,
+                'errores': self.errores,
+            }
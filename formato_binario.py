@@ -0,0 +1,117 @@
+# formato_binario.py
+# ===========================================
+# FORMATO BINARIO COMPACTO PARA EL DISPLAY Y LAS TALANQUERAS (ESP32)
+# ===========================================
+# Alternativa opcional al JSON (config.py: global para el display, por carril para las talanqueras). Todos los enteros van en
+# little-endian (el orden nativo del ESP32: se leen con memcpy). El primer byte nunca es '{'
+# (0x7B), así el firmware puede aceptar ambos formatos en el mismo tópico.
+#
+# Display (TOPIC_DISPLAY_ESTADO_GENERAL):
+#   u8  cabecera   0xB0 = keyframe, 0xB1 = delta
+#   u32 seq
+#   u16 libres
+#   u32 huella     CRC32 de los nombres del keyframe, en orden, unidos por '\n'
+#   keyframe: u16 n, y ceil(n/4) bytes con 2 bits por cubículo (el primero en los bits bajos)
+#   delta:    u16 k, y k x u16 = índice en el keyframe | (estado << 14)
+# Estados de 2 bits: 0 Libre, 1 Pendiente, 2 Ocupado, 3 otro.
+#
+# Plano (TOPIC_DISPLAY_PLANO, retenido, JSON): {"huella": u32, "cubiculos": [nombres en orden]}.
+# Se publica cuando cambia la huella; el display lo recibe al suscribirse y descarta los
+# mensajes binarios cuya huella no coincide con la del último plano recibido.
+#
+# Orden a una talanquera (topico_control del carril):
+#   u8 0xB2, u8 orden (1 = ABRIR), u8 largo, nombre del cubículo en ASCII
+import json
+import struct
+import zlib
+
+CABECERA_KEYFRAME = 0xB0
+CABECERA_DELTA = 0xB1
+CABECERA_ORDEN = 0xB2
+
+CODIGOS_ESTADO = {'Libre': 0, 'Pendiente': 1, 'Ocupado': 2}
+CODIGO_OTRO = 3
+ESTADOS_POR_CODIGO = {codigo: estado for estado, codigo in CODIGOS_ESTADO.items()}
+
+CODIGOS_ORDEN = {'ABRIR': 1}
+ORDENES_POR_CODIGO = {codigo: orden for orden, codigo in CODIGOS_ORDEN.items()}
+
+# Límite del índice de un delta (14 bits)
+MAXIMO_CUBICULOS = 1 << 14
+
+_ENCABEZADO_DISPLAY = struct.Struct('<BIHI')
+_CONTADOR = struct.Struct('<H')
+
+
+def huella_plano(orden):
+    """CRC32 del plano de cubículos: el ESP32 la compara con la suya para saber si los índices coinciden."""
+    return zlib.crc32('\n'.join(orden).encode('utf-8')) & 0xFFFFFFFF
+
+
+def codificar_plano(orden):
+    """Plano retenido que permite al display traducir los índices binarios a nombres de cubículo."""
+    return json.dumps({"huella": huella_plano(orden), "cubiculos": list(orden)})
+
+
+def codificar_display(payload, orden):
+    """
+    Payload de PublicadorDisplay.construir -> bytes. 'orden' es la lista de nombres del último
+    keyframe (la misma que usa 'data' en un keyframe); los deltas se codifican por índice en ella.
+    """
+    if len(orden) > MAXIMO_CUBICULOS:
+        raise ValueError(f"El formato binario admite hasta {MAXIMO_CUBICULOS} cubículos.")
+    huella = huella_plano(orden)
+
+    if payload['tipo'] == 'full':
+        codigos = [CODIGOS_ESTADO.get(item['est'], CODIGO_OTRO) for item in payload['data']]
+        vector = bytearray((len(codigos) + 3) // 4)
+        for i, codigo in enumerate(codigos):
+            vector[i // 4] |= codigo << ((i % 4) * 2)
+        return (_ENCABEZADO_DISPLAY.pack(CABECERA_KEYFRAME, payload['seq'], payload['libres'], huella)
+                + _CONTADOR.pack(len(codigos)) + bytes(vector))
+
+    indices = {nombre: i for i, nombre in enumerate(orden)}
+    cambios = [indices[item['cub']] | (CODIGOS_ESTADO.get(item['est'], CODIGO_OTRO) << 14)
+               for item in payload['cambios']]
+    return (_ENCABEZADO_DISPLAY.pack(CABECERA_DELTA, payload['seq'], payload['libres'], huella)
+            + _CONTADOR.pack(len(cambios)) + struct.pack(f'<{len(cambios)}H', *cambios))
+
+
+def decodificar_display(datos, orden):
+    """Inverso de codificar_display (referencia para el firmware y la verificación)."""
+    cabecera, seq, libres, huella = _ENCABEZADO_DISPLAY.unpack_from(datos, 0)
+    if huella != huella_plano(orden):
+        raise ValueError("La huella del plano no coincide: se necesita un keyframe con el plano actual.")
+    desplazamiento = _ENCABEZADO_DISPLAY.size
+    (cantidad,) = _CONTADOR.unpack_from(datos, desplazamiento)
+    desplazamiento += _CONTADOR.size
+
+    if cabecera == CABECERA_KEYFRAME:
+        vector = datos[desplazamiento:desplazamiento + (cantidad + 3) // 4]
+        return {
+            "tipo": "full", "seq": seq, "libres": libres,
+            "data": [{"cub": orden[i], "est": ESTADOS_POR_CODIGO.get((vector[i // 4] >> ((i % 4) * 2)) & 0b11, 'Otro')}
+                     for i in range(cantidad)]
+        }
+    if cabecera == CABECERA_DELTA:
+        valores = struct.unpack_from(f'<{cantidad}H', datos, desplazamiento)
+        return {
+            "tipo": "delta", "seq": seq, "libres": libres,
+            "cambios": [{"cub": orden[v & (MAXIMO_CUBICULOS - 1)], "est": ESTADOS_POR_CODIGO.get(v >> 14, 'Otro')}
+                        for v in valores]
+        }
+    raise ValueError(f"Cabecera de display desconocida: 0x{cabecera:02X}")
+
+
+def codificar_orden(orden, cubiculo):
+    """{"orden": "ABRIR", "cub": "A3"} -> b'\\xb2\\x01\\x02A3'."""
+    nombre = cubiculo.encode('ascii')
+    return struct.pack('<BBB', CABECERA_ORDEN, CODIGOS_ORDEN[orden], len(nombre)) + nombre
+
+
+def decodificar_orden(datos):
+    cabecera, codigo, largo = struct.unpack_from('<BBB', datos, 0)
+    if cabecera != CABECERA_ORDEN:
+        raise ValueError(f"Cabecera de orden desconocida: 0x{cabecera:02X}")
+    return {"orden": ORDENES_POR_CODIGO[codigo], "cub": datos[3:3 + largo].decode('ascii')}
+
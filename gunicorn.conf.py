@@ -0,0 +1,36 @@
+# gunicorn.conf.py
+# ===========================================
+# CONFIGURACIÓN DE GUNICORN PARA EL ROL WEB
+# ===========================================
+import itertools
+
+from config import WEB_PUERTO, WEB_WORKERS, WEB_HILOS_POR_WORKER, WEB_TIMEOUT_APAGADO_SEGUNDOS, WEB_PUERTO_METRICAS_BASE
+
+bind = f"0.0.0.0:{WEB_PUERTO}"
+workers = WEB_WORKERS
+# Hilos por worker: las peticiones cortas y los streams SSE (uno por monitor abierto) comparten el pool;
+# SSE_MAXIMO_CLIENTES_POR_PROCESO limita los streams para que siempre queden hilos para la API
+worker_class = 'gthread'
+threads = WEB_HILOS_POR_WORKER
+# Los streams SSE mandan un ping cada SSE_INTERVALO_PING_SEGUNDOS, muy por debajo de este límite
+timeout = 60
+graceful_timeout = WEB_TIMEOUT_APAGADO_SEGUNDOS
+accesslog = '-'
+
+
+def pre_fork(server, worker):
+    # Índice estable por worker: el que reemplaza a un worker caído hereda su puerto de métricas
+    en_uso = {getattr(w, 'indice_metricas', None) for w in server.WORKERS.values()}
+    worker.indice_metricas = next(i for i in itertools.count() if i not in en_uso)
+
+
+def post_fork(server, worker):
+    # Cada worker abre su propio cliente MQTT (solo eventos internos), su propio pool de conexiones
+    # y su propio /metrics en WEB_PUERTO_METRICAS_BASE + índice
+    from app import iniciar_web
+    iniciar_web(puerto_metricas=WEB_PUERTO_METRICAS_BASE + worker.indice_metricas)
+
+
+def worker_exit(server, worker):
+    from app import detener_web
+    detener_web()
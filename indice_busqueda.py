@@ -0,0 +1,134 @@
+# indice_busqueda.py
+# ===========================================
+# ÍNDICE EN MEMORIA DE N-GRAMAS PARA BUSCAR PLACAS, CÓDIGOS Y CUBÍCULOS
+# ===========================================
+import threading
+import time
+
+
+def ngramas(texto, n):
+    """Todas las subcadenas de longitud 1..n: cualquier término de hasta n caracteres es una clave directa."""
+    return {texto[i:i + k] for k in range(1, n + 1) for i in range(len(texto) - k + 1)}
+
+
+class IndiceNgramas:
+    """
+    Búsqueda por subcadena (equivalente a LIKE '%termino%') sin recorrer todas las entradas.
+
+    - Cada 'clave' (nombre de cubículo, placa) tiene uno o más textos; 'poner' reemplaza los
+      textos de la clave y 'quitar' la elimina. Los textos se guardan en mayúsculas.
+    - Se indexan todas las subcadenas de hasta 'n' caracteres (placas de 6-7 caracteres: ~18
+      n-gramas con n = 3). Un término corto es una sola consulta al diccionario; uno largo
+      intersecta los conjuntos de sus n-gramas (del más pequeño al más grande) y verifica la
+      subcadena solo en los candidatos.
+    - sembrar(entradas, version) reemplaza el contenido por el estado leído de la DB sin pisar los
+      cambios aplicados después de tomar 'version' (mismo esquema que AsignadorCubiculos.sincronizar):
+      las claves que ya no están en la DB se quitan. Se repite cada cierto tiempo ('vencido(ttl)')
+      para corregir eventos internos perdidos y descartar claves viejas.
+    """
+
+    def __init__(self, n=3):
+        self._n = n
+        self._lock = threading.Lock()
+        self._textos = {}
+        self._postings = {}
+        self._version = 0
+        self._tocados = {}
+        self.sembrado = False
+        self._sembrado_en = None
+        self.siembras = 0
+        self.busquedas = 0
+
+    # --- Utilidades internas (llamar con el lock tomado) ---
+
+    def _quitar(self, clave):
+        for texto in self._textos.pop(clave, ()):
+            for gram in ngramas(texto, self._n):
+                claves = self._postings.get(gram)
+                if claves is not None:
+                    claves.discard(clave)
+                    if not claves:
+                        del self._postings[gram]
+
+    def _poner(self, clave, textos):
+        self._quitar(clave)
+        textos = tuple(sorted({t.strip().upper() for t in textos if t}))
+        self._textos[clave] = textos
+        for texto in textos:
+            for gram in ngramas(texto, self._n):
+                self._postings.setdefault(gram, set()).add(clave)
+
+    def _tocar(self, clave):
+        self._version += 1
+        self._tocados[clave] = self._version
+
+    # --- API pública ---
+
+    def version(self):
+        """Versión actual; se toma ANTES de leer la DB para sembrar."""
+        with self._lock:
+            return self._version
+
+    def sembrar(self, entradas, version_lectura):
+        """Carga [(clave, textos), ...] leídos de la DB; devuelve cuántas claves quedaron indexadas."""
+        with self._lock:
+            leidas = set()
+            for clave, textos in entradas:
+                leidas.add(clave)
+                if self._tocados.get(clave, 0) > version_lectura:
+                    continue
+                self._poner(clave, textos)
+            for clave in [c for c in self._textos if c not in leidas and self._tocados.get(c, 0) <= version_lectura]:
+                self._quitar(clave)
+            self._tocados = {c: v for c, v in self._tocados.items() if v > version_lectura}
+            self.sembrado = True
+            self._sembrado_en = time.monotonic()
+            self.siembras += 1
+            return len(self._textos)
+
+    def vencido(self, ttl):
+        """True si nunca se sembró o la última siembra tiene más de 'ttl' segundos."""
+        with self._lock:
+            return self._sembrado_en is None or time.monotonic() - self._sembrado_en > ttl
+
+    def poner(self, clave, *textos):
+        with self._lock:
+            self._poner(clave, textos)
+            self._tocar(clave)
+
+    def quitar(self, clave):
+        with self._lock:
+            self._quitar(clave)
+            self._tocar(clave)
+
+    def buscar(self, termino, limite=None):
+        """
+        Claves con algún texto que contenga 'termino' (sin distinguir mayúsculas).
+        Con 'limite', devuelve None si hay más coincidencias que 'limite'.
+        """
+        termino = termino.strip().upper()
+        with self._lock:
+            self.busquedas += 1
+            if len(termino) <= self._n:
+                claves = self._postings.get(termino, ())
+                if limite is not None and len(claves) > limite:
+                    return None
+                encontradas = set(claves)
+            else:
+                conjuntos = sorted((self._postings.get(termino[i:i + self._n], set())
+                                    for i in range(len(termino) - self._n + 1)), key=len)
+                candidatas = set(conjuntos[0]).intersection(*conjuntos[1:])
+                encontradas = {c for c in candidatas if any(termino in t for t in self._textos[c])}
+        if limite is not None and len(encontradas) > limite:
+            return None
+        return sorted(encontradas)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'claves': len(self._textos),
+                'ngramas': len(self._postings),
+                'sembrado': self.sembrado,
+                'siembras': self.siembras,
+                'busquedas': self.busquedas,
+            }
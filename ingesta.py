@@ -0,0 +1,36 @@
+# ingesta.py
+# ===========================================
+# PROCESO DE INGESTA: MQTT + TRABAJADORES DE DB + SCHEDULER
+# ===========================================
+# Uso: python ingesta.py   (el HTTP lo atiende gunicorn con wsgi.py)
+# Se pueden correr varias réplicas: solo la que gana el candado de líder (GET_LOCK) ingesta;
+# las demás esperan para tomar el relevo. Con SIGTERM/SIGINT el líder se apaga en orden
+# (deja de suscribirse, drena la cola MQTT y el buffer de ocupación) y libera el candado.
+import signal
+import threading
+
+from werkzeug.serving import make_server
+
+from app import app, iniciar_replica, detener_replica, logger
+from config import INGESTA_PUERTO_METRICAS
+
+
+def main():
+    detener = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: detener.set())
+    signal.signal(signal.SIGINT, lambda *_: detener.set())
+
+    iniciar_replica()
+
+    # /metrics y /api/metricas de este proceso (latencias de entrada, cola MQTT, tareas, liderazgo)
+    servidor_metricas = make_server('0.0.0.0', INGESTA_PUERTO_METRICAS, app, threaded=True)
+    threading.Thread(target=servidor_metricas.serve_forever, name="metricas-ingesta", daemon=True).start()
+    logger.info(f"Réplica de ingesta en marcha (esperando liderazgo). Métricas en :{INGESTA_PUERTO_METRICAS}/metrics")
+
+    detener.wait()
+    servidor_metricas.shutdown()
+    detener_replica()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+# metricas.py
+# ===========================================
+# MEDICIONES DE LATENCIA Y TASAS EN MEMORIA
+# ===========================================
+import bisect
+import threading
+import time
+from collections import deque
+
+
+class MuestrasLatencia:
+    """Ventana circular de las últimas N latencias (en ms) con percentiles p50/p99."""
+
+    def __init__(self, tamano_ventana=1000):
+        self._lock = threading.Lock()
+        self._muestras = deque(maxlen=tamano_ventana)
+        self.total = 0
+
+    def registrar(self, milisegundos):
+        with self._lock:
+            self._muestras.append(milisegundos)
+            self.total += 1
+
+    def resumen(self):
+        with self._lock:
+            ordenadas = sorted(self._muestras)
+            total = self.total
+        if not ordenadas:
+            return {'muestras': 0, 'total': total, 'p50_ms': None, 'p99_ms': None, 'max_ms': None}
+
+        def _p(p):
+            return round(ordenadas[min(len(ordenadas) - 1, int(round(p / 100.0 * (len(ordenadas) - 1))))], 3)
+
+        return {
+            'muestras': len(ordenadas),
+            'total': total,
+            'p50_ms': _p(50),
+            'p99_ms': _p(99),
+            'max_ms': round(ordenadas[-1], 3),
+        }
+
+
+class ContadorTasa:
+    """Contador acumulado con tasa por segundo sobre una ventana deslizante (por defecto 60 s)."""
+
+    def __init__(self, ventana_segundos=60):
+        self._lock = threading.Lock()
+        self._ventana = ventana_segundos
+        self._marcas = deque()
+        self.total = 0
+
+    def incrementar(self, cantidad=1):
+        ahora = time.monotonic()
+        with self._lock:
+            self.total += cantidad
+            self._marcas.append((ahora, cantidad))
+            self._podar(ahora)
+
+    def _podar(self, ahora):
+        while self._marcas and ahora - self._marcas[0][0] > self._ventana:
+            self._marcas.popleft()
+
+    def resumen(self):
+        ahora = time.monotonic()
+        with self._lock:
+            self._podar(ahora)
+            en_ventana = sum(cantidad for _, cantidad in self._marcas)
+            return {
+                'total': self.total,
+                'por_segundo': round(en_ventana / float(self._ventana), 3),
+                'ventana_segundos': self._ventana,
+            }
+
+
+class MetricasTarea:
+    """Duración y filas afectadas de cada ejecución de una tarea programada."""
+
+    def __init__(self, tamano_ventana=200):
+        self._lock = threading.Lock()
+        self.duraciones = MuestrasLatencia(tamano_ventana)
+        self.ejecuciones = 0
+        self.errores = 0
+        self.filas_total = 0
+        self.ultimas_filas = None
+        self.ultima_ejecucion = None
+
+    def registrar(self, milisegundos, filas=0, error=False):
+        self.duraciones.registrar(milisegundos)
+        with self._lock:
+            self.ejecuciones += 1
+            self.ultima_ejecucion = time.time()
+            if error:
+                self.errores += 1
+            else:
+                self.filas_total += filas
+                self.ultimas_filas = filas
+
+    def resumen(self):
+        with self._lock:
+            datos = {
+                'ejecuciones': self.ejecuciones,
+                'errores': self.errores,
+                'filas_total': self.filas_total,
+                'ultimas_filas': self.ultimas_filas,
+                'ultima_ejecucion': self.ultima_ejecucion,
+            }
+        datos['duracion'] = self.duraciones.resumen()
+        return datos
+
+
+# ------------------------- EXPOSICIÓN EN FORMATO PROMETHEUS -------------------------
+
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BUCKETS_PROFUNDIDAD = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def _escapar_etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatear_etiquetas(nombres, valores, extra=None):
+    pares = [f'{n}="{_escapar_etiqueta(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _formatear_numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Histograma:
+    """
+    Histograma acumulativo estilo Prometheus. Las etiquetas deben tener cardinalidad acotada
+    (endpoint, tópico, verbo SQL, tarea), nunca un cubículo o una placa.
+    """
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observar(self, valor, *valores_etiquetas):
+        posicion = bisect.bisect_left(self._buckets, valor)
+        with self._lock:
+            serie = self._series.get(valores_etiquetas)
+            if serie is None:
+                serie = self._series[valores_etiquetas] = [[0] * (len(self._buckets) + 1), 0.0, 0]
+            serie[0][posicion] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exponer(self):
+        with self._lock:
+            series = [(valores, list(conteos), suma, total) for valores, (conteos, suma, total) in self._series.items()]
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        for valores, conteos, suma, total in sorted(series):
+            acumulado = 0
+            for limite, conteo in zip(self._buckets + (float('inf'),), conteos):
+                acumulado += conteo
+                etiquetas = _formatear_etiquetas(self.etiquetas, valores, f'le="{_formatear_numero(limite)}"')
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+            etiquetas = _formatear_etiquetas(self.etiquetas, valores)
+            lineas.append(f"{self.nombre}_sum{etiquetas} {_formatear_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{etiquetas} {total}")
+        return lineas
+
+
+class Medidor:
+    """
+    Valor instantáneo (gauge) leído al momento de exponer. 'funcion' devuelve un número o,
+    si hay etiquetas, una lista de (tupla_de_valores, número).
+    """
+
+    def __init__(self, nombre, ayuda, funcion, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._funcion = funcion
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} gauge"]
+        valores = self._funcion()
+        if not self.etiquetas:
+            valores = [((), valores)]
+        for etiquetas, valor in valores:
+            lineas.append(f"{self.nombre}{_formatear_etiquetas(self.etiquetas, etiquetas)} {_formatear_numero(valor)}")
+        return lineas
+
+
+class RegistroMetricas:
+    """Conjunto de histogramas y medidores que se exponen juntos en /metrics."""
+
+    def __init__(self):
+        self._metricas = []
+
+    def registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def exponer(self):
+        lineas = []
+        for metrica in self._metricas:
+            try:
+                lineas.extend(metrica.exponer())
+            except Exception as e:
+                lineas.append(f"# ERROR {metrica.nombre}: {_escapar_etiqueta(e)}")
+        return '\n'.join(lineas) + '\n'
+
+
+def combinar_exposiciones(exposiciones, etiqueta='worker'):
+    """
+    Une en un solo texto de Prometheus las exposiciones de varios procesos ({valor_etiqueta: texto}),
+    agregando la etiqueta a cada muestra. Cada familia conserva un solo HELP/TYPE; los procesos que
+    no respondieron se pasan como None y quedan como un comentario '# ERROR'.
+    """
+    familias = {}
+    errores = []
+    for valor, texto in exposiciones.items():
+        if texto is None:
+            errores.append(f"# ERROR {etiqueta} {valor}: sin respuesta")
+            continue
+        par = f'{etiqueta}="{_escapar_etiqueta(valor)}"'
+        familia = None
+        for linea in texto.splitlines():
+            if linea.startswith('# HELP ') or linea.startswith('# TYPE '):
+                familia = linea.split(' ', 3)[2]
+                cabecera = familias.setdefault(familia, {'HELP': None, 'TYPE': None, 'muestras': []})
+                cabecera[linea[2:6]] = linea
+            elif linea.startswith('#'):
+                errores.append(linea)
+            elif linea and familia is not None:
+                fin_nombre = min(i for i in (linea.find('{'), linea.find(' ')) if i >= 0)
+                if linea[fin_nombre] == '{':
+                    separador = '' if linea[fin_nombre + 1] == '}' else ','
+                    linea = f"{linea[:fin_nombre + 1]}{par}{separador}{linea[fin_nombre + 1:]}"
+                else:
+                    linea = f"{linea[:fin_nombre]}{{{par}}}{linea[fin_nombre:]}"
+                familias[familia]['muestras'].append(linea)
+
+    lineas = []
+    for cabecera in familias.values():
+        lineas.extend(l for l in (cabecera['HELP'], cabecera['TYPE']) if l)
+        lineas.extend(cabecera['muestras'])
+    return '\n'.join(lineas + errores) + '\n'
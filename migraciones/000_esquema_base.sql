@@ -0,0 +1,33 @@
+-- 000_esquema_base.sql
+-- Esquema base que usa app.py. Con CREATE TABLE IF NOT EXISTS no toca una base ya existente;
+-- en una instalación nueva deja las tablas listas para el resto de migraciones.
+
+CREATE TABLE IF NOT EXISTS tarifas (
+    tipo VARCHAR(10) NOT NULL PRIMARY KEY,
+    tarifa_primera_hora DECIMAL(10, 2) NOT NULL DEFAULT 0,
+    tarifa_hora_subsiguiente DECIMAL(10, 2) NOT NULL DEFAULT 0
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS registro_cobro (
+    id INT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    hora_ingreso DATETIME NOT NULL,
+    hora_salida DATETIME NULL,
+    cubiculo_id INT UNSIGNED NULL,
+    placa VARCHAR(20) NULL,
+    tiempo_total_minutos INT UNSIGNED NULL,
+    monto_cobrado DECIMAL(10, 2) NULL
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS cubiculos (
+    id INT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    nombre VARCHAR(10) NOT NULL,
+    estado VARCHAR(12) NOT NULL DEFAULT 'Libre',
+    tipo_vehiculo VARCHAR(10) NULL,
+    placa VARCHAR(20) NULL,
+    registro_cobro_id INT UNSIGNED NULL,
+    timestamp_ultima_actualizacion DATETIME NULL
+) ENGINE=InnoDB;
+
+INSERT IGNORE INTO tarifas (tipo, tarifa_primera_hora, tarifa_hora_subsiguiente) VALUES
+    ('CARRO', 0, 0),
+    ('MOTO', 0, 0);
@@ -0,0 +1,13 @@
+-- 001_secuencia_tickets.sql
+-- Secuencia para pre-asignar IDs de registro_cobro por bloques.
+-- El código único del ticket (A-001, A-002, ...) se conoce ANTES del INSERT,
+-- así la emisión del ticket es un solo INSERT + UPDATE dentro de una transacción.
+
+CREATE TABLE IF NOT EXISTS secuencias (
+    nombre VARCHAR(64) NOT NULL PRIMARY KEY,
+    siguiente BIGINT UNSIGNED NOT NULL
+) ENGINE=InnoDB;
+
+-- Arranca después del último registro existente (no hace nada si ya existe)
+INSERT IGNORE INTO secuencias (nombre, siguiente)
+SELECT 'registro_cobro', COALESCE(MAX(id), 0) + 1 FROM registro_cobro;
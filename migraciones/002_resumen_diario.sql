@@ -0,0 +1,13 @@
+-- 002_resumen_diario.sql
+-- Resumen diario de cobros por tipo de vehículo, mantenido por finalizar_cobro dentro de su
+-- transacción. /api/reporte responde los totales de un rango sumando días (O(días), no O(tickets)).
+-- Para llenarlo con el historial existente: flask --app app reconstruir-resumen
+
+CREATE TABLE IF NOT EXISTS resumen_diario (
+    dia DATE NOT NULL,
+    tipo_vehiculo VARCHAR(10) NOT NULL,
+    cantidad INT UNSIGNED NOT NULL DEFAULT 0,
+    minutos_totales BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    monto_total DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, tipo_vehiculo)
+) ENGINE=InnoDB;
@@ -0,0 +1,29 @@
+-- 003_indices_y_zona.sql
+-- Índices para las consultas frecuentes de app.py y columna 'zona' en lugar de nombre LIKE 'A%'.
+-- Comprobar los planes con: flask --app app verificar-indices
+
+-- Nombres de cubículo repetidos harían fallar el UNIQUE a mitad de la migración: el migrador los
+-- lista y no aplica nada hasta que se renombren o eliminen.
+-- requisito: SELECT nombre, COUNT(*) AS repeticiones FROM cubiculos GROUP BY nombre HAVING COUNT(*) > 1
+
+-- Zona derivada del nombre (A = carros, B = motos); la mantiene MySQL/MariaDB
+ALTER TABLE cubiculos
+    ADD COLUMN zona CHAR(1) GENERATED ALWAYS AS (UPPER(LEFT(nombre, 1))) STORED AFTER nombre;
+
+-- Búsqueda por nombre (reportes de sensores, cancelar reserva, tarifas por cubículo)
+ALTER TABLE cubiculos ADD UNIQUE KEY uk_cubiculos_nombre (nombre);
+
+-- Display y conteo de libres por zona; cubre (zona, estado, nombre) sin leer la fila
+ALTER TABLE cubiculos ADD KEY ix_cubiculos_zona_estado_nombre (zona, estado, nombre);
+
+-- Limpieza de pendientes: estado = 'Pendiente' y unión con registro_cobro por registro_cobro_id
+ALTER TABLE cubiculos ADD KEY ix_cubiculos_estado_registro (estado, registro_cobro_id);
+
+-- Editar placa: cubículo por registro_cobro_id
+ALTER TABLE cubiculos ADD KEY ix_cubiculos_registro (registro_cobro_id);
+
+-- Activos (hora_salida IS NULL), rango de fechas del reporte y paginación por (hora_salida, id)
+ALTER TABLE registro_cobro ADD KEY ix_registro_salida_id (hora_salida, id);
+
+-- Respaldo de calcular_cobro_activo sin cubículo: hora_ingreso = ? AND hora_salida IS NULL
+ALTER TABLE registro_cobro ADD KEY ix_registro_ingreso_salida (hora_ingreso, hora_salida);
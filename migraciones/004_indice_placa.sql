@@ -0,0 +1,6 @@
+-- 004_indice_placa.sql
+-- Búsqueda por placa/código en el historial: el índice en memoria (indice_busqueda.py) resuelve
+-- el término a placas exactas y MySQL las busca con r.placa IN (...).
+-- Comprobar el plan con: flask --app app verificar-indices
+
+ALTER TABLE registro_cobro ADD KEY ix_registro_placa (placa);
@@ -0,0 +1,21 @@
+-- 005_archivo_registro_cobro.sql
+-- Archivo de cobros cerrados antiguos, particionado por mes de hora_salida. La tarea
+-- 'archivar_cobros' de app.py mueve aquí, por lotes, los tickets cerrados hace más de
+-- ARCHIVO_ANTIGUEDAD_DIAS y agrega las particiones mensuales partiendo p_max (archivo_cobros.py).
+-- /api/reporte, la exportación y las tareas del historial leen ambas tablas con UNION ALL.
+
+-- La clave primaria incluye hora_salida (requisito del particionado); sin claves foráneas
+CREATE TABLE IF NOT EXISTS registro_cobro_archivo (
+    id INT UNSIGNED NOT NULL,
+    hora_ingreso DATETIME NOT NULL,
+    hora_salida DATETIME NOT NULL,
+    cubiculo_id INT UNSIGNED NULL,
+    placa VARCHAR(20) NULL,
+    tiempo_total_minutos INT UNSIGNED NULL,
+    monto_cobrado DECIMAL(10, 2) NULL,
+    PRIMARY KEY (hora_salida, id),
+    KEY ix_archivo_placa (placa)
+) ENGINE=InnoDB
+PARTITION BY RANGE COLUMNS (hora_salida) (
+    PARTITION p_max VALUES LESS THAN (MAXVALUE)
+);
@@ -0,0 +1,92 @@
+# migrador.py
+# ===========================================
+# MIGRACIONES VERSIONADAS DEL ESQUEMA (migraciones/*.sql)
+# ===========================================
+import logging
+import os
+from datetime import datetime
+
+logger = logging.getLogger('FlaskApp')
+
+DIRECTORIO_MIGRACIONES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migraciones')
+# Línea '-- requisito: SELECT ...' de un .sql: consulta que debe devolver cero filas antes de aplicarlo
+PREFIJO_REQUISITO = '-- requisito:'
+# Filas de un requisito incumplido que se muestran en el error
+MAXIMO_FILAS_REPORTADAS = 20
+
+
+class RequisitoMigracion(Exception):
+    """Un requisito de la migración devolvió filas: hay datos que corregir antes de aplicarla."""
+
+
+def listar_migraciones(directorio=DIRECTORIO_MIGRACIONES):
+    """Archivos NNN_descripcion.sql ordenados por versión: [(version, ruta), ...]."""
+    migraciones = []
+    for archivo in sorted(os.listdir(directorio)):
+        if archivo.endswith('.sql') and archivo[:3].isdigit():
+            migraciones.append((archivo[:-4], os.path.join(directorio, archivo)))
+    return migraciones
+
+
+def leer_sentencias(texto):
+    """Separa un archivo .sql en sentencias (';' al final de línea), descartando comentarios '--'."""
+    lineas = [l for l in texto.splitlines() if not l.strip().startswith('--')]
+    return [s.strip() for s in '\n'.join(lineas).split(';') if s.strip()]
+
+
+def leer_requisitos(texto):
+    """Consultas '-- requisito: SELECT ...' de un archivo .sql (una por línea)."""
+    return [l.strip()[len(PREFIJO_REQUISITO):].strip() for l in texto.splitlines()
+            if l.strip().startswith(PREFIJO_REQUISITO)]
+
+
+def verificar_requisitos(cur, version, requisitos):
+    """Ejecuta los requisitos antes de cualquier sentencia; si alguno devuelve filas, las lista y no aplica nada."""
+    for requisito in requisitos:
+        cur.execute(requisito)
+        filas = cur.fetchall()
+        if filas:
+            muestra = ', '.join(str(tuple(fila)) for fila in filas[:MAXIMO_FILAS_REPORTADAS])
+            if len(filas) > MAXIMO_FILAS_REPORTADAS:
+                muestra += f", ... ({len(filas)} en total)"
+            raise RequisitoMigracion(f"{version}: corregir antes de migrar; '{requisito}' devolvió: {muestra}")
+
+
+def aplicar_migraciones(conexion, directorio=DIRECTORIO_MIGRACIONES):
+    """
+    Aplica, en orden, las migraciones que aún no figuran en 'schema_migraciones'.
+    MySQL confirma implícitamente cada DDL, así que una migración que falla a medias no se
+    registra y debe corregirse a mano antes de reintentar; por eso los datos que harían fallar una
+    sentencia se comprueban antes con sus '-- requisito:'. Devuelve las versiones aplicadas.
+    """
+    cur = conexion.cursor()
+    try:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migraciones (
+                version VARCHAR(100) NOT NULL PRIMARY KEY,
+                aplicada_en DATETIME NOT NULL
+            ) ENGINE=InnoDB
+        """)
+        cur.execute("SELECT version FROM schema_migraciones")
+        aplicadas = {fila[0] for fila in cur.fetchall()}
+
+        nuevas = []
+        for version, ruta in listar_migraciones(directorio):
+            if version in aplicadas:
+                continue
+            with open(ruta, encoding='utf-8') as f:
+                texto = f.read()
+            sentencias = leer_sentencias(texto)
+            verificar_requisitos(cur, version, leer_requisitos(texto))
+            logger.info(f"Migraciones: aplicando {version} ({len(sentencias)} sentencias)...")
+            for sentencia in sentencias:
+                cur.execute(sentencia)
+            cur.execute("INSERT INTO schema_migraciones (version, aplicada_en) VALUES (%s, %s)", (version, datetime.now()))
+            conexion.commit()
+            nuevas.append(version)
+        return nuevas
+    except Exception:
+        conexion.rollback()
+        raise
+    finally:
+        cur.close()
@@ -0,0 +1,288 @@
+# pool_db.py
+# ===========================================
+# POOL DE CONEXIONES MYSQL (FLASK, MQTT Y SCHEDULER)
+# ===========================================
+import logging
+import re
+import threading
+import time
+
+import MySQLdb
+from flask import g
+
+from metricas import MuestrasLatencia
+
+logger = logging.getLogger('FlaskApp')
+
+
+class PoolAgotado(Exception):
+    """No se liberó ninguna conexión dentro del tiempo de espera."""
+
+
+class _ConexionPool:
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.creada = time.monotonic()
+        self.ultimo_uso = self.creada
+
+
+class PoolConexiones:
+    """
+    Pool acotado y seguro entre hilos de conexiones MySQLdb.
+
+    - Como máximo 'tamano_maximo' conexiones; si todas están en uso, 'obtener' espera hasta
+      'timeout_espera' segundos y luego lanza PoolAgotado.
+    - 'precalentar()' abre 'tamano_minimo' conexiones al iniciar, fuera del camino de entrada.
+    - Una conexión inactiva más de 'ping_inactiva' segundos se valida con ping antes de
+      entregarla; una con más de 'vida_maxima' segundos se cierra y se reemplaza.
+    - Al devolverla se hace rollback: ninguna transacción ni snapshot queda abierto en el pool.
+    """
+
+    def __init__(self, parametros, tamano_minimo, tamano_maximo, vida_maxima, timeout_espera, ping_inactiva):
+        self._parametros = parametros
+        self._minimo = tamano_minimo
+        self._maximo = tamano_maximo
+        self._vida_maxima = vida_maxima
+        self._timeout = timeout_espera
+        self._ping_inactiva = ping_inactiva
+        self._condicion = threading.Condition()
+        self._libres = []
+        self._en_uso = {}
+        self._creando = 0
+        self.tiempos_espera = MuestrasLatencia()
+        self.creadas = 0
+        self.recicladas = 0
+        self.fallos_ping = 0
+        self.agotamientos = 0
+        self.entregas = 0
+
+    def _total(self):
+        return len(self._libres) + len(self._en_uso) + self._creando
+
+    def _crear(self):
+        conexion = MySQLdb.connect(**self._parametros)
+        self.creadas += 1
+        return _ConexionPool(conexion)
+
+    @staticmethod
+    def _cerrar(envoltura):
+        try:
+            envoltura.conexion.close()
+        except Exception:
+            pass
+
+    def precalentar(self):
+        """Abre las conexiones mínimas por adelantado."""
+        nuevas = []
+        with self._condicion:
+            faltan = max(0, self._minimo - self._total())
+            self._creando += faltan
+        try:
+            for _ in range(faltan):
+                nuevas.append(self._crear())
+        finally:
+            with self._condicion:
+                self._creando -= faltan
+                self._libres.extend(nuevas)
+                self._condicion.notify_all()
+        logger.info(f"Pool DB: {len(nuevas)} conexiones precalentadas (máximo {self._maximo}).")
+
+    def _validar(self, envoltura):
+        """Devuelve la conexión lista para usar, o None si hubo que descartarla."""
+        ahora = time.monotonic()
+        if ahora - envoltura.creada > self._vida_maxima:
+            self._cerrar(envoltura)
+            self.recicladas += 1
+            return None
+        if ahora - envoltura.ultimo_uso > self._ping_inactiva:
+            try:
+                envoltura.conexion.ping()
+            except Exception:
+                self._cerrar(envoltura)
+                self.fallos_ping += 1
+                return None
+        return envoltura
+
+    def obtener(self):
+        inicio = time.monotonic()
+        limite = inicio + self._timeout
+        while True:
+            with self._condicion:
+                while not self._libres and self._total() >= self._maximo:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self.agotamientos += 1
+                        raise PoolAgotado(f"Sin conexiones libres tras {self._timeout} s (máximo {self._maximo}).")
+                    self._condicion.wait(restante)
+
+                if self._libres:
+                    envoltura = self._libres.pop()
+                    crear = False
+                else:
+                    envoltura = None
+                    crear = True
+                self._creando += 1
+
+            try:
+                if crear:
+                    envoltura = self._crear()
+                else:
+                    envoltura = self._validar(envoltura)
+            except Exception:
+                with self._condicion:
+                    self._creando -= 1
+                    self._condicion.notify()
+                raise
+
+            with self._condicion:
+                self._creando -= 1
+                if envoltura is None:
+                    # Descartada por vida máxima o ping fallido: se intenta de nuevo
+                    self._condicion.notify()
+                    continue
+                envoltura.ultimo_uso = time.monotonic()
+                self._en_uso[id(envoltura.conexion)] = envoltura
+                self.entregas += 1
+
+            self.tiempos_espera.registrar((time.monotonic() - inicio) * 1000.0)
+            return envoltura.conexion
+
+    def devolver(self, conexion):
+        with self._condicion:
+            envoltura = self._en_uso.pop(id(conexion), None)
+        if envoltura is None:
+            return
+
+        try:
+            conexion.rollback()
+            sana = True
+        except Exception:
+            sana = False
+
+        with self._condicion:
+            if sana:
+                envoltura.ultimo_uso = time.monotonic()
+                self._libres.append(envoltura)
+            else:
+                self._cerrar(envoltura)
+            self._condicion.notify()
+
+    def cerrar_todo(self):
+        with self._condicion:
+            libres, self._libres = self._libres, []
+        for envoltura in libres:
+            self._cerrar(envoltura)
+
+    def estadisticas(self):
+        with self._condicion:
+            en_uso = len(self._en_uso)
+            return {
+                'maximo': self._maximo,
+                'abiertas': len(self._libres) + en_uso,
+                'en_uso': en_uso,
+                'libres': len(self._libres),
+                'utilizacion': round(en_uso / float(self._maximo), 3),
+                'entregas': self.entregas,
+                'creadas': self.creadas,
+                'recicladas_por_vida': self.recicladas,
+                'fallos_ping': self.fallos_ping,
+                'agotamientos': self.agotamientos,
+                'espera': self.tiempos_espera.resumen(),
+            }
+
+
+# Primer verbo SQL y primera tabla nombrada: etiquetas de cardinalidad acotada para las métricas
+_PATRON_TABLA = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN|TABLE)\s+`?(\w+)', re.IGNORECASE)
+_VERBOS_SQL = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'EXPLAIN', 'CREATE', 'ALTER'}
+
+
+def clasificar_consulta(sql):
+    """('SELECT', 'cubiculos') para etiquetar el tiempo de una consulta sin usar el SQL completo."""
+    partes = sql.lstrip().split(None, 1)
+    verbo = partes[0].upper() if partes else ''
+    coincidencia = _PATRON_TABLA.search(sql)
+    return (verbo if verbo in _VERBOS_SQL else 'OTRO'), (coincidencia.group(1).lower() if coincidencia else '')
+
+
+class _CursorMedido:
+    """Cursor que informa la duración de cada execute a 'observar(segundos, verbo, tabla)'."""
+
+    def __init__(self, cursor, observar):
+        self._cursor = cursor
+        self._observar = observar
+
+    def execute(self, sql, args=None):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, args)
+        finally:
+            self._observar(time.perf_counter() - inicio, *clasificar_consulta(sql))
+
+    def executemany(self, sql, args):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, args)
+        finally:
+            self._observar(time.perf_counter() - inicio, *clasificar_consulta(sql))
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self._cursor.close()
+
+    def __getattr__(self, atributo):
+        return getattr(self._cursor, atributo)
+
+
+class _ConexionMedida:
+    """Envoltura liviana de una conexión del pool: mide execute y commit sin cambiar la API."""
+
+    def __init__(self, conexion, observar):
+        self._conexion = conexion
+        self._observar = observar
+
+    def cursor(self, *args, **kwargs):
+        return _CursorMedido(self._conexion.cursor(*args, **kwargs), self._observar)
+
+    def commit(self):
+        inicio = time.perf_counter()
+        try:
+            return self._conexion.commit()
+        finally:
+            self._observar(time.perf_counter() - inicio, 'COMMIT', '')
+
+    def __getattr__(self, atributo):
+        return getattr(self._conexion, atributo)
+
+
+class MySQLPool:
+    """
+    Reemplazo de flask_mysqldb.MySQL sobre PoolConexiones: 'mysql.connection' entrega una
+    conexión del pool ligada al contexto de aplicación actual (request, mensaje MQTT o tarea
+    del scheduler) y la devuelve al pool al cerrarse ese contexto, en lugar de cerrarla.
+    Con 'observar_consulta(segundos, verbo, tabla)' se mide cada consulta y cada commit.
+    """
+
+    def __init__(self, app, pool, observar_consulta=None):
+        self.pool = pool
+        self._observar = observar_consulta
+        app.teardown_appcontext(self._devolver)
+
+    @property
+    def connection(self):
+        conexion = g.get('_conexion_mysql')
+        if conexion is None:
+            conexion = self.pool.obtener()
+            g._conexion_mysql = conexion
+        if self._observar is not None:
+            return _ConexionMedida(conexion, self._observar)
+        return conexion
+
+    def _devolver(self, excepcion):
+        conexion = g.pop('_conexion_mysql', None)
+        if conexion is not None:
+            self.pool.devolver(conexion)
@@ -0,0 +1,44 @@
+# secuencia_tickets.py
+# ===========================================
+# IDs DE TICKET PRE-RESERVADOS POR BLOQUES
+# ===========================================
+import threading
+
+
+class SecuenciaTickets:
+    """
+    Entrega IDs de registro_cobro reservados por bloques en la tabla 'secuencias'.
+
+    'reservar_bloque(tamano)' debe incrementar la secuencia en la DB (en su propia transacción)
+    y devolver el primer ID del bloque. Solo se llama una vez cada 'tamano_bloque' tickets, así
+    el camino de entrada conoce el código del ticket sin esperar al AUTO_INCREMENT.
+    Los IDs de un bloque no usado (reinicio del proceso) se pierden: el código queda con huecos,
+    igual que ya ocurría al cancelar reservas.
+    """
+
+    def __init__(self, reservar_bloque, tamano_bloque):
+        self._reservar_bloque = reservar_bloque
+        self._tamano = tamano_bloque
+        self._lock = threading.Lock()
+        self._siguiente = 0
+        self._limite = 0
+        self.bloques_reservados = 0
+
+    def siguiente(self):
+        with self._lock:
+            if self._siguiente >= self._limite:
+                inicio = self._reservar_bloque(self._tamano)
+                self._siguiente = inicio
+                self._limite = inicio + self._tamano
+                self.bloques_reservados += 1
+            valor = self._siguiente
+            self._siguiente += 1
+            return valor
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'tamano_bloque': self._tamano,
+                'bloques_reservados': self.bloques_reservados,
+                'disponibles_en_bloque': self._limite - self._siguiente,
+            }
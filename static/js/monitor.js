@@ -12,7 +12,7 @@ function handleSearchInput(event) {
 
 function searchCubicles() {
     const searchTerm = document.getElementById('search-input').value.trim();
-    // Llama a la función principal con el término de búsqueda
+    // Llama a la función principal con el término de búsqueda (con el stream activo filtra en el navegador)
     fetchEstadoParqueadero(searchTerm); 
 }
 
@@ -25,10 +25,18 @@ function clearSearch() {
 
 
 document.addEventListener('DOMContentLoaded', () => {
-    fetchEstadoParqueadero();
+    // Monitor en vivo por SSE; si el navegador no lo soporta se usa el sondeo clásico
+    if (!iniciarStreamEstado()) {
+        fetchEstadoParqueadero();
+    }
     
-    // Actualiza el estado cada 5 segundos
+    // Cada 5 segundos: con el stream activo solo se recalculan los cobros en el navegador,
+    // sin él (no soportado o reconectando) se consulta al servidor como antes
     setInterval(() => {
+        if (streamActivo) {
+            renderEstadoLocal();
+            return;
+        }
         // 🆕 Mantener el filtro de búsqueda activo en las actualizaciones automáticas
         const searchTerm = document.getElementById('search-input').value.trim();
         fetchEstadoParqueadero(searchTerm); 
@@ -80,13 +88,43 @@ function formatCurrency(amount) {
     }).format(numericAmount);
 }
 
+// ------------------------- GET CONDICIONAL (ETag) -------------------------
+
+// url -> { etag, datos }: última respuesta de cada consulta para reenviar su ETag
+const respuestasValidadas = new Map();
+
+/**
+ * GET con If-None-Match. Devuelve { datos, cambio, cabeceras }: con 304 el servidor no consultó
+ * la DB y se reutilizan los datos anteriores (cambio = false); las cabeceras son las de esta respuesta.
+ */
+function fetchConValidador(url) {
+    const anterior = respuestasValidadas.get(url);
+    const headers = anterior ? { 'If-None-Match': anterior.etag } : {};
+
+    return fetch(url, { headers, cache: 'no-store' }).then(response => {
+        if (response.status === 304 && anterior) {
+            return { datos: anterior.datos, cambio: false, cabeceras: response.headers };
+        }
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        return response.json().then(datos => {
+            const etag = response.headers.get('ETag');
+            if (etag) {
+                respuestasValidadas.set(url, { etag, datos });
+            }
+            return { datos, cambio: true, cabeceras: response.headers };
+        });
+    });
+}
+
 // ------------------------- GESTIÓN DE TARIFAS -------------------------
 
 function fetchTarifas() {
-    fetch('/api/tarifas')
-        .then(response => response.json())
-        .then(data => {
-            updateTarifasDisplay(data);
+    fetchConValidador('/api/tarifas')
+        .then(({ datos }) => {
+            // El modal se vuelve a pintar aunque no haya cambios: descarta ediciones sin guardar
+            updateTarifasDisplay(datos);
         })
         .catch(error => console.error('Error al obtener tarifas:', error));
 }
@@ -139,21 +177,127 @@ function guardarTarifa(tipo) {
 }
 
 
+// ------------------------- MONITOR EN VIVO (SSE) -------------------------
+
+let estadoCubiculos = new Map(); // nombre -> datos del cubículo (mismas claves que /api/estado_parqueadero)
+let tarifasPorTipo = {};          // tipo -> [primera_hora, subsiguiente]
+let tiempoGraciaMinutos = 0;
+let desfaseRelojMs = 0;           // hora del servidor - hora del navegador
+let streamActivo = false;
+const REINTENTO_STREAM_RECHAZADO_MS = 60000; // SSE_REINTENTO_TOPE_MS en config.py
+
+// Convierte 'YYYY-MM-DD HH:MM:SS' (hora local del servidor) a milisegundos
+function parseFechaServidor(texto) {
+    const [fecha, hora] = texto.split(' ');
+    const [anio, mes, dia] = fecha.split('-').map(Number);
+    const [hh, mm, ss] = hora.split(':').map(Number);
+    return new Date(anio, mes - 1, dia, hh, mm, ss).getTime();
+}
+
+/**
+ * Misma regla que calcular_cobro_avanzado en app.py: tiempo de gracia,
+ * primera hora y horas subsiguientes (redondeadas hacia arriba).
+ */
+function calcularCobroLocal(minutos, tipo) {
+    const [primeraHora, subsiguiente] = tarifasPorTipo[tipo || 'CARRO'] || [0, 0];
+    if (minutos <= tiempoGraciaMinutos) return 0;
+    if (minutos <= 60) return primeraHora;
+    return primeraHora + Math.ceil((minutos - 60) / 60) * subsiguiente;
+}
+
+function recalcularCobroActivo(cubiculo, ahoraServidor) {
+    const activo = cubiculo.registro_id && cubiculo.hora_ingreso &&
+        (cubiculo.estado === 'Ocupado' || cubiculo.estado === 'Pendiente');
+    if (!activo) return;
+    const minutos = Math.floor((ahoraServidor - parseFechaServidor(cubiculo.hora_ingreso)) / 60000);
+    cubiculo.tiempo_minutos = minutos;
+    cubiculo.cobro_actual = calcularCobroLocal(minutos, cubiculo.tipo_vehiculo);
+}
+
+function iniciarStreamEstado() {
+    if (!window.EventSource) return false;
+
+    const fuente = new EventSource('/api/estado_parqueadero/stream');
+
+    fuente.addEventListener('snapshot', (event) => {
+        const snapshot = JSON.parse(event.data);
+        estadoCubiculos = new Map(snapshot.cubiculos.map(c => [c.nombre, c]));
+        tarifasPorTipo = snapshot.tarifas;
+        tiempoGraciaMinutos = snapshot.tiempo_gracia_minutos;
+        desfaseRelojMs = parseFechaServidor(snapshot.servidor_ahora) - Date.now();
+        streamActivo = true;
+        renderEstadoLocal();
+    });
+
+    fuente.addEventListener('cubiculo', (event) => {
+        const cambio = JSON.parse(event.data);
+        const actual = estadoCubiculos.get(cambio.nombre) || {};
+        estadoCubiculos.set(cambio.nombre, { ...actual, ...cambio });
+        renderEstadoLocal();
+    });
+
+    fuente.addEventListener('tarifas', (event) => {
+        Object.assign(tarifasPorTipo, JSON.parse(event.data));
+        renderEstadoLocal();
+    });
+
+    // EventSource se reconecta solo; mientras tanto vuelve el sondeo. Si el servidor lo rechaza
+    // (503: tope de streams) el EventSource queda cerrado y se reintenta más tarde.
+    fuente.onerror = () => {
+        streamActivo = false;
+        if (fuente.readyState === EventSource.CLOSED) {
+            setTimeout(iniciarStreamEstado, REINTENTO_STREAM_RECHAZADO_MS);
+        }
+    };
+    return true;
+}
+
+function renderEstadoLocal() {
+    const searchTerm = document.getElementById('search-input').value.trim().toUpperCase();
+    const ahoraServidor = Date.now() + desfaseRelojMs;
+
+    let cubiculos = [...estadoCubiculos.values()].sort((a, b) => a.nombre.localeCompare(b.nombre));
+    cubiculos.forEach(c => recalcularCobroActivo(c, ahoraServidor));
+
+    if (searchTerm) {
+        cubiculos = cubiculos.filter(c =>
+            c.nombre.toUpperCase().includes(searchTerm) || (c.placa || '').toUpperCase().includes(searchTerm));
+    }
+
+    updateGrid(cubiculos);
+    updateCobroDetalle(cubiculos);
+}
+
 // ------------------------- MONITOREO DE CUBÍCULOS -------------------------
 
 // MODIFICACIÓN: ACEPTAR PARÁMETRO DE BÚSQUEDA
 function fetchEstadoParqueadero(searchTerm = '') { 
+    // Con el stream activo el estado ya está en memoria: solo se vuelve a pintar
+    if (streamActivo) {
+        renderEstadoLocal();
+        return;
+    }
+
     // 1. Construir la URL con el parámetro de búsqueda si existe
     let url = '/api/estado_parqueadero';
     if (searchTerm) {
         url += `?search=${encodeURIComponent(searchTerm)}`;
     }
 
-    fetch(url)
-        .then(response => response.json())
-        .then(data => {
-            updateGrid(data);
-            updateCobroDetalle(data); 
+    // El ETag del estado no depende del reloj: con 304 el cuerpo guardado sigue válido, pero
+    // tiempo y cobro en curso se recalculan aquí (misma regla que con el stream SSE)
+    Promise.all([fetchConValidador(url), fetchConValidador('/api/tarifas')])
+        .then(([{ datos, cabeceras }, { datos: tarifas }]) => {
+            tarifasPorTipo = Object.fromEntries(tarifas.map(t =>
+                [t.tipo, [Number(t.tarifa_primera_hora), Number(t.tarifa_hora_subsiguiente)]]));
+            tiempoGraciaMinutos = Number(cabeceras.get('X-Tiempo-Gracia-Minutos')) || 0;
+            const servidorAhora = cabeceras.get('X-Servidor-Ahora');
+            if (servidorAhora) desfaseRelojMs = parseFechaServidor(servidorAhora) - Date.now();
+
+            const ahoraServidor = Date.now() + desfaseRelojMs;
+            datos.forEach(c => recalcularCobroActivo(c, ahoraServidor));
+            updateGrid(datos);
+            updateCobroDetalle(datos); 
         })
         .catch(error => console.error('Error al obtener estado del parqueadero:', error));
 }
@@ -503,10 +647,7 @@ async function imprimirVoucher() {
     // Obtener las tarifas para incluirlas en el voucher
     let tarifas = { primera_hora: 'N/A', subsiguiente: 'N/A' };
     try {
-        const response = await fetch(`/api/tarifas_por_cubiculo/${selectedCubiculo.nombre}`);
-        if (response.ok) {
-            tarifas = await response.json();
-        }
+        tarifas = (await fetchConValidador(`/api/tarifas_por_cubiculo/${selectedCubiculo.nombre}`)).datos;
     } catch (e) {
         console.error("Error al obtener tarifas para el voucher:", e);
     }
@@ -0,0 +1,54 @@
+# tarifas_lote.py
+# ===========================================
+# CÁLCULO VECTORIZADO DE COBROS (SIMULACIONES Y AUDITORÍAS SOBRE EL HISTORIAL)
+# ===========================================
+from decimal import Decimal
+
+import numpy as np
+
+from config import TIEMPO_GRACIA_MINUTOS, TIPO_CARRO
+
+
+def _a_centavos(valor):
+    """Tarifa (Decimal, float o int) a centavos enteros, para no arrastrar errores de coma flotante."""
+    return int((Decimal(str(valor)) * 100).to_integral_value())
+
+
+def calcular_cobros_vectorizado(minutos, tipos, tarifas_por_tipo, tiempo_gracia=TIEMPO_GRACIA_MINUTOS):
+    """
+    Misma regla que calcular_cobro_avanzado, aplicada a arreglos completos:
+      - minutos <= tiempo_gracia                      -> 0
+      - minutos <= 60                                 -> tarifa primera hora
+      - en otro caso: primera hora + ceil((minutos - 60) / 60) * tarifa hora subsiguiente
+    'tipos' None se cobra como TIPO_CARRO y un tipo sin tarifa como (0, 0), igual que en
+    calcular_cobro_en_lote. El resultado se trunca a entero como 'int(monto_total)'.
+    Devuelve un np.ndarray int64 del mismo largo que 'minutos'.
+    """
+    minutos = np.asarray(minutos, dtype=np.int64)
+    tipos = [tipo or TIPO_CARRO for tipo in tipos]
+
+    # Tarifas en centavos, indexadas por la posición de cada tipo en 'catalogo'
+    catalogo = sorted(set(tipos))
+    indices = {tipo: i for i, tipo in enumerate(catalogo)}
+    primera = np.array([_a_centavos(tarifas_por_tipo.get(t, (0, 0))[0]) for t in catalogo] or [0], dtype=np.int64)
+    subsiguiente = np.array([_a_centavos(tarifas_por_tipo.get(t, (0, 0))[1]) for t in catalogo] or [0], dtype=np.int64)
+    posicion = np.fromiter((indices[t] for t in tipos), dtype=np.int64, count=len(tipos))
+
+    horas_subsiguientes = np.where(minutos > 60, (minutos - 60 + 59) // 60, 0)
+    centavos = primera[posicion] + horas_subsiguientes * subsiguiente[posicion]
+    centavos = np.where(minutos <= tiempo_gracia, 0, centavos)
+    return centavos // 100
+
+
+def comparar_con_escalar(funcion_escalar, minutos, tipos, tarifas_por_tipo):
+    """
+    Recalcula cada estadía con 'funcion_escalar(minutos, tarifas)' y la compara con la versión
+    vectorizada. Devuelve la lista de diferencias [(minutos, tipo, escalar, vectorizado)].
+    """
+    vectorizado = calcular_cobros_vectorizado(minutos, tipos, tarifas_por_tipo)
+    diferencias = []
+    for m, tipo, v in zip(minutos, tipos, vectorizado.tolist()):
+        escalar = funcion_escalar(m, tarifas_por_tipo.get(tipo or TIPO_CARRO, (0, 0)))
+        if escalar != v:
+            diferencias.append((int(m), tipo, escalar, v))
+    return diferencias
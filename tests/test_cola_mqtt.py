@@ -0,0 +1,34 @@
+# tests/test_cola_mqtt.py
+# ===========================================
+# DETENER Y REINICIAR EL DESPACHADOR CON UN TRABAJADOR OCUPADO
+# ===========================================
+import threading
+
+from cola_mqtt import DespachadorMQTT
+
+
+def test_reinicio_tras_drenado_vencido_usa_trabajadores_nuevos():
+    liberar = threading.Event()
+    procesadas = []
+
+    def procesar(tarea):
+        if tarea == 'lenta':
+            liberar.wait(5)
+        procesadas.append((tarea, threading.current_thread().name))
+
+    despachador = DespachadorMQTT(procesar, num_trabajadores=1, capacidad=10, timeout_encolado=1)
+    despachador.iniciar()
+    despachador.encolar('A1', 'lenta')
+    despachador.detener(drenar=True, timeout=0.1)
+    assert despachador.estadisticas()['rezagados'] == 1
+
+    # El rezagado sigue con su tarea; los trabajadores nuevos no heredan su _DETENER
+    despachador.iniciar(timeout_rezagados=0)
+    hilo_nuevo = despachador._hilos[0]
+    despachador.encolar('A1', 'nueva')
+    liberar.set()
+    despachador.detener(drenar=True, timeout=5)
+
+    assert not hilo_nuevo.is_alive()
+    assert despachador.estadisticas()['rezagados'] == 0
+    assert sorted(tarea for tarea, _ in procesadas) == ['lenta', 'nueva']
@@ -0,0 +1,69 @@
+# tests/test_formato_binario.py
+# ===========================================
+# VECTORES DE REFERENCIA DEL FORMATO BINARIO (DISPLAY Y TALANQUERAS)
+# ===========================================
+# Cualquier cambio del formato debe actualizar estos vectores junto con el firmware del ESP32.
+import json
+
+import pytest
+
+from formato_binario import codificar_display, decodificar_display, codificar_orden, decodificar_orden, codificar_plano
+
+PLANO_EJEMPLO = ['A1', 'A2', 'A3', 'A4', 'B1']
+
+VECTORES_DISPLAY = [
+    pytest.param(
+        {"tipo": "full", "seq": 1, "libres": 2,
+         "data": [{"cub": "A1", "est": "Libre"}, {"cub": "A2", "est": "Ocupado"}, {"cub": "A3", "est": "Pendiente"},
+                  {"cub": "A4", "est": "Libre"}, {"cub": "B1", "est": "Ocupado"}]},
+        "b00100000002008145c08a05001802", id="keyframe de 5 cubículos"),
+    pytest.param(
+        {"tipo": "delta", "seq": 2, "libres": 1,
+         "cambios": [{"cub": "A4", "est": "Pendiente"}, {"cub": "B1", "est": "Libre"}]},
+        "b10200000001008145c08a020003400400", id="delta con dos cambios"),
+    pytest.param(
+        {"tipo": "delta", "seq": 300, "libres": 0, "cambios": []},
+        "b12c01000000008145c08a0000", id="delta sin cambios de cubículo"),
+]
+
+
+@pytest.mark.parametrize('payload, esperado', VECTORES_DISPLAY)
+def test_vector_display(payload, esperado):
+    datos = codificar_display(payload, PLANO_EJEMPLO)
+    assert datos.hex() == esperado
+    assert decodificar_display(datos, PLANO_EJEMPLO) == payload
+
+
+def test_vector_orden_abrir():
+    datos = codificar_orden("ABRIR", "A12")
+    assert datos.hex() == "b20103413132"
+    assert decodificar_orden(datos) == {"orden": "ABRIR", "cub": "A12"}
+
+
+def test_cabecera_distinta_de_json():
+    datos = codificar_display({"tipo": "delta", "seq": 1, "libres": 0, "cambios": []}, PLANO_EJEMPLO)
+    assert datos[0] != ord('{')
+    assert codificar_orden("ABRIR", "A1")[0] != ord('{')
+
+
+def test_plano_distinto_se_rechaza():
+    datos = codificar_display({"tipo": "delta", "seq": 1, "libres": 0, "cambios": []}, PLANO_EJEMPLO)
+    with pytest.raises(ValueError):
+        decodificar_display(datos, PLANO_EJEMPLO[:-1])
+
+
+def test_keyframe_grande_mas_compacto_que_json():
+    plano = [f"A{i}" for i in range(1, 201)]
+    keyframe = {"tipo": "full", "seq": 1, "libres": 200, "data": [{"cub": n, "est": "Libre"} for n in plano]}
+    datos = codificar_display(keyframe, plano)
+    assert len(datos) == 11 + 2 + 50
+    assert len(datos) < len(json.dumps(keyframe)) // 100
+    assert decodificar_display(datos, plano) == keyframe
+
+
+def test_plano_basta_para_decodificar():
+    # El display solo conoce el plano retenido: con él debe traducir índices y validar la huella
+    plano = json.loads(codificar_plano(PLANO_EJEMPLO))
+    assert plano == {"huella": 0x8AC04581, "cubiculos": PLANO_EJEMPLO}
+    payload = VECTORES_DISPLAY[0].values[0]
+    assert decodificar_display(codificar_display(payload, PLANO_EJEMPLO), plano['cubiculos']) == payload
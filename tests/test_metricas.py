@@ -0,0 +1,32 @@
+# tests/test_metricas.py
+# ===========================================
+# EXPOSICIÓN COMBINADA DE LOS WORKERS WEB (/metrics DEL PUERTO WEB)
+# ===========================================
+from metricas import Histograma, Medidor, RegistroMetricas, combinar_exposiciones
+
+
+def _registro(latencia_ms, libres):
+    registro = RegistroMetricas()
+    histograma = registro.registrar(Histograma('http_ms', 'Latencia HTTP.', ('endpoint',), (10, 100)))
+    histograma.observar(latencia_ms, '/api/estado')
+    registro.registrar(Medidor('libres', 'Cubículos libres.', lambda: libres))
+    return registro
+
+
+def test_combina_familias_con_etiqueta_worker():
+    texto = combinar_exposiciones({'0': _registro(5, 3).exponer(), '1': _registro(50, 3).exponer()})
+    lineas = texto.splitlines()
+
+    assert lineas.count('# TYPE http_ms histogram') == 1
+    assert lineas.count('# TYPE libres gauge') == 1
+    assert 'http_ms_bucket{worker="0",endpoint="/api/estado",le="10"} 1' in lineas
+    assert 'http_ms_bucket{worker="1",endpoint="/api/estado",le="10"} 0' in lineas
+    assert 'libres{worker="0"} 3' in lineas and 'libres{worker="1"} 3' in lineas
+    # Las muestras de cada familia quedan juntas, después de su HELP/TYPE
+    assert lineas.index('libres{worker="0"} 3') > lineas.index('http_ms_count{worker="1",endpoint="/api/estado"} 1')
+
+
+def test_worker_sin_respuesta_queda_como_comentario():
+    texto = combinar_exposiciones({'0': _registro(5, 3).exponer(), '1': None})
+    assert '# ERROR worker 1: sin respuesta' in texto.splitlines()
+    assert 'worker="1"' not in texto
@@ -0,0 +1,46 @@
+# tests/test_migrador.py
+# ===========================================
+# REQUISITOS DE LAS MIGRACIONES (DATOS QUE DEBEN CORREGIRSE ANTES DEL DDL)
+# ===========================================
+import pytest
+
+from migrador import DIRECTORIO_MIGRACIONES, RequisitoMigracion, leer_requisitos, leer_sentencias, verificar_requisitos
+
+
+class CursorFijo:
+    """Cursor que devuelve siempre las mismas filas y guarda lo ejecutado."""
+
+    def __init__(self, filas):
+        self.filas = filas
+        self.ejecutadas = []
+
+    def execute(self, consulta, params=None):
+        self.ejecutadas.append(consulta)
+
+    def fetchall(self):
+        return self.filas
+
+
+def _leer(archivo):
+    with open(f"{DIRECTORIO_MIGRACIONES}/{archivo}", encoding='utf-8') as f:
+        return f.read()
+
+
+def test_unique_de_nombre_tiene_requisito_de_duplicados():
+    texto = _leer('003_indices_y_zona.sql')
+    requisitos = leer_requisitos(texto)
+    assert requisitos == ["SELECT nombre, COUNT(*) AS repeticiones FROM cubiculos GROUP BY nombre HAVING COUNT(*) > 1"]
+    # El requisito es un comentario: no se ejecuta como sentencia de la migración
+    assert not any('HAVING' in sentencia for sentencia in leer_sentencias(texto))
+
+
+def test_requisito_con_filas_las_reporta():
+    cur = CursorFijo([('A1', 2), ('B3', 3)])
+    with pytest.raises(RequisitoMigracion, match=r"\('A1', 2\), \('B3', 3\)"):
+        verificar_requisitos(cur, '003_indices_y_zona', ['SELECT 1'])
+
+
+def test_requisito_sin_filas_no_bloquea():
+    cur = CursorFijo([])
+    verificar_requisitos(cur, '003_indices_y_zona', ['SELECT 1'])
+    assert cur.ejecutadas == ['SELECT 1']
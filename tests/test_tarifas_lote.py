@@ -0,0 +1,51 @@
+# tests/test_tarifas_lote.py
+# ===========================================
+# EL COBRO VECTORIZADO COINCIDE CON calcular_cobro_avanzado
+# ===========================================
+from decimal import Decimal
+
+import pytest
+
+from calculo_cobros import calcular_cobro_avanzado
+from config import TIPO_CARRO, TIPO_MOTO
+from tarifas_lote import calcular_cobros_vectorizado
+
+TARIFAS = {
+    TIPO_CARRO: (Decimal('3000.00'), Decimal('2500.50')),
+    TIPO_MOTO: (Decimal('1500.75'), Decimal('999.99')),
+}
+
+
+def minutos_de_prueba(tiempo_gracia):
+    """Bordes de la gracia, de la primera hora (60/61) y de cada hora completa hasta 2 días."""
+    minutos = set(range(0, 130))
+    for borde in [tiempo_gracia] + [60 * h for h in range(1, 49)]:
+        minutos.update(m for m in (borde - 1, borde, borde + 1) if m >= 0)
+    return sorted(minutos)
+
+
+@pytest.mark.parametrize('tiempo_gracia', [0, 15, 60])
+@pytest.mark.parametrize('tipo', [TIPO_CARRO, TIPO_MOTO, None, 'BICICLETA'])
+def test_vectorizado_igual_a_escalar(tiempo_gracia, tipo):
+    minutos = minutos_de_prueba(tiempo_gracia)
+    vectorizado = calcular_cobros_vectorizado(minutos, [tipo] * len(minutos), TARIFAS, tiempo_gracia)
+    tarifas = TARIFAS.get(tipo or TIPO_CARRO, (0, 0))
+
+    assert len(vectorizado) == len(minutos)
+    for m, v in zip(minutos, vectorizado.tolist()):
+        assert v == calcular_cobro_avanzado(m, tarifas, tiempo_gracia), f"{m} minutos, tipo {tipo}"
+
+
+def test_tipos_mezclados_en_un_lote():
+    minutos = minutos_de_prueba(15)
+    tipos = [(TIPO_CARRO, TIPO_MOTO, None)[i % 3] for i in range(len(minutos))]
+    vectorizado = calcular_cobros_vectorizado(minutos, tipos, TARIFAS, 15)
+
+    esperado = [calcular_cobro_avanzado(m, TARIFAS[t or TIPO_CARRO], 15) for m, t in zip(minutos, tipos)]
+    assert vectorizado.tolist() == esperado
+
+
+def test_bordes_de_hora():
+    tarifas = {TIPO_CARRO: (Decimal('3000'), Decimal('2000'))}
+    cobros = calcular_cobros_vectorizado([15, 16, 60, 61, 120, 121], [TIPO_CARRO] * 6, tarifas, 15)
+    assert cobros.tolist() == [0, 3000, 3000, 5000, 5000, 7000]
@@ -0,0 +1,85 @@
+# verificacion_indices.py
+# ===========================================
+# VERIFICACIÓN CON EXPLAIN DE LAS CONSULTAS FRECUENTES DE app.py
+# ===========================================
+from datetime import datetime, timedelta
+
+from config import ZONA_CARROS, ZONA_MOTOS
+
+_AHORA = datetime.now()
+
+# (descripción, consulta, parámetros de ejemplo, tablas que deben poder usar un índice)
+# Mantener alineado con las consultas de app.py cuando se cambien. Las del historial (tabla caliente +
+# archivo) no se copian aquí: app.py las arma con sus propios constructores (consultas_historial_verificacion).
+CONSULTAS_CRITICAS = [
+    ("display: cubículos por zona",
+     "SELECT nombre, estado FROM cubiculos WHERE zona IN (%s, %s) ORDER BY nombre ASC",
+     (ZONA_CARROS, ZONA_MOTOS), ['cubiculos']),
+    ("sensores: cubículos por nombre",
+     "SELECT id, nombre, estado FROM cubiculos WHERE nombre IN (%s, %s)",
+     ('A1', 'A2'), ['cubiculos']),
+    ("cancelar reserva: cubículo activo por nombre",
+     "SELECT id, registro_cobro_id, placa FROM cubiculos WHERE nombre = %s AND estado IN ('Pendiente', 'Ocupado')",
+     ('A1',), ['cubiculos']),
+    ("editar placa: cubículo por registro",
+     "SELECT nombre FROM cubiculos WHERE registro_cobro_id = %s",
+     (1,), ['cubiculos']),
+    ("limpieza: pendientes caducados",
+     """SELECT c.id, c.nombre, c.registro_cobro_id, rc.hora_ingreso
+        FROM cubiculos c JOIN registro_cobro rc ON c.registro_cobro_id = rc.id
+        WHERE c.estado = 'Pendiente' AND rc.hora_ingreso < %s""",
+     (_AHORA,), ['cubiculos', 'rc']),
+    ("finalizar cobro: registro activo",
+     """SELECT rc.hora_ingreso, rc.cubiculo_id, rc.placa, c.nombre, c.tipo_vehiculo
+        FROM registro_cobro rc LEFT JOIN cubiculos c ON c.id = rc.cubiculo_id
+        WHERE rc.id = %s AND rc.hora_salida IS NULL""",
+     (1,), ['rc', 'c']),
+    ("cobro activo: respaldo por hora de ingreso",
+     """SELECT c.tipo_vehiculo FROM cubiculos c
+        JOIN registro_cobro rc ON c.registro_cobro_id = rc.id
+        WHERE rc.hora_ingreso = %s AND rc.hora_salida IS NULL""",
+     (_AHORA,), ['rc', 'c']),
+    ("archivo: lote de cobros cerrados antiguos",
+     "SELECT id, hora_salida FROM registro_cobro WHERE hora_salida IS NOT NULL AND hora_salida < %s ORDER BY hora_salida, id LIMIT 500",
+     (_AHORA - timedelta(days=90),), ['registro_cobro']),
+    ("monitor: búsqueda de cubículos por nombre",
+     """SELECT c.id, c.nombre, c.estado FROM cubiculos c
+        LEFT JOIN registro_cobro rc ON c.registro_cobro_id = rc.id
+        WHERE c.nombre IN (%s, %s) ORDER BY c.nombre ASC""",
+     ('A1', 'B1'), ['c']),
+]
+
+
+def verificar_indices(cur, consultas=CONSULTAS_CRITICAS):
+    """
+    Ejecuta EXPLAIN sobre cada consulta crítica con un cursor de diccionarios. Si una tabla aparece
+    en varias ramas (UNION ALL del historial), se evalúa cada rama por separado con su 'id' del plan.
+    Devuelve [(descripción, tabla, estado, detalle)] con estado:
+      'OK'    -> el plan usa un índice para esa tabla.
+      'AVISO' -> hay índice aplicable (possible_keys) pero el optimizador prefirió recorrer la
+                 tabla; normal con tablas pequeñas, como cubiculos con pocas filas.
+      'FALLO' -> ningún índice sirve: recorrido completo garantizado al crecer la tabla.
+    """
+    resultados = []
+    for descripcion, consulta, params, tablas in consultas:
+        cur.execute("EXPLAIN " + consulta, tuple(params))
+        plan = cur.fetchall()
+        for tabla in tablas:
+            filas = [fila for fila in plan if fila['table'] == tabla]
+            if not filas:
+                # El optimizador resolvió la tabla sin leerla (p. ej. 'Impossible WHERE' o const)
+                resultados.append((descripcion, tabla, 'OK', 'sin acceso a la tabla en el plan'))
+                continue
+            for fila in filas:
+                detalle = f"type={fila['type']} key={fila['key']} possible_keys={fila['possible_keys']} rows={fila['rows']}"
+                if fila.get('partitions'):
+                    detalle += f" partitions={fila['partitions']}"
+                if fila['key']:
+                    estado = 'OK'
+                elif fila['possible_keys']:
+                    estado = 'AVISO'
+                else:
+                    estado = 'FALLO'
+                nombre = tabla if len(filas) == 1 else f"{tabla}, id {fila['id']}"
+                resultados.append((descripcion, nombre, estado, detalle))
+    return resultados
@@ -0,0 +1,41 @@
+# version_estado.py
+# ===========================================
+# VERSIÓN MONOTÓNICA DEL ESTADO PARA ETAG / IF-NONE-MATCH
+# ===========================================
+import os
+import threading
+import uuid
+
+
+class VersionEstado:
+    """
+    Contador de cambios aplicados en ESTE proceso; los ETag de los endpoints de consulta se
+    arman con él para responder 304 sin volver a consultar MySQL.
+
+    - 'incrementar()' se llama tras cada cambio ya confirmado (propio o recibido por el canal de
+      eventos internos).
+    - 'etag(*partes)' devuelve 'instancia-valor-partes'. La instancia se regenera si cambia el PID:
+      con gunicorn --preload los workers heredan el objeto, pero sus contadores avanzan por
+      separado y no deben producir el mismo ETag para estados distintos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._instancia = None
+        self._valor = 0
+
+    def incrementar(self):
+        with self._lock:
+            self._valor += 1
+
+    def valor(self):
+        with self._lock:
+            return self._valor
+
+    def etag(self, *partes):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._instancia = uuid.uuid4().hex[:12]
+            return '-'.join([self._instancia, str(self._valor)] + [str(p) for p in partes])
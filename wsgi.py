@@ -0,0 +1,7 @@
+# wsgi.py
+# ===========================================
+# PUNTO DE ENTRADA WEB PARA PRODUCCIÓN (gunicorn -c gunicorn.conf.py wsgi:app)
+# ===========================================
+# Solo HTTP: importar app.py no conecta MQTT ni arranca el scheduler. La ingesta corre aparte
+# (python ingesta.py) y cada worker se suscribe a los eventos internos en post_fork.
+from app import app  # noqa: F401